@@ -0,0 +1,416 @@
+import argparse
+import contextlib
+import gc
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+
+from PlantsDB import DB_FILENAME, migrate
+
+RESULTS_FILENAME = 'benchmark_results.json'
+BASELINE_FILENAME = 'benchmark_baseline.json'
+WORK_DIRECTORY = 'benchmark_data'
+CORPUS_FILENAME = 'plants_cache.sqlite'
+SCALES = [1, 10, 100]      # the synthetic databases hold this many copies of every Plants and WoodyPlants row
+REPEAT = 5                 # rounds of every benchmark; the median and the fastest round are reported
+ROUND_SECONDS = 0.05       # every round repeats its work until it takes about this long
+THRESHOLD = 0.25           # a benchmark more than 25% slower than the baseline is a regression
+QUERY_SAMPLE = 200         # species looked up in each species benchmark
+SEARCH_WORDS = [['swamp', 'shrub'], ['wet', 'shade'], ['sandy', 'dunes'], ['oak', 'savanna'], ['bog']]
+
+
+def measure(work, items=1, repeat=REPEAT, round_seconds=ROUND_SECONDS):
+    ''' Times work() like timeit: it is called enough times to fill a round of about round_seconds,
+    with the garbage collector off, and the time of each round is divided into one operation
+
+    Parameters
+    ----------
+    work: function
+        takes no arguments and does items operations, e.g. parses items pages
+    items: int
+        how many operations one call of work() does
+    repeat: int
+        how many rounds are timed
+
+    Returns
+    -------
+    dict
+        microseconds per operation, e.g. {'median_us': 41.2, 'min_us': 40.8, 'ops': 2906, 'rounds': 5}
+    '''
+    start = time.perf_counter()
+    work() # warm up, and find out how many calls fill a round
+    calls = max(1, int(round_seconds / max(time.perf_counter() - start, 1e-9)))
+    timings = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for i in range(repeat):
+            start = time.perf_counter()
+            for j in range(calls):
+                work()
+            timings.append((time.perf_counter() - start) / (calls * items) * 1e6)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return {'median_us': round(statistics.median(timings), 3), 'min_us': round(min(timings), 3), 'ops': calls * items, 'rounds': repeat}
+
+def quiet(function):
+    ''' Wraps a function that prints (like most of FinalCode.py) so its output is thrown away '''
+    def run(*args):
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            return function(*args)
+    return run
+
+
+################################################################################
+# Building the inputs: the synthetic databases and the CSV files WoodyPlants.py loads
+
+def build_scaled_db(source_db, factor, db_filename):
+    ''' Copies a database and adds factor - 1 renamed copies of every Plants and WoodyPlants row
+    (e.g. 'Acer rubrum x2'), then links, indexes and summarizes it like a freshly built database
+
+    Returns
+    -------
+    dict
+        the row counts, e.g. {'plants': 29060, 'woody_plants': 1220}
+    '''
+    shutil.copyfile(source_db, db_filename)
+    connection = sqlite3.connect(db_filename)
+    last_id = connection.execute('SELECT MAX(Id) FROM Plants').fetchone()[0]
+    last_row = connection.execute('SELECT MAX(rowid) FROM WoodyPlants').fetchone()[0]
+    for copy in range(2, factor + 1):
+        suffix = ' x' + str(copy)
+        connection.execute('''
+            INSERT INTO Plants (Family, GenusSpecies, CommonName, Physiognomy, ConservatismCoef, WetnessCoef, IsNative, GrowthForm)
+                SELECT Family, GenusSpecies || ?, CommonName, Physiognomy, ConservatismCoef, WetnessCoef, IsNative, GrowthForm
+                FROM Plants WHERE Id <= ? ORDER BY Id
+        ''', [suffix, last_id])
+        connection.execute('''
+            INSERT INTO WoodyPlants (GenusSpecies, LabId, YoutubeVideo)
+                SELECT GenusSpecies || ?, LabId, YoutubeVideo
+                FROM WoodyPlants WHERE rowid <= ? ORDER BY rowid
+        ''', [suffix, last_row])
+    connection.commit()
+    migrate(connection) # links WoodyPlants to the copies, indexes their text and refreshes the summaries
+    connection.execute('ANALYZE')
+    connection.commit()
+    counts = {'plants': connection.execute('SELECT COUNT(*) FROM Plants').fetchone()[0],
+              'woody_plants': connection.execute('SELECT COUNT(*) FROM WoodyPlants').fetchone()[0]}
+    connection.close()
+    return counts
+
+def write_csv_files(db_filename, directory):
+    ''' Writes SpeciesList.csv and LabSites.csv (the files WoodyPlants.py loads) from the tables of a database '''
+    import csv
+
+    connection = sqlite3.connect(db_filename)
+    tables = [('SpeciesList.csv', 'SELECT GenusSpecies, LabId, YoutubeVideo FROM WoodyPlants ORDER BY rowid'),
+              ('LabSites.csv', 'SELECT * FROM LabSites ORDER BY LabId')]
+    for filename, sql in tables:
+        cursor = connection.execute(sql)
+        with open(os.path.join(directory, filename), 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow([column[0] for column in cursor.description])
+            writer.writerows(cursor)
+    connection.close()
+
+
+################################################################################
+# The benchmarks. Each runs in its own process (see run_worker()), in the directory of its database,
+# because FinalCode.py and MichiganFlora.py open the files named in DB_FILENAME and CACHE_FILENAME.
+
+def corpus_benchmarks(corpus_filename, repeat=REPEAT):
+    ''' Times reading the recorded Michigan Flora pages: the page cache, make_url_request_using_cache(),
+    get_plant_instance() and parse_plant_page() with every extraction engine
+    '''
+    import MichiganFlora
+    import PageExtract
+    from PageCache import open_page_cache
+
+    MichiganFlora.CACHE_FILENAME = corpus_filename
+    cache = open_page_cache(corpus_filename)
+    urls = [url for url in cache.keys() if 'species.aspx' in url]
+    pages = [cache[url] for url in urls]
+    if not urls:
+        return {}, {'corpus_pages': 0}
+    request = quiet(MichiganFlora.make_url_request_using_cache) # it prints "Using cache" on every hit
+
+    results = {}
+    results['page_cache.get'] = measure(lambda: [cache.get(url) for url in urls], len(urls), repeat)
+    results['make_url_request_using_cache'] = measure(lambda: [request(url) for url in urls], len(urls), repeat)
+    results['get_plant_instance'] = measure(quiet(lambda: [MichiganFlora.get_plant_instance(url) for url in urls]), len(urls), repeat)
+    for engine in PageExtract.ENGINES:
+        PageExtract.set_engine(engine)
+        results['parse_plant_page.' + engine] = measure(lambda: [MichiganFlora.parse_plant_page(page) for page in pages], len(pages), repeat)
+    PageExtract.set_engine('fast')
+    return results, {'corpus_pages': len(pages)}
+
+def scale_benchmarks(repeat=REPEAT):
+    ''' Times the WoodyPlants.py table loads and every FinalCode.py query function against michiganplants.sqlite
+    in the current directory. The interactive functions (provide_species_info(), search_descriptions()) are timed
+    through the lookups they run: species_query() and PlantsDAO.text_search().
+    '''
+    import webbrowser
+    webbrowser.open = lambda *args, **kwargs: True # nothing here should open a browser
+
+    import FinalCode
+    import WoodyPlants
+    from PlantCatalog import PlantCatalog, get_catalog
+    from PlantSearch import PlantSearch, get_search_index
+    from PlantsDB import get_dao
+
+    results = {}
+
+    def load_woody_plants():
+        connection = sqlite3.connect('load_test.sqlite')
+        WoodyPlants.create_db(connection)
+        WoodyPlants.load_woody_plants(connection)
+        WoodyPlants.load_lab_sites(connection)
+        connection.close()
+
+    with open('SpeciesList.csv') as file:
+        rows = sum(1 for line in file) - 1
+    results['woody_plants.load'] = measure(quiet(load_woody_plants), rows, repeat)
+
+    dao = get_dao()
+    results['catalog.refresh'] = measure(lambda: PlantCatalog(DB_FILENAME).refresh(), 1, repeat)
+    results['search_index.build'] = measure(lambda: PlantSearch(dao.all_plant_names()), 1, repeat)
+    get_catalog()
+    get_search_index()
+
+    species = FinalCode.unique_species()
+    sample = species[::max(1, len(species) // QUERY_SAMPLE)][:QUERY_SAMPLE]
+    families = get_catalog().list_families()
+    misspelled = [name[:-2] + name[-1] for name in sample[:20]]
+
+    results['final_code.coefficients_of_conservatism'] = measure(FinalCode.coefficients_of_conservatism, 1, repeat)
+    results['final_code.coefficients_of_conservatism.statewide'] = measure(lambda: FinalCode.coefficients_of_conservatism('statewide'), 1, repeat)
+    results['final_code.conservatism_counts'] = measure(FinalCode.conservatism_counts, 1, repeat)
+    results['final_code.order_by_conservatism'] = measure(quiet(FinalCode.order_by_conservatism), 1, repeat)
+    results['final_code.unique_families'] = measure(quiet(FinalCode.unique_families), 1, repeat)
+    results['final_code.unique_species'] = measure(FinalCode.unique_species, 1, repeat)
+    results['final_code.list_plants_in_family'] = measure(quiet(lambda: [FinalCode.list_plants_in_family(fam) for fam in families]), len(families), repeat)
+    results['final_code.family_query'] = measure(lambda: [FinalCode.family_query(fam) for fam in families], len(families), repeat)
+    results['final_code.species_query'] = measure(lambda: [FinalCode.species_query(name) for name in sample], len(sample), repeat)
+    results['final_code.run_query.misspelled'] = measure(lambda: [FinalCode.run_query(name) for name in misspelled], len(misspelled), repeat)
+    results['final_code.text_search'] = measure(lambda: [dao.text_search(words, 10) for words in SEARCH_WORDS], len(SEARCH_WORDS), repeat)
+    results['plants_db.ranked_by_conservatism.500'] = measure(lambda: dao.ranked_by_conservatism(500), 1, repeat)
+    return results
+
+def run_worker(kind, directory, corpus_filename, repeat):
+    os.chdir(directory)
+    if kind == 'corpus':
+        results, meta = corpus_benchmarks(corpus_filename, repeat)
+    else:
+        results, meta = scale_benchmarks(repeat), {}
+    json.dump({'results': results, 'meta': meta}, sys.stdout)
+
+
+################################################################################
+# Running the suite and comparing it with a baseline
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def generate_corpus(source_db, corpus_filename):
+    ''' Writes a stand-in for the recorded pages, made from the plants in source_db with FixtureServer.record_site_pages(),
+    for when there is no recorded corpus to time. Returns the number of pages written.
+    '''
+    from FixtureServer import record_site_pages
+    from PageCache import PageCache
+
+    if os.path.exists(corpus_filename):
+        os.remove(corpus_filename)
+    connection = sqlite3.connect(source_db)
+    try:
+        plants = connection.execute('SELECT Family, GenusSpecies, CommonName, Physiognomy, ConservatismCoef, WetnessCoef '
+                                    'FROM Plants ORDER BY Id').fetchall()
+    finally:
+        connection.close()
+    cache = PageCache(corpus_filename) # not open_page_cache(), which would keep the closed cache for the next caller
+    try:
+        return record_site_pages(cache, plants)
+    finally:
+        cache.close()
+
+def run_in_process(kind, directory, corpus_filename, repeat):
+    ''' Runs one worker in a fresh Python process, so no cached catalog, connection or page leaks between scales '''
+    command = [sys.executable, os.path.abspath(__file__), '--worker', kind, '--workdir', directory,
+               '--corpus', corpus_filename, '--repeat', str(repeat)]
+    output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+    return json.loads(output)
+
+def run_suite(source_db=DB_FILENAME, corpus_filename=CORPUS_FILENAME, scales=SCALES, work_directory=WORK_DIRECTORY, repeat=REPEAT):
+    ''' Runs every benchmark: the recorded page corpus once, and the database benchmarks at every scale
+
+    Parameters
+    ----------
+    source_db: string
+        the database the synthetic ones are made from
+    corpus_filename: string
+        the page cache holding the recorded Michigan Flora pages. If it doesn't exist, pages generated from
+        source_db are timed instead (meta 'corpus' says which), and if that fails too the corpus benchmarks
+        are skipped and listed in meta 'skipped'
+    scales: list
+        how many copies of the rows each synthetic database holds, e.g. [1, 10, 100]
+    work_directory: string
+        where the synthetic databases and CSV files are written (rebuilt on every run)
+    repeat: int
+        rounds of every benchmark
+
+    Returns
+    -------
+    dict
+        {'meta': {...}, 'results': {'corpus/parse_plant_page.fast': {'median_us': 41.2, ...}, 'x10/final_code.species_query': {...}, ...}}
+    '''
+    import numpy
+
+    report = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'numpy': numpy.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'repeat': repeat,
+            'scales': {},
+            'skipped': [],
+        },
+        'results': {},
+    }
+    os.makedirs(work_directory, exist_ok=True)
+    directory = os.path.join(work_directory, 'corpus')
+    os.makedirs(directory, exist_ok=True)
+    report['meta']['corpus'] = 'recorded'
+    if not os.path.exists(corpus_filename):
+        generated = os.path.join(directory, 'generated_' + CORPUS_FILENAME)
+        try:
+            pages = generate_corpus(source_db, generated)
+        except sqlite3.Error as error:
+            print('Warning: ' + corpus_filename + ' does not exist and no pages could be made from ' + source_db
+                  + ' (' + str(error) + '), so the corpus benchmarks are skipped', file=sys.stderr)
+            report['meta']['corpus'] = None
+            report['meta']['skipped'].append('corpus')
+        else:
+            print('Warning: ' + corpus_filename + ' does not exist, so the corpus benchmarks time ' + str(pages)
+                  + ' pages generated from ' + source_db, file=sys.stderr)
+            report['meta']['corpus'] = 'generated'
+            corpus_filename = generated
+    if report['meta']['corpus']:
+        shutil.copyfile(source_db, os.path.join(directory, DB_FILENAME)) # MichiganFlora opens it on import
+        print('Timing the ' + report['meta']['corpus'] + ' page corpus', file=sys.stderr)
+        worker = run_in_process('corpus', os.path.abspath(directory), os.path.abspath(corpus_filename), repeat)
+        report['meta'].update(worker['meta'])
+        for name, result in worker['results'].items():
+            report['results']['corpus/' + name] = result
+    for factor in scales:
+        directory = os.path.join(work_directory, 'x' + str(factor))
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+        start = time.perf_counter()
+        counts = build_scaled_db(source_db, factor, os.path.join(directory, DB_FILENAME))
+        write_csv_files(os.path.join(directory, DB_FILENAME), directory)
+        counts['build_seconds'] = round(time.perf_counter() - start, 2)
+        report['meta']['scales']['x' + str(factor)] = counts
+        print('Timing x' + str(factor) + ' (' + str(counts['plants']) + ' plants)', file=sys.stderr)
+        worker = run_in_process('scale', os.path.abspath(directory), os.path.abspath(corpus_filename), repeat)
+        for name, result in worker['results'].items():
+            report['results']['x' + str(factor) + '/' + name] = result
+    return report
+
+def compare(results, baseline, threshold=THRESHOLD):
+    ''' Compares every benchmark with the same one in a baseline report by its median time
+
+    Returns
+    -------
+    dict
+        maps each benchmark to {'baseline_us', 'current_us', 'ratio', 'status'}, where status is 'regression'
+        (slower by more than threshold), 'improvement' (faster by more than threshold), 'ok' or 'new';
+        'missing' marks a baseline benchmark that didn't run this time
+    '''
+    comparison = {}
+    for name, before in baseline.get('results', {}).items():
+        if name not in results:
+            comparison[name] = {'baseline_us': before['median_us'], 'current_us': None, 'ratio': None, 'status': 'missing'}
+    for name, result in results.items():
+        before = baseline.get('results', {}).get(name)
+        if before is None:
+            comparison[name] = {'baseline_us': None, 'current_us': result['median_us'], 'ratio': None, 'status': 'new'}
+            continue
+        ratio = result['median_us'] / before['median_us'] if before['median_us'] else 1.0
+        status = 'regression' if ratio > 1 + threshold else 'improvement' if ratio < 1 / (1 + threshold) else 'ok'
+        comparison[name] = {'baseline_us': before['median_us'], 'current_us': result['median_us'], 'ratio': round(ratio, 3), 'status': status}
+    return comparison
+
+def format_us(value):
+    if value is None:
+        return '-'
+    if value >= 1000:
+        return format(value / 1000, '.2f') + ' ms'
+    return format(value, '.1f') + ' us'
+
+def print_report(report, file=sys.stderr):
+    comparison = report.get('comparison', {})
+    file.write('benchmark'.ljust(58) + 'median'.rjust(12) + 'baseline'.rjust(12) + 'ratio'.rjust(8) + '\n')
+    for name, result in report['results'].items():
+        line = comparison.get(name, {})
+        ratio = line.get('ratio')
+        flag = '  <- ' + line['status'] if line.get('status') in ('regression', 'improvement') else ''
+        file.write(name[:57].ljust(58) + format_us(result['median_us']).rjust(12) + format_us(line.get('baseline_us')).rjust(12)
+                   + ('-' if ratio is None else format(ratio, '.2f')).rjust(8) + flag + '\n')
+    for name, line in comparison.items():
+        if line['status'] == 'missing':
+            file.write(name[:57].ljust(58) + '-'.rjust(12) + format_us(line['baseline_us']).rjust(12) + '-'.rjust(8) + '  <- missing\n')
+    for name in report['meta'].get('skipped', []):
+        file.write('skipped: ' + name + '\n')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time page parsing, cache lookups, table loads and FinalCode queries offline, '
+                                                 'on the recorded pages and on databases scaled up from michiganplants.sqlite')
+    parser.add_argument('--db', default=DB_FILENAME, help='the database the synthetic ones are made from')
+    parser.add_argument('--corpus', default=CORPUS_FILENAME, help='the page cache holding the recorded Michigan Flora pages')
+    parser.add_argument('--scales', type=int, nargs='+', default=SCALES)
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument('--workdir', default=WORK_DIRECTORY)
+    parser.add_argument('--output', default=RESULTS_FILENAME)
+    parser.add_argument('--baseline', default=BASELINE_FILENAME, help='compare with this report if it exists')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD, help='how much slower than the baseline is a regression (0.25 is 25%%)')
+    parser.add_argument('--save-baseline', action='store_true', help='also write the results to --baseline')
+    parser.add_argument('--worker', choices=['corpus', 'scale'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.workdir, args.corpus, args.repeat)
+        raise SystemExit(0)
+
+    report = run_suite(args.db, args.corpus, args.scales, args.workdir, args.repeat)
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)
+        report['baseline'] = {'filename': args.baseline, 'created': baseline['meta'].get('created'), 'commit': baseline['meta'].get('commit')}
+        report['comparison'] = compare(report['results'], baseline, args.threshold)
+        regressions = [name for name, line in report['comparison'].items() if line['status'] == 'regression']
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump(report, file, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=1)
+    print_report(report)
+    print('Wrote ' + args.output + ('' if not args.save_baseline else ' and ' + args.baseline), file=sys.stderr)
+    if regressions:
+        print(str(len(regressions)) + ' benchmarks are slower than the baseline: ' + ', '.join(regressions), file=sys.stderr)
+        raise SystemExit(1)
@@ -0,0 +1,38 @@
+import argparse
+import sqlite3
+import time
+
+import MichiganFlora
+import WoodyPlants
+from PlantsDB import DB_FILENAME
+
+
+def rebuild(db_filename=DB_FILENAME, workers=1):
+    ''' Rebuilds every table of the database: Plants from the cached Michigan Flora pages, then
+    WoodyPlants and LabSites from SpeciesList.csv and LabSites.csv
+
+    Parameters
+    ----------
+    db_filename: string
+        the database to rebuild
+    workers: int
+        how many processes parse the cached pages
+
+    Returns
+    -------
+    None
+    '''
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_filename)
+    counts = MichiganFlora.crawl(conn, workers=workers)
+    conn.close()
+    WoodyPlants.build_tables(db_filename)
+    print('Rebuilt ' + db_filename + ' with ' + str(counts['added']) + ' species in ' + str(round(time.perf_counter() - start, 2)) + ' s')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Rebuild michiganplants.sqlite from the page cache and the CSV files')
+    parser.add_argument('--db', default=DB_FILENAME)
+    parser.add_argument('--workers', type=int, default=1, help='number of processes that parse pages')
+    args = parser.parse_args()
+    rebuild(args.db, args.workers)
@@ -0,0 +1,130 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+from PlantsDB import DB_FILENAME, db_version
+
+FIGURE_DIRECTORY = 'figure_cache'
+
+
+def write_atomically(path, text):
+    ''' Writes a whole file under a temporary name and renames it, so a reader never sees half a figure '''
+    temporary = path + '.tmp' + str(os.getpid())
+    with open(temporary, 'w', encoding='utf-8') as file:
+        file.write(text)
+    os.replace(temporary, path)
+
+
+class FigureCache:
+    '''Plotly figures saved on disk, so a chart that was drawn once opens again without a query or a render.
+    Every figure is saved twice: as JSON holding the pre-binned data and the figure (to rebuild or restyle it),
+    and as an HTML page (to open in a browser). Both are named after the figure, the database version and the
+    query parameters, so a rebuilt database never shows an old chart. Plotly itself is only imported when a
+    figure has to be drawn or rebuilt.
+
+    Instance Attributes
+    -------------------
+    directory: string
+        where the files are kept; plotly.min.js is written there once and shared by every page
+
+    db_filename: string
+        the database the figures are drawn from
+    '''
+    def __init__(self, directory=FIGURE_DIRECTORY, db_filename=DB_FILENAME):
+        self.directory = directory
+        self.db_filename = db_filename
+        self.hits = 0
+        self.misses = 0
+
+    def prefix(self, name, version):
+        return name + '-' + hashlib.sha1(repr(version).encode()).hexdigest()[:12] + '-'
+
+    def path(self, name, params, extension, version=None):
+        ''' Returns the file of a figure for the current database version and these parameters '''
+        version = db_version(self.db_filename) if version is None else version
+        key = hashlib.sha1(json.dumps(params, sort_keys=True).encode()).hexdigest()[:12]
+        return os.path.join(self.directory, self.prefix(name, version) + key + extension)
+
+    def html(self, name, params, load_data, make_figure):
+        ''' Returns the path of the HTML page of a figure, drawing it only if it was never drawn for this database
+
+        Parameters
+        ----------
+        name: string
+            the name of the figure, e.g. 'conservatism_histogram'
+        params: dict
+            the query parameters, passed to load_data as keyword arguments, e.g. {'scope': 'woody'}
+        load_data: function
+            returns the pre-binned data of the figure as something json can save, e.g. two lists
+        make_figure: function
+            turns that data (and the same keyword arguments) into a plotly Figure
+
+        Returns
+        -------
+        string
+            the path of the HTML file
+        '''
+        version = db_version(self.db_filename)
+        html_path = self.path(name, params, '.html', version)
+        if os.path.exists(html_path):
+            self.hits += 1
+            return html_path
+        self.misses += 1
+        figure = self.figure(name, params, load_data, make_figure, version)
+        os.makedirs(self.directory, exist_ok=True)
+        # 'directory' points the page at a plotly.min.js next to it, written once instead of into every page
+        figure.write_html(html_path + '.tmp', include_plotlyjs='directory')
+        os.replace(html_path + '.tmp', html_path)
+        return html_path
+
+    def figure(self, name, params, load_data, make_figure, version=None):
+        ''' Returns a plotly Figure, read back from its saved JSON when there is one (see html() for the parameters) '''
+        import plotly.io as pio
+
+        version = db_version(self.db_filename) if version is None else version
+        json_path = self.path(name, params, '.json', version)
+        if os.path.exists(json_path):
+            with open(json_path, encoding='utf-8') as file:
+                return pio.from_json(json.load(file)['figure'])
+        data = load_data(**params)
+        figure = make_figure(data, **params)
+        os.makedirs(self.directory, exist_ok=True)
+        self.prune(name, version)
+        write_atomically(json_path, json.dumps({'params': params, 'data': data, 'figure': figure.to_json()}))
+        return figure
+
+    def prune(self, name, version):
+        ''' Deletes the files of a figure drawn from older versions of the database '''
+        current = self.prefix(name, version)
+        for filename in os.listdir(self.directory):
+            if filename.startswith(name + '-') and not filename.startswith(current):
+                os.remove(os.path.join(self.directory, filename))
+
+
+FIGURE_CACHES = {}
+
+def get_figure_cache(db_filename=DB_FILENAME, directory=FIGURE_DIRECTORY):
+    ''' Returns the FigureCache of db_filename, making it the first time it is asked for
+    '''
+    key = (db_filename, directory)
+    if key not in FIGURE_CACHES:
+        FIGURE_CACHES[key] = FigureCache(directory, db_filename)
+    return FIGURE_CACHES[key]
+
+
+if __name__ == "__main__":
+    from FinalCode import conservatism_counts, conservatism_histogram
+
+    parser = argparse.ArgumentParser(description='Draw the cached figures ahead of time, so the first view is instant too')
+    parser.add_argument('--scope', choices=['woody', 'statewide'], action='append', help='default: both')
+    parser.add_argument('--db', default=DB_FILENAME)
+    parser.add_argument('--directory', default=FIGURE_DIRECTORY)
+    args = parser.parse_args()
+
+    cache = get_figure_cache(args.db, args.directory)
+    for scope in args.scope or ['woody', 'statewide']:
+        start = time.perf_counter()
+        path = cache.html('conservatism_histogram', {'scope': scope}, conservatism_counts, conservatism_histogram)
+        print(path + ' in ' + str(round((time.perf_counter() - start) * 1000, 1)) + ' ms')
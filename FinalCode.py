@@ -1,42 +1,87 @@
-import sqlite3
+import argparse
+import contextlib
+import csv
+import json
+import sys
+import time
 import webbrowser
-import plotly.graph_objs as go
-import numpy as np
+from pathlib import Path
+from FigureCache import get_figure_cache
+from PlantCatalog import get_catalog
+from PlantSearch import get_search_index
+from PlantsDB import DB_FILENAME, get_dao
 
 
-def coefficients_of_conservatism():
-	''' Constructs and executes SQL query to select every coefficient of conservatism
-	To limit this to species taught in Woody Plants, I Joined Plants (Michigan Flora data) on WoodyPlants (created from my own CSV) 
-	using the GenusSpecies key
+def coefficients_of_conservatism(scope='woody'):
+	''' Lists every coefficient of conservatism. To limit this to species taught in Woody Plants, Plants (Michigan Flora data)
+	is joined on WoodyPlants (created from my own CSV); the list is expanded from the counts of conservatism_counts()
 	
 	Parameters
 	----------
-	None
+	scope: str
+		'woody' for the 116 plants taught in Woody Plants, or 'statewide' for every plant in Michigan
 	
 	Returns
 	-------
 	list
-		a list of every coefficient of conservatism for all 116 plants
-	'''
-	connection = sqlite3.connect("michiganplants.sqlite")
-	cursor = connection.cursor()
-	query = '''
-	SELECT ConservatismCoef
-	FROM Plants
-	JOIN WoodyPlants
-	ON Plants.GenusSpecies = WoodyPlants.GenusSpecies
+		a list of every coefficient of conservatism for all 116 plants, lowest first, with 0 for non-native species
 	'''
-	result = cursor.execute(query).fetchall()
 	every_coef = []
-	for species in result:
-		every_coef.append(species[0])
-	connection.close()
+	for coef, count in zip(*conservatism_counts(scope)):
+		every_coef.extend([coef] * count)
 	return every_coef
 
+def conservatism_counts(scope='woody'):
+	''' Reads how many species have each coefficient of conservatism from the CoefficientCounts summary table,
+	which is counted once when the database is loaded (see PlantsDB.refresh_summaries) from Plants (Michigan Flora data)
+	joined on WoodyPlants (created from my own CSV)
+	
+	Parameters
+	----------
+	scope: str
+		'woody' for the 116 plants taught in Woody Plants, or 'statewide' for every plant in Michigan
+	
+	Returns
+	-------
+	tuple
+		two lists: the coefficients and the number of species with each one. Non-native species are counted under 0.
+	'''
+	coefficients = []
+	counts = []
+	for coef, is_native, species in get_dao().coefficient_counts(scope):
+		coefficients.append(coef if coef is not None else 0) # non-native species are given a coefficient of 0 for graphing purposes
+		counts.append(species)
+	return coefficients, counts
+
+def conservatism_histogram(data, scope='woody'):
+	''' Draws the histogram of coefficients of conservatism from the counts returned by conservatism_counts().
+	Plotly and NumPy are imported here, so the program only loads them when a chart is actually drawn.
+
+	Parameters
+	----------
+	data: tuple
+		(coefficients, counts), two lists
+	scope: str
+		'woody' or 'statewide', for the title
+
+	Returns
+	-------
+	plotly.graph_objs.Figure
+	'''
+	import numpy as np
+	import plotly.graph_objs as go
+
+	conserv, counts = data
+	x1 = np.array(conserv)
+	data = [go.Histogram(x = x1, y = np.array(counts), histfunc = 'sum')] # each coefficient is weighted by its number of species
+	title = "Histogram of Coefficients of Conservatism for " + ("Woody Plants" if scope == 'woody' else "Michigan Plants")
+	layout = go.Layout(title=title, xaxis_title="Coefficient of Conservatism", yaxis_title="Number of Species", plot_bgcolor="lightgoldenrodyellow")
+	return go.Figure(data=data, layout=layout)
+
 def order_by_conservatism():
 	''' Constructs and executes SQL query to select species names and coefficients of conservatism, using the same join as the previous function.
-	It eliminates species with a coefficient of "*" because those are non-native species which are a low conservation prio. 
-	The top 20 species are printed in descending order by coefficient.
+	It eliminates species with no coefficient (stored as NULL) because those are non-native species which are a low conservation prio. 
+	The top 20 species are printed in descending order by coefficient, read from the TopConservatism summary table.
 
 	Parameters
 	----------
@@ -46,27 +91,16 @@ def order_by_conservatism():
 	-------
 	None
 	'''
-	connection = sqlite3.connect("michiganplants.sqlite")
-	cursor = connection.cursor()
-	query = '''
-	SELECT Plants.GenusSpecies, CommonName, ConservatismCoef
-	FROM Plants
-	JOIN WoodyPlants
-	ON Plants.GenusSpecies = WoodyPlants.GenusSpecies
-	WHERE ConservatismCoef <> '*'
-	ORDER BY ConservatismCoef DESC
-	'''
-	result = cursor.execute(query).fetchall()
+	result = get_dao().ranked_by_conservatism(20)
 	i = 0
-	for species in result[:20]:
+	for species in result:
 		i += 1
-		print(str(i) + '. ' + species[0] + ' (' + species[1] + ') ' + str(species[2]))
-	connection.close()
+		print(str(i) + '. ' + species[0] + ' (' + species[1] + ') ' + format(species[2], 'g'))
 
 
 def coefficient_of_conservatism():
 	''' Defines coefficient of conservatism, opens a window using Plotly to graph a histogram of coefficients of conservatism for native species.
-	Calls coefficients_of_conservatism() to form the list of coefficients and order_by_conservatism() to print the formatted list.
+	Calls conservatism_counts() to count the coefficients and order_by_conservatism() to print the formatted list.
 
 	Parameters
 	----------
@@ -79,14 +113,8 @@ def coefficient_of_conservatism():
 	print('Coefficient of conservatism is a value used to determine the relative condition, or "ecological quality" of a specific site or plant community. Values range from 0-10 and represent the probability that plant is likely to occur in a habitat that is relatively unaltered from what is believed to be a pre-settlement condition. Low values mean the plant can be found almost anywhere, while values closer to 10 mean that plant is only found in high quality, specialized habitat. All non-native species have a value of 0.')
 	print('Here is a histogram showing the distribution of coefficients of conservatism of all woody plants native to Michigan.')
 	print('Launching Plotly...')
-	conserv = coefficients_of_conservatism()
-	conserv = [c if c != '*' else 0 for c in conserv] # non-native species are given a coefficient of 0 for graphing purposes
-
-	x1 = np.array(conserv)
-	data = [go.Histogram(x = x1)]
-	layout = go.Layout(title="Histogram of Coefficients of Conservatism for Woody Plants", xaxis_title="Coefficient of Conservatism", yaxis_title="Number of Species", plot_bgcolor="lightgoldenrodyellow")
-	fig1 = go.Figure(data=data, layout=layout)
-	fig1.show()
+	path = get_figure_cache().html('conservatism_histogram', {'scope': 'woody'}, conservatism_counts, conservatism_histogram)
+	webbrowser.open(Path(path).resolve().as_uri()) # drawn once for each version of the database, then opened from disk
 
 	option = input('Enter 1 to learn more or 2 to return to search options: ')
 	if option == '1':
@@ -97,8 +125,8 @@ def coefficient_of_conservatism():
 
 
 def unique_families(): 
-	''' Constructs and executes SQL query to select unique family names
-	Like in the coefficients_of_conservatism() function, I Joined Plants on WoodyPlants using the GenusSpecies key
+	''' Prints and returns the unique family names of the woody plants, read from the in-memory PlantCatalog
+	(loaded once from Plants joined on WoodyPlants, and again whenever the database changes)
 	There are 176 unique families in Michigan, and 41 of them are taught in Woody Plants
 	
 	Parameters
@@ -110,28 +138,16 @@ def unique_families():
 	list
 		a list of 41 unique plant families
 	'''
-	connection = sqlite3.connect("michiganplants.sqlite")
-	cursor = connection.cursor()
-	query = '''
-	SELECT DISTINCT Family
-	FROM Plants
-	JOIN WoodyPlants
-	ON Plants.GenusSpecies = WoodyPlants.GenusSpecies
-	'''
-	result = cursor.execute(query).fetchall()
-	every_family = []
+	every_family = get_catalog().list_families() # served from memory, see PlantCatalog.py
 	i = 0
-	for fam in result:
+	for fam in every_family:
 		i += 1
-		print(str(i) + '. ' + fam[0])
-		every_family.append(fam[0])
-	connection.close()
+		print(str(i) + '. ' + fam)
 	return every_family
 
 
 def unique_species():
-	''' Constructs and executes SQL query to select Genus & Species names
-	Like in the above functions, I Joined Plants on WoodyPlants using the GenusSpecies key
+	''' Returns the Genus & Species names of the woody plants from the in-memory PlantCatalog, like unique_families()
 	There are 2906 plant species in Michigan, and 116 of them are taught in Woody Plants
 	
 	Parameters
@@ -143,24 +159,12 @@ def unique_species():
 	list
 		a list of 116 unique plant species
 	'''
-	connection = sqlite3.connect("michiganplants.sqlite")
-	cursor = connection.cursor()
-	query = '''
-	SELECT Plants.GenusSpecies
-	FROM Plants
-	JOIN WoodyPlants
-	ON Plants.GenusSpecies = WoodyPlants.GenusSpecies
-	'''
-	result = cursor.execute(query).fetchall()
-	every_species = []
-	for species in result:
-		every_species.append(species[0])
-	connection.close()
+	every_species = get_catalog().list_species()
 	return every_species
 
 def list_plants_in_family(fam):
-	''' Constructs and executes SQL query to select Genus & Species names
-	Selects only species found in the family specified by the user (fam)
+	''' Prints the Genus & Species and common name of every woody plant in the family specified by the user (fam),
+	in alphabetical order, from the in-memory PlantCatalog
 	
 	Parameters
 	----------
@@ -171,18 +175,7 @@ def list_plants_in_family(fam):
 	-------
 	None
 	'''
-	connection = sqlite3.connect("michiganplants.sqlite")
-	cursor = connection.cursor()
-
-	sql = '''
-	SELECT Plants.GenusSpecies, CommonName
-	FROM Plants
-	JOIN WoodyPlants
-	ON Plants.GenusSpecies = WoodyPlants.GenusSpecies
-	WHERE Family = '{0}'
-	'''
-	query = sql.format(fam)
-	result = cursor.execute(query).fetchall()
+	result = get_catalog().plants_in_family(fam)
 	print('-' * 60)
 	print('List of plants in the ' + fam + ' family:')
 	print('-' * 60)
@@ -190,13 +183,12 @@ def list_plants_in_family(fam):
 	for item in result:
 		i += 1
 		print(str(i) + '. ' + item[0] + ' (' + item[1] + ')')
-	connection.close()
 
 
 def provide_species_info(species):
-	''' Constructs and executes SQL query to select some attributes of the species selected by the user
-	There are two joins in this process:
-		1) Join Plants (Michigan Flora data) on WoodyPlants (created from my own CSV) based on GenusSpecies key
+	''' Prints some attributes of the species selected by the user and offers its video and lab site map.
+	The attributes come from the in-memory PlantCatalog, which loads them with two joins:
+		1) Join Plants (Michigan Flora data) on WoodyPlants (created from my own CSV) using the PlantId key
 		2) Join on LabSites (created from my own CSV) using the LabId number as the key
 	
 	Parameters
@@ -208,43 +200,34 @@ def provide_species_info(species):
 	-------
 	None
 	'''
-	connection = sqlite3.connect("michiganplants.sqlite")
-	cursor = connection.cursor()
-
-	sql = '''
-	SELECT Family, Physiognomy, ConservatismCoef, YoutubeVideo, SiteName, Latitude, Longitude, CommonName
-	FROM (Plants
-	JOIN WoodyPlants
-	ON Plants.GenusSpecies = WoodyPlants.GenusSpecies)
-	JOIN LabSites ON WoodyPlants.LabId=LabSites.LabId
-	WHERE Plants.GenusSpecies = '{0}'
-	'''
-	query = sql.format(species)
-	result = cursor.execute(query).fetchall()
-	plant = result[0] # result is a list of 1 tuple representing the selected plant
-	common_name = plant[7]
+	result = get_catalog().species_info(species)
+	if not result: # the species isn't taught in Woody Plants
+		print("Sorry, I don't have any information on that plant!")
+		return
+	family, is_native, physio, cons_coef, video, site, latitude, longitude, common_name = result[0] # one row for each lab site
 	print('-' * 60)
 	print('Here are some interesting facts about ' + species + ' (' + common_name + ')')
 	print('-' * 60)
-	try:
-		family, cons_coef, video, site, latitude, longitude = plant[0], plant[2], plant[3], plant[4], plant[5], plant[6]
-		physio = plant[1].split()[1].lower()
-		if plant[1].split()[0] == 'Nt':
-			native = 'native '
+	if is_native:
+		native = 'native '
+	else:
+		native = 'non-native '
+	print(species + ' (' + common_name + ') is a ' + native + (physio or 'plant') + ' in the ' + family + ' family.') # physio is the growth form, e.g. 'tree'
+	
+	if native == 'native ': # Coefficient of conservatism doesn't apply to non-native species
+		if cons_coef is None: # Michigan Flora shows '*' for a few native species too
+			print("Michigan Flora doesn't give it a coefficient of conservatism.")
 		else:
-			native = 'non-native '
-		print(species + ' (' + common_name + ') is a ' + native + physio + ' in the ' + family + ' family.')
-		
-		if native == 'native ': # Coefficient of conservatism doesn't apply to non-native species
 			if cons_coef > 7:
 				priority = 'high'
 			elif cons_coef < 3:
 				priority = 'low'
 			else:
 				priority = 'moderate'
-			print('It has a coefficient of conservatism of ' + str(cons_coef) + ', indicating that it has ' + priority + ' priority for conservation.') 
-		
-		option = input('Select from the following options: \n 1) Watch a video \n 2) Locate on Google Maps \n 3) Go back to search options \n')
+			print('It has a coefficient of conservatism of ' + format(cons_coef, 'g') + ', indicating that it has ' + priority + ' priority for conservation.') 
+	
+	option = input('Select from the following options: \n 1) Watch a video \n 2) Locate on Google Maps \n 3) Go back to search options \n')
+	try:
 		if option == '1':
 			print('Launching YouTube...')
 			webbrowser.open(video)
@@ -253,41 +236,249 @@ def provide_species_info(species):
 			print('You can find ' + species + ' (' + common_name + ') at ' + site + '! You can find that site on this map.')
 			print('Launching Google Maps...')
 			webbrowser.open(map_url)
-	except:
-		print("Sorry, I don't have any information on that plant!")
-	connection.close()
+	except webbrowser.Error:
+		print("Sorry, I couldn't open a web browser!")
+
 
+def spelling_suggestions(name, kinds, accept, db_filename=DB_FILENAME):
+	''' Finds the woody plant names closest to a misspelled name, using the search index over every plant in Michigan
 
+	Parameters
+	----------
+	name: str
+		What the user entered (e.g. "Magnolaceae")
+	kinds: list
+		Which kinds of names to compare against: 'family', 'genus_species' and/or 'common_name'
+	accept: function
+		Only names that pass accept() are suggested, e.g. get_catalog().has_family
+	db_filename: str
+		the database whose plant names are searched
+
+	Returns
+	-------
+	list
+		up to 3 family names or Genus & species names, closest first (e.g. ['Magnoliaceae'])
+	'''
+	suggestions = []
+	for found, kind, target, distance in get_search_index(db_filename).suggest(name, 3, kinds, accept):
+		if target not in suggestions:
+			suggestions.append(target)
+	return suggestions
 
-print('Welcome to Woody Plants!')
+def search_descriptions():
+	''' Asks for a few keywords (e.g. "wet shade shrub") and prints the Michigan plants whose Michigan Flora page
+	best matches them, with the matching words in [brackets]. Uses the full-text index in the PlantsText table,
+	so every plant in Michigan is searched, not only the woody plants taught in this class.
 
-while True:
-	option = input('Select from the following options. Enter 1, 2, or 3: \n 1) Search for a plant by family \n 2) Learn about coefficient of conservatism \n 3) Exit \n')
-	if option == '3':
-		break
-	if option == '2':
-		coefficient_of_conservatism()
-	if option == '1':
-		print('Here is a list of families taught in this class: ')
-		every_family = unique_families()
-		while True:
-			family = input('Select a family (e.g. "Rosaceae"), or enter "back" for more options. \n')
-			if family == 'back':
-				break
-			if family not in every_family:
-				print('Oops! You must have spelled it wrong. Try entering the family name again. \n')
-			else:
-				list_plants_in_family(family)
-				while True:
-					species = input('Enter the Genus & species of a plant to learn more (e.g. "Morus alba"), or enter "back" to search by family: \n')
-					if species == 'back':
-						unique_families()
-						break
-					if species not in unique_species():
-						print('Oops! You must have spelled it wrong. Try entering the name again. ')
+	Parameters
+	----------
+	None
+
+	Returns
+	-------
+	list
+		(Genus & species, common name, family, snippet, rank) tuples, best match first
+	'''
+	words = input('Enter some keywords to search plant descriptions (e.g. "swamp shrub"): \n').split()
+	result = get_dao().text_search(words, 10)
+	if not result:
+		print('Sorry, no plants matched those words.')
+	i = 0
+	for item in result:
+		i += 1
+		print(str(i) + '. ' + item[0] + ' (' + item[1] + '), ' + item[2] + ' family: ' + item[3])
+	return result
+
+
+
+################################################################################
+# Non-interactive API: the same lookups as the menu, returned as dicts instead of printed,
+# so FinalCode can be imported and driven from scripts (see run_batch() and the --batch option).
+
+def family_query(fam, db_filename=DB_FILENAME):
+	''' Looks up a family the way option 1 of the menu does
+
+	Parameters
+	----------
+	fam: str
+		a family name, e.g. "Pinaceae"
+	db_filename: str
+		the database to look it up in
+
+	Returns
+	-------
+	dict
+		{'query': 'Pinaceae', 'kind': 'family', 'found': True, 'plants': [{'genus_species': 'Larix laricina', 'common_name': 'larch, tamarack'}, ...]}
+		If the family isn't taught in Woody Plants, 'found' is False and 'suggestions' holds the closest family names.
+	'''
+	catalog = get_catalog(db_filename)
+	if not catalog.has_family(fam):
+		suggestions = spelling_suggestions(fam, ['family'], catalog.has_family, db_filename)
+		return {'query': fam, 'kind': 'family', 'found': False, 'suggestions': suggestions}
+	plants = [{'genus_species': genus_species, 'common_name': common_name} for genus_species, common_name in catalog.plants_in_family(fam)]
+	return {'query': fam, 'kind': 'family', 'found': True, 'plants': plants}
+
+def species_query(species, db_filename=DB_FILENAME):
+	''' Looks up a species the way provide_species_info() does
+
+	Parameters
+	----------
+	species: str
+		a Genus & species name, e.g. "Pinus strobus"
+	db_filename: str
+		the database to look it up in
+
+	Returns
+	-------
+	dict
+		{'query': 'Pinus strobus', 'kind': 'species', 'found': True, 'common_name': 'white pine', 'family': 'Pinaceae',
+		'native': True, 'growth_form': 'tree', 'conservatism': 3.0, 'sites': [{'site': 'Stinchfield Woods', 'latitude': 42.404298,
+		'longitude': -83.91032, 'video': 'https://www.youtube.com/watch?v=...'}]}
+		If the species isn't taught in Woody Plants, 'found' is False and 'suggestions' holds the closest names.
+	'''
+	catalog = get_catalog(db_filename)
+	result = catalog.species_info(species)
+	if not result:
+		suggestions = spelling_suggestions(species, ['genus_species', 'common_name'], catalog.has_species, db_filename)
+		return {'query': species, 'kind': 'species', 'found': False, 'suggestions': suggestions}
+	plant = result[0]
+	sites = [{'site': row[5], 'latitude': row[6], 'longitude': row[7], 'video': row[4]} for row in result]
+	return {'query': species, 'kind': 'species', 'found': True, 'common_name': plant[8], 'family': plant[0],
+		'native': bool(plant[1]), 'growth_form': plant[2], 'conservatism': plant[3], 'sites': sites}
+
+def run_query(query):
+	''' Answers one batch query. "family: Rosaceae" and "species: Morus alba" name the kind of lookup;
+	a bare name is looked up as a family if it is one, and as a species otherwise. A misspelled bare name
+	gets family suggestions when no species name is close to it.
+	'''
+	kind, sep, name = query.partition(':')
+	if sep and kind.strip().lower() in ('family', 'species'):
+		name = name.strip()
+		return family_query(name) if kind.strip().lower() == 'family' else species_query(name)
+	name = query.strip()
+	if get_catalog().has_family(name):
+		return family_query(name)
+	result = species_query(name)
+	if not result['found'] and not result['suggestions']:
+		family_result = family_query(name)
+		if family_result['suggestions']:
+			return family_result
+	return result
+
+CSV_COLUMNS = ['query', 'kind', 'found', 'genus_species', 'common_name', 'family', 'native', 'growth_form', 'conservatism',
+	'site', 'latitude', 'longitude', 'video', 'suggestions']
+
+def csv_rows(result):
+	''' Flattens a query result into CSV rows: one for every plant of a family, or one for every lab site of a species '''
+	base = {'query': result['query'], 'kind': result['kind'], 'found': result['found']}
+	if not result['found']:
+		return [dict(base, suggestions='; '.join(result['suggestions']))]
+	if result['kind'] == 'family':
+		return [dict(base, family=result['query'], **plant) for plant in result['plants']]
+	fields = dict(base, genus_species=result['query'], common_name=result['common_name'], family=result['family'],
+		native=result['native'], growth_form=result['growth_form'], conservatism=result['conservatism'])
+	return [dict(fields, **site) for site in result['sites']]
+
+def run_batch(queries, output, output_format='jsonl'):
+	''' Answers every query and writes each result to output as soon as it is ready, so any number of queries
+	can be streamed through. Every query is served by the same in-memory catalog and database connection.
+
+	Parameters
+	----------
+	queries: iterable
+		one query per item (e.g. the lines of a file); blank items are skipped
+	output: file
+		where the results are written
+	output_format: str
+		'jsonl' (one JSON object per line), 'json' (one JSON list) or 'csv'
+
+	Returns
+	-------
+	int
+		the number of queries answered
+	'''
+	writer = None
+	if output_format == 'csv':
+		writer = csv.DictWriter(output, CSV_COLUMNS, lineterminator='\n')
+		writer.writeheader()
+	elif output_format == 'json':
+		output.write('[')
+	count = 0
+	for query in queries:
+		if not query.strip():
+			continue
+		result = run_query(query)
+		if writer is not None:
+			writer.writerows(csv_rows(result))
+		elif output_format == 'json':
+			output.write((',\n' if count else '\n') + json.dumps(result))
+		else:
+			output.write(json.dumps(result) + '\n')
+		count += 1
+	if output_format == 'json':
+		output.write('\n]\n')
+	return count
+
+
+def main():
+	''' The interactive menu '''
+	print('Welcome to Woody Plants!')
+
+	while True:
+		option = input('Select from the following options. Enter 1, 2, 3 or 4: \n 1) Search for a plant by family \n 2) Learn about coefficient of conservatism \n 3) Search plant descriptions \n 4) Exit \n')
+		if option == '4':
+			break
+		if option == '3':
+			search_descriptions()
+		if option == '2':
+			coefficient_of_conservatism()
+		if option == '1':
+			print('Here is a list of families taught in this class: ')
+			every_family = unique_families()
+			while True:
+				family = input('Select a family (e.g. "Rosaceae"), or enter "back" for more options. \n')
+				if family == 'back':
+					break
+				if not get_catalog().has_family(family):
+					suggestions = spelling_suggestions(family, ['family'], get_catalog().has_family)
+					if suggestions:
+						print('Oops! You must have spelled it wrong. Did you mean ' + ' or '.join(suggestions) + '? \n')
 					else:
-						provide_species_info(species)
+						print('Oops! You must have spelled it wrong. Try entering the family name again. \n')
+				else:
+					list_plants_in_family(family)
+					while True:
+						species = input('Enter the Genus & species of a plant to learn more (e.g. "Morus alba"), or enter "back" to search by family: \n')
+						if species == 'back':
+							unique_families()
+							break
+						if not get_catalog().has_species(species):
+							suggestions = spelling_suggestions(species, ['genus_species', 'common_name'], get_catalog().has_species)
+							if suggestions:
+								print('Oops! You must have spelled it wrong. Did you mean ' + ' or '.join(suggestions) + '? ')
+							else:
+								print('Oops! You must have spelled it wrong. Try entering the name again. ')
+						else:
+							provide_species_info(species)
+
+	print('Goodbye!')
 
-print('Goodbye!')
 
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description='Explore the woody plants of Michigan interactively, or answer a batch of queries')
+	parser.add_argument('--batch', metavar='FILE', help='answer the family or species names in FILE, one per line ("-" reads stdin), instead of starting the menu')
+	parser.add_argument('--format', choices=['jsonl', 'json', 'csv'], default='jsonl', help='how batch results are written')
+	parser.add_argument('--output', default='-', help='file the batch results are written to (default stdout)')
+	args = parser.parse_args()
 
+	if args.batch is None:
+		main()
+	else:
+		with contextlib.ExitStack() as files: # closes the files it opened, but not stdin or stdout
+			queries = sys.stdin if args.batch == '-' else files.enter_context(open(args.batch, newline=''))
+			output = sys.stdout if args.output == '-' else files.enter_context(open(args.output, 'w', newline=''))
+			start = time.perf_counter()
+			count = run_batch(queries, output, args.format)
+			output.flush()
+			elapsed = time.perf_counter() - start
+		print('Answered ' + str(count) + ' queries in ' + str(round(elapsed, 2)) + ' s', file=sys.stderr)
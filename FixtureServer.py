@@ -0,0 +1,313 @@
+import argparse
+import html
+import json
+import math
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from PageCache import open_page_cache
+
+SITE_URL = 'https://michiganflora.net'
+TREFLE_PAGE_SIZE = 20
+
+
+class RecordedPageHandler(BaseHTTPRequestHandler):
+    '''answers GET requests with pages recorded in a PageCache, standing in for michiganflora.net.
+    A request for /species.aspx?id=11 is answered with the cached page for
+    https://michiganflora.net/species.aspx?id=11, and with 404 if that page was never recorded.
+    Every page is sent with an ETag made from its text, and a request whose If-None-Match
+    matches it is answered with 304 Not Modified.
+    '''
+    def do_GET(self):
+        server = self.server
+        if server.delay:
+            time.sleep(server.delay)
+        with server.lock:
+            server.request_count += 1
+        page = server.cache.get(server.site_url + self.path)
+        if page is None:
+            self.send_error(404)
+            return
+        body = page.encode('utf-8')
+        etag = '"' + format(zlib.crc32(body), '08x') + '"'
+        if self.headers.get('If-None-Match') == etag:
+            with server.lock:
+                server.not_modified_count += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_recorded_pages(cache, port=0, site_url=SITE_URL, delay=0.0):
+    ''' Starts a local HTTP server in a background thread that serves the pages recorded in cache
+
+    Parameters
+    ----------
+    cache: PageCache
+        the cache holding the recorded pages
+    port: int
+        the port to listen on; 0 picks a free port
+    site_url: string
+        the scheme and host the recorded pages were fetched from
+    delay: float
+        seconds to wait before answering each request, to imitate a slow network
+
+    Returns
+    -------
+    ThreadingHTTPServer
+        the running server; its origin is 'http://127.0.0.1:' + str(server.server_port),
+        server.request_count counts the requests it has answered and server.not_modified_count
+        those answered with 304. Call server.shutdown() to stop it.
+    '''
+    server = ThreadingHTTPServer(('127.0.0.1', port), RecordedPageHandler)
+    server.cache = cache
+    server.site_url = site_url.rstrip('/')
+    server.delay = delay
+    server.lock = threading.Lock()
+    server.request_count = 0
+    server.not_modified_count = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+SPECIES_PAGE = (
+    '<html><head><title>{genus_species}</title></head><body><div id="main">'
+    '<span id="ctl00_Content_Formview2_FAMILYLabel">{family}</span>'
+    '<h1><span id="ctl00_Content_speciesHeaderFormview_SCIENTIFIC_NAMELabel"><i>{genus_species}</i> L.</span></h1>'
+    '<span id="ctl00_Content_FormviewDetails_common_nameLabel">{common_name}</span>'
+    '<table><tr><td><span id="ctl00_Content_FloraRepeater_ctl00_PHYSLabel">{physiognomy}</span></td>'
+    '<td><span id="ctl00_Content_FloraRepeater_ctl00_CLabel">{conservatism}</span></td>'
+    '<td><span id="ctl00_Content_FloraRepeater_ctl00_WLabel">{wetness}</span></td></tr></table>'
+    '<div id="ctl00_Content_FormviewDetails_textLabel"><p>A {growth_form} of wetland &amp; upland habitats.</p></div>'
+    '</div></body></html>'
+)
+
+def page_coefficient(value):
+    # a coefficient as Michigan Flora shows it: '9' or '-3', and '*' where there is none
+    if value is None or value == '*':
+        return '*'
+    return format(float(value), 'g')
+
+def record_site_pages(cache, plants, site_url=SITE_URL):
+    ''' Writes a small stand-in for michiganflora.net into a page cache: a browse page listing every family,
+    a family page for each and a species page for every plant, shaped like the real pages (see PageExtract.py).
+    Crawling the result through serve_recorded_pages() gives back the same plants, in the same order.
+
+    Parameters
+    ----------
+    cache: PageCache
+        where the pages are written
+    plants: list
+        (Family, GenusSpecies, CommonName, Physiognomy, ConservatismCoef, WetnessCoef) rows, e.g. from the Plants table;
+        families are listed in the order they first appear
+    site_url: string
+        the scheme and host the pages are recorded under
+
+    Returns
+    -------
+    int
+        the number of pages written
+    '''
+    site_url = site_url.rstrip('/') + '/'
+    families = {}
+    for plant in plants:
+        families.setdefault(plant[0], []).append(plant)
+    links = ''.join('<a class="browse" href="family.aspx?id={0}"> {0} </a>'.format(html.escape(family)) for family in families)
+    entries = [(site_url + 'browse.aspx', '<html><body><div class="browse-links">' + links + '</div></body></html>')]
+    number = 0
+    for family, members in families.items():
+        rows = []
+        for plant_family, genus_species, common_name, physiognomy, conservatism, wetness in members:
+            number += 1
+            rows.append('<tr><td><a href="species.aspx?id={0}"> {1} </a></td></tr>'.format(number, html.escape(genus_species)))
+            page = SPECIES_PAGE.format(family=html.escape(family), genus_species=html.escape(genus_species),
+                                       common_name=html.escape(common_name.title()), physiognomy=html.escape(physiognomy),
+                                       conservatism=page_coefficient(conservatism), wetness=page_coefficient(wetness),
+                                       growth_form=html.escape(physiognomy.lower()))
+            entries.append((site_url + 'species.aspx?id=' + str(number), page))
+        entries.append((site_url + 'family.aspx?id=' + family,
+                        '<html><div class="taxaList"><div><table>' + ''.join(rows) + '</table></div></div></html>'))
+    return cache.put_many(entries)
+
+
+class TrefleHandler(BaseHTTPRequestHandler):
+    '''answers Trefle API requests from records held in memory, standing in for trefle.io.
+    GET /api/v1/<collection>?page=2 answers one page of the collection with Trefle's "links" and "meta",
+    filter[field]=a,b keeps only the records whose field is one of the comma separated values, and
+    GET /api/v1/<collection>/<id or slug> answers one record. A request without the right token gets 401.
+    If server.fail_every is n, every nth request gets 503 (or 429 with Retry-After), to exercise retries.
+    '''
+    def do_GET(self):
+        server = self.server
+        if server.delay:
+            time.sleep(server.delay)
+        with server.lock:
+            server.request_count += 1
+            count = server.request_count
+        parts = urlsplit(self.path)
+        params = {name: values[0] for name, values in parse_qs(parts.query).items()}
+        if server.fail_every and count % server.fail_every == 0:
+            self.send_json(429 if count % (2 * server.fail_every) == 0 else 503, {'error': True}, [('Retry-After', str(server.retry_after))])
+            return
+        if server.token is not None and params.get('token') != server.token:
+            self.send_json(401, {'error': True, 'message': 'Unauthorized'})
+            return
+        params.pop('token', None)
+        path = parts.path.strip('/').split('/')
+        if len(path) < 3 or path[:2] != ['api', 'v1'] or path[2] not in server.collections:
+            self.send_json(404, {'error': True, 'message': 'Not found'})
+            return
+        records = server.collections[path[2]]
+        if len(path) == 4:
+            for record in records:
+                if str(record.get('id')) == path[3] or record.get('slug') == path[3]:
+                    self.send_json(200, {'data': record, 'meta': {}})
+                    return
+            self.send_json(404, {'error': True, 'message': 'Not found'})
+            return
+        for name, value in params.items():
+            if name.startswith('filter[') and name.endswith(']'):
+                wanted = set(value.split(','))
+                records = [record for record in records if str(record.get(name[7:-1])) in wanted]
+        page = int(params.pop('page', '1'))
+        last = max(1, math.ceil(len(records) / server.page_size))
+
+        def link(number):
+            return '/' + '/'.join(path) + '?' + urlencode(sorted(dict(params, page=number).items()))
+
+        links = {'self': link(page), 'first': link(1), 'last': link(last)}
+        if page > 1:
+            links['prev'] = link(page - 1)
+        if page < last:
+            links['next'] = link(page + 1)
+        data = records[(page - 1) * server.page_size:page * server.page_size]
+        self.send_json(200, {'data': data, 'links': links, 'meta': {'total': len(records)}})
+
+    def send_json(self, status, result, headers=()):
+        body = json.dumps(result).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_trefle(collections, port=0, token=None, page_size=TREFLE_PAGE_SIZE, fail_every=0, delay=0.0, retry_after=0):
+    ''' Starts a mock Trefle API in a background thread
+
+    Parameters
+    ----------
+    collections: dict
+        maps a collection name to its records, e.g. {'families': [{'id': 1, 'name': 'Pinaceae', ...}, ...]}
+    port: int
+        the port to listen on; 0 picks a free port
+    token: string
+        if given, every request must send it as the token parameter
+    page_size: int
+        records on each page (trefle.io sends 20)
+    fail_every: int
+        if more than 0, every fail_every-th request fails with 503 or 429
+    delay: float
+        seconds to wait before answering each request
+    retry_after: int
+        the seconds a 429 asks the client to wait in its Retry-After header
+
+    Returns
+    -------
+    ThreadingHTTPServer
+        the running server, like serve_recorded_pages(); send requests to
+        'http://127.0.0.1:' + str(server.server_port) + '/api/v1/families'
+    '''
+    server = ThreadingHTTPServer(('127.0.0.1', port), TrefleHandler)
+    server.collections = collections
+    server.token = token
+    server.page_size = page_size
+    server.fail_every = fail_every
+    server.delay = delay
+    server.retry_after = retry_after
+    server.lock = threading.Lock()
+    server.request_count = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def trefle_records(plant_names):
+    ''' Makes mock Trefle records from the plants in a database. Every species gets made-up but repeatable traits,
+    and about one species in ten is left out, like the species trefle.io doesn't know.
+
+    Parameters
+    ----------
+    plant_names: list
+        (GenusSpecies, Family, CommonName) rows, e.g. from PlantsDAO.all_plant_names()
+
+    Returns
+    -------
+    dict
+        {'families': [...], 'species': [...]}, records in Trefle's shape; families in alphabetical order
+    '''
+    families = sorted(set(row[1] for row in plant_names))
+    species = []
+    for genus_species, family, common_name in plant_names:
+        number = zlib.crc32(genus_species.encode('utf-8'))
+        if number % 10 == 0:
+            continue
+        slug = '-'.join(genus_species.lower().split())
+        maximum_height = 50 + number % 3000
+        species.append({
+            'id': number % 1000000, 'scientific_name': genus_species, 'common_name': common_name, 'slug': slug,
+            'family': family, 'genus': genus_species.split()[0], 'links': {'self': '/api/v1/species/' + slug},
+            'specifications': {
+                'ligneous_type': [None, 'tree', 'shrub', 'liana'][number % 4],
+                'growth_habit': ['Tree', 'Shrub', 'Forb/herb', 'Graminoid', 'Vine'][number % 5],
+                'growth_rate': [None, 'Slow', 'Moderate', 'Rapid'][number // 7 % 4],
+                'toxicity': [None, 'none', 'low', 'high'][number // 11 % 4],
+                'average_height': {'cm': maximum_height // 2},
+                'maximum_height': {'cm': maximum_height},
+            },
+        })
+    return {
+        'families': [{'id': i, 'name': name, 'common_name': None, 'slug': name.lower(),
+                      'links': {'self': '/api/v1/families/' + name.lower()}} for i, name in enumerate(families, 1)],
+        'species': species,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve recorded michiganflora.net pages, or a mock Trefle API, on localhost')
+    parser.add_argument('--cache', default='plants_cache.sqlite', help='page cache holding the recorded pages')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--delay', type=float, default=0.0, help='seconds to wait before each response')
+    parser.add_argument('--trefle', metavar='DB', help='serve a mock Trefle API made from the plants in this database instead')
+    parser.add_argument('--fail-every', type=int, default=0, help='--trefle: fail every nth request with 503 or 429')
+    args = parser.parse_args()
+
+    if args.trefle:
+        from PlantsDB import get_dao
+        server = serve_trefle(trefle_records(get_dao(args.trefle).all_plant_names()), args.port, fail_every=args.fail_every, delay=args.delay)
+        print('Serving a mock Trefle API at http://127.0.0.1:' + str(server.server_port) + '/api/v1')
+    else:
+        server = serve_recorded_pages(open_page_cache(args.cache), args.port, delay=args.delay)
+        print('Serving recorded pages at http://127.0.0.1:' + str(server.server_port))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,268 @@
+import argparse
+import csv
+import json
+import sys
+import threading
+import time
+
+import numpy as np
+
+from PlantsDB import DB_FILENAME, db_version, get_dao
+
+# the columns of every assessment, in the order they are printed
+METRICS = [
+    'species',          # species on the site list that are in the Plants table
+    'native_species',
+    'native_percent',
+    'mean_c',           # mean coefficient of conservatism of the species that have one (non-native species have none)
+    'mean_c_all',       # mean coefficient of every species, counting species without one as 0
+    'fqi',              # floristic quality index: mean_c * sqrt(species with a coefficient)
+    'fqi_all',          # mean_c_all * sqrt(species)
+    'adjusted_fqi',     # 100 * (mean_c / 10) * sqrt(native species / species), from 0 to 100
+    'mean_w',           # mean wetness coefficient of every species (negative is wetter)
+    'mean_w_native',
+]
+
+
+def normalize(name):
+    return ' '.join(name.lower().split())
+
+def ratio(numerator, denominator):
+    ''' numerator / denominator for every site, with nan where the denominator is 0 '''
+    result = np.full(len(numerator), np.nan)
+    np.divide(numerator, denominator, out=result, where=denominator > 0)
+    return result
+
+
+class FloristicQuality:
+    '''the coefficients of every Michigan species held in NumPy arrays, so that the floristic quality of
+    thousands of site species lists is computed with a handful of array operations instead of a loop over sites.
+
+    Instance Attributes
+    -------------------
+    plant_ids: numpy.ndarray
+        the Plants Id of every species, sorted
+
+    names: list
+        the genus & species name of every species, lined up with plant_ids
+
+    conservatism: numpy.ndarray
+        the coefficient of conservatism of every species, nan where it has none (non-native species)
+
+    wetness: numpy.ndarray
+        the wetness coefficient of every species, nan where it has none
+
+    native: numpy.ndarray
+        True for every native species
+
+    positions_by_name: dict
+        maps a normalized genus & species name (e.g. 'pinus strobus') to its position in the arrays
+    '''
+    def __init__(self, species):
+        ''' species: (Id, GenusSpecies, ConservatismCoef, WetnessCoef, IsNative) tuples sorted by Id,
+        e.g. from PlantsDAO.fqa_species()
+        '''
+        species = list(species)
+        self.set_columns(np.array([row[0] for row in species], dtype=np.int64),
+                         [row[1] for row in species],
+                         np.array([row[2] for row in species], dtype=float), # None becomes nan
+                         np.array([row[3] for row in species], dtype=float),
+                         np.array([row[4] for row in species], dtype=bool))
+
+    @classmethod
+    def from_columns(cls, plant_ids, names, conservatism, wetness, native):
+        ''' Makes an engine straight from arrays lined up like the instance attributes, e.g. the memory-mapped
+        columns of a Snapshot, without copying them
+        '''
+        engine = cls.__new__(cls)
+        engine.set_columns(plant_ids, names, conservatism, wetness, native)
+        return engine
+
+    def set_columns(self, plant_ids, names, conservatism, wetness, native):
+        self.plant_ids = plant_ids
+        self.names = names
+        self.conservatism = conservatism
+        self.wetness = wetness
+        self.native = native
+        self.positions_by_name = {normalize(name): i for i, name in enumerate(names)}
+
+    def positions(self, plant_ids):
+        ''' Returns the position in the arrays of every Plants Id, or -1 for Ids that aren't in Plants '''
+        plant_ids = np.asarray(plant_ids, dtype=np.int64)
+        positions = np.searchsorted(self.plant_ids, plant_ids)
+        positions[positions == len(self.plant_ids)] = 0
+        found = self.plant_ids[positions] == plant_ids if len(self.plant_ids) else np.zeros(len(plant_ids), dtype=bool)
+        return np.where(found, positions, -1)
+
+    def positions_of_names(self, names):
+        ''' Returns the position in the arrays of every genus & species name, or -1 for names that aren't in Plants '''
+        return np.array([self.positions_by_name.get(normalize(name), -1) for name in names], dtype=np.int64)
+
+    def assess(self, site_keys, positions):
+        ''' Computes every metric in METRICS for every site at once
+
+        Parameters
+        ----------
+        site_keys: list
+            the site of every species record, e.g. [1, 1, 1, 2, ...] or ['North fen', 'North fen', ...]
+        positions: numpy.ndarray
+            the species of every record, as positions from positions() or positions_of_names(), lined up with site_keys.
+            Records with position -1 (species not in Plants) are skipped, and a species listed twice for a site counts once.
+
+        Returns
+        -------
+        tuple
+            (sites, metrics): the sorted unique site keys, and a dict mapping every name in METRICS to an array
+            lined up with sites, e.g. (array([1, 2]), {'species': array([13, 13]), 'mean_c': array([5.3, 4.0]), ...})
+        '''
+        sites, site_index = np.unique(np.asarray(site_keys), return_inverse=True)
+        positions = np.asarray(positions, dtype=np.int64)
+        known = positions >= 0
+        pairs = np.unique(site_index[known] * len(self.plant_ids) + positions[known])
+        site_index = pairs // len(self.plant_ids) if len(self.plant_ids) else pairs
+        species = pairs - site_index * len(self.plant_ids)
+
+        def per_site(weights=None):
+            return np.bincount(site_index, weights=weights, minlength=len(sites)).astype(float)
+
+        c = self.conservatism[species]
+        w = self.wetness[species]
+        native = self.native[species]
+        has_c = ~np.isnan(c)
+        has_w = ~np.isnan(w)
+        c_sum = per_site(np.where(has_c, c, 0.0))
+        total = per_site()
+        natives = per_site(native)
+        with_c = per_site(has_c)
+
+        metrics = {}
+        metrics['species'] = total.astype(np.int64)
+        metrics['native_species'] = natives.astype(np.int64)
+        metrics['native_percent'] = 100 * ratio(natives, total)
+        metrics['mean_c'] = ratio(c_sum, with_c)
+        metrics['mean_c_all'] = ratio(c_sum, total)
+        metrics['fqi'] = metrics['mean_c'] * np.sqrt(with_c)
+        metrics['fqi_all'] = metrics['mean_c_all'] * np.sqrt(total)
+        metrics['adjusted_fqi'] = 100 * (metrics['mean_c'] / 10) * np.sqrt(ratio(natives, total))
+        metrics['mean_w'] = ratio(per_site(np.where(has_w, w, 0.0)), per_site(has_w))
+        metrics['mean_w_native'] = ratio(per_site(np.where(has_w & native, w, 0.0)), per_site(has_w & native))
+        return sites, metrics
+
+
+ENGINES = {}    # db_filename -> (database version, FloristicQuality)
+ENGINE_LOCK = threading.Lock()
+
+def get_engine(db_filename=DB_FILENAME):
+    ''' Returns the FloristicQuality engine of db_filename, loading the coefficients the first time it is asked for
+    and again whenever the database changes (see PlantsDB.db_version(), like PlantCatalog)
+    '''
+    version = db_version(db_filename)
+    entry = ENGINES.get(db_filename)
+    if entry is None or entry[0] != version:
+        with ENGINE_LOCK:
+            entry = ENGINES.get(db_filename)
+            if entry is None or entry[0] != version:
+                entry = (version, FloristicQuality(get_dao(db_filename).fqa_species()))
+                ENGINES[db_filename] = entry
+    return entry[1]
+
+def assess_lab_sites(db_filename=DB_FILENAME):
+    ''' Scores the species list of every Woody Plants lab site
+
+    Returns
+    -------
+    list
+        one dict for every lab site, with its 'site' name and every metric in METRICS,
+        e.g. [{'site': 'Miller Woods', 'species': 13, 'native_species': 10, 'mean_c': 5.3, ...}, ...]
+    '''
+    rows = get_dao(db_filename).lab_site_species()
+    engine = get_engine(db_filename)
+    site_names = {row[0]: row[1] for row in rows}
+    sites, metrics = engine.assess([row[0] for row in rows], engine.positions([row[2] for row in rows]))
+    return site_records([site_names[site] for site in sites.tolist()], metrics)
+
+def assess_inventory(records, db_filename=DB_FILENAME):
+    ''' Scores any number of site species lists, e.g. survey inventories read from a CSV file
+
+    Parameters
+    ----------
+    records: iterable
+        (site, genus & species name) pairs, e.g. [('North fen', 'Larix laricina'), ('North fen', 'Betula pumila'), ...]
+    db_filename: string
+        the database holding the Plants table
+
+    Returns
+    -------
+    tuple
+        (results, unknown): one dict for every site like assess_lab_sites() returns, and the sorted
+        names that aren't in the Plants table (those records are skipped)
+    '''
+    engine = get_engine(db_filename)
+    site_keys = []
+    names = []
+    for site, name in records:
+        site_keys.append(site)
+        names.append(name)
+    positions = engine.positions_of_names(names)
+    unknown = sorted(set(name for name, position in zip(names, positions.tolist()) if position < 0))
+    sites, metrics = engine.assess(site_keys, positions)
+    return site_records(sites.tolist(), metrics), unknown
+
+def site_records(sites, metrics):
+    ''' Turns the arrays returned by FloristicQuality.assess() into one dict per site, with None for missing values '''
+    columns = {name: metrics[name].tolist() for name in METRICS}
+    results = []
+    for i, site in enumerate(sites):
+        result = {'site': site}
+        for name in METRICS:
+            value = columns[name][i]
+            result[name] = None if value != value else value # nan where a site has no native species
+        results.append(result)
+    return results
+
+def read_inventory(file):
+    ''' Yields (site, genus & species) from a CSV file with a header row and those two columns first '''
+    csv_reader = csv.reader(file)
+    next(csv_reader, None)
+    for row in csv_reader:
+        if len(row) >= 2:
+            yield row[0], row[1]
+
+def write_results(results, output_format, file):
+    if output_format == 'json':
+        json.dump(results, file, indent=1)
+        file.write('\n')
+    elif output_format == 'csv':
+        writer = csv.DictWriter(file, ['site'] + METRICS, lineterminator='\n')
+        writer.writeheader()
+        writer.writerows(results)
+    else:
+        file.write('site'.ljust(28) + ''.join(name.rjust(15) for name in METRICS) + '\n')
+        for result in results:
+            values = ['' if result[name] is None else format_value(result[name]) for name in METRICS]
+            file.write(str(result['site'])[:27].ljust(28) + ''.join(value.rjust(15) for value in values) + '\n')
+
+def format_value(value):
+    return format(value, 'g') if isinstance(value, int) else format(value, '.2f')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Floristic quality assessment (mean C, FQI, native percent, wetness) of site species lists')
+    parser.add_argument('inventory', nargs='?', help='CSV file of site,genus species rows (with a header row); "-" reads stdin. Without it, every Woody Plants lab site is scored')
+    parser.add_argument('--format', choices=['table', 'csv', 'json'], default='table')
+    parser.add_argument('--db', default=DB_FILENAME)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.inventory is None:
+        results = assess_lab_sites(args.db)
+    elif args.inventory == '-':
+        results, unknown = assess_inventory(read_inventory(sys.stdin), args.db)
+    else:
+        with open(args.inventory, newline='') as file_contents:
+            results, unknown = assess_inventory(read_inventory(file_contents), args.db)
+    elapsed = time.perf_counter() - start
+    write_results(results, args.format, sys.stdout)
+    if args.inventory is not None and unknown:
+        print(str(len(unknown)) + ' names are not in the Plants table and were skipped: ' + ', '.join(unknown[:10]), file=sys.stderr)
+    print('Assessed ' + str(len(results)) + ' sites in ' + str(round(elapsed * 1000, 1)) + ' ms', file=sys.stderr)
@@ -1,15 +1,36 @@
-from bs4 import BeautifulSoup
+import argparse
+import hashlib
 import json
 import requests
 import sqlite3
-
-CACHE_FILENAME = "plants_cache.json"
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from PageCache import open_page_cache
+from PageExtract import get_extractor, set_engine, species_text
+from PageFetcher import PageFetcher
+from PlantRecords import PlantColumns, PlantRecord
+from PlantsDB import CRAWL_PRAGMAS, DB_FILENAME, add_plant_text, create_plants, create_plants_text, drop_plants_text, finish_build, migrate, plant_row, report_load, start_build
+
+CACHE_FILENAME = "plants_cache.sqlite"
+LEGACY_CACHE_FILENAME = "plants_cache.json"
+
+SITE_URL = 'https://michiganflora.net/'
+FETCH_WORKERS = 8        # size of the thread pool used to fetch pages
+FETCH_PER_HOST = 4       # most requests open against michiganflora.net at once
+FETCH_INTERVAL = 0.1     # least number of seconds between two requests to the same host
+FETCH_ORIGIN = None      # e.g. 'http://127.0.0.1:8000' to crawl a FixtureServer instead of the real site
+FETCH_CHUNK = 64         # how many species pages are fetched together while crawling
+INSERT_BATCH = 500       # how many rows are written to the Plants table in one transaction
+PARSE_BATCH = 32         # how many pages are sent to a parse worker together
 
 
 def open_cache():
-    ''' Opens the cache file if it exists and loads the JSON into
-    the CACHE_DICT dictionary.
-    if the cache file doesn't exist, creates a new cache dictionary
+    ''' Opens the page cache. The cache is a sqlite file that is opened once per process,
+    so every later call returns the same cache without reading it again.
+    If the entries of the old JSON cache (if there is one) haven't been imported into it
+    yet, they are imported.
     
     Parameters
     ----------
@@ -17,33 +38,24 @@ def open_cache():
     
     Returns
     -------
-    The opened cache: dict
+    The opened cache: PageCache
     '''
-    try:
-        cache_file = open(CACHE_FILENAME, 'r')
-        cache_contents = cache_file.read()
-        cache_dict = json.loads(cache_contents)
-        cache_file.close()
-    except:
-        cache_dict = {}
-    return cache_dict
-
-def save_cache(cache_dict):
-    ''' Saves the current state of the cache to disk
+    return open_page_cache(CACHE_FILENAME, LEGACY_CACHE_FILENAME)
+
+def save_cache(cache):
+    ''' Saves the current state of the cache to disk.
+    Entries are written as soon as they are added, so this only commits anything still pending.
     
     Parameters
     ----------
-    cache_dict: dict
-        The dictionary to save
+    cache: PageCache
+        The cache to save
     
     Returns
     -------
     None
     '''
-    dumped_json_cache = json.dumps(cache_dict, sort_keys=True, indent=4)
-    fw = open(CACHE_FILENAME,"w")
-    fw.write(dumped_json_cache)
-    fw.close() 
+    cache.conn.commit()
 
 def make_url_request_using_cache(url, params=None): # Michigan Flora
     '''Check the cache for a saved result. If the result is found, return it. Otherwise send a new 
@@ -58,67 +70,46 @@ def make_url_request_using_cache(url, params=None): # Michigan Flora
     
     Returns
     -------
-    dict
-        the results of the query as a dictionary loaded from cache
-        JSON
+    string
+        the text of the page, loaded from the cache or fetched
     '''
-    CACHE_DICT = open_cache()
-    if (url in CACHE_DICT.keys()): # the url is our unique key
+    cache = open_cache()
+    page = cache.get(url) # the url is our unique key
+    if page is not None:
         print("Using cache")
-        return CACHE_DICT[url]
+        return page
     else:
         print("Fetching")
         response = requests.get(url, params)
-        CACHE_DICT[url] = response.text
-        save_cache(CACHE_DICT)
-        return CACHE_DICT[url]
-
+        cache[url] = response.text
+        return response.text
 
-class Plant:
-    '''a plant species found in the state of Michigan
+FETCHER = None
 
-    Instance Attributes
-    -------------------
-    family: string
-        the family of a plant species (e.g. 'Magnoliaceae')
+def get_fetcher():
+    ''' Returns the concurrent page fetcher shared by the whole crawl.
+    It reads and fills the same cache as make_url_request_using_cache().
     
-    genus_species: string
-        the genus and species of a plant (e.g. 'Liriodendron tulipifera')
-
-    common_name: string
-        the common name of a plant (e.g. 'tulip tree')
-
-    physiognomy: string
-        defines whether a plant is native (Nt) or non-native (Ad) and the structure of the plant (shrub, tree, vine, etc.) 
-        (e.g. 'Nt tree', 'Ad shrub')
-
-    conservatism: string
-        Coefficient of conservatism is a value used to determine the relative condition, or "ecological quality" of a specific site or 
-        plant community. Values range from 0-10 and represent the probability that plant is likely to occur in a habitat that is relatively 
-        unaltered from what is believed to be a pre-settlement condition. Low values mean the plant can be found almost anywhere, while 
-        values closer to 10 mean that plant is only found in high quality, specialized habitat. All non-native species have a value of 0.
-        (e.g. '9')
-
-    wetness: string
-        Coefficient of wetness is a value that represents the probability that a species occurs in wetlands. Positive values indicate a 
-        species is likely to be found in a wetland, while negative values indicate a species almost never occurs in wetlands.
-        Values range from -5 to 5.
-        (e.g. '-3', '5')
+    Parameters
+    ----------
+    None
+    
+    Returns
+    -------
+    PageFetcher
     '''
-    def __init__(self, family, genus_species, common_name, physiognomy, conservatism, wetness):
-        self.family = family
-        self.genus_species = genus_species
-        self.common_name = common_name
-        self.physiognomy = physiognomy
-        self.conservatism = conservatism
-        self.wetness = wetness
+    global FETCHER
+    if FETCHER is None:
+        FETCHER = PageFetcher(open_cache(), FETCH_WORKERS, FETCH_PER_HOST, FETCH_INTERVAL, FETCH_ORIGIN)
+    return FETCHER
+
 
-    def info(self):
-        return self.genus_species + ' is in the ' + self.family + ' family.'
+# the record type of a species is shared with trefle_checkpoint.py; Plant is its old name here
+Plant = PlantRecord
 
-    def plant_facts(self): # returns a list of everything to be added to database
-        return [self.family, self.genus_species, self.common_name, self.physiognomy, self.conservatism, self.wetness]
 
+def make_family_url(family):
+    return SITE_URL + 'family.aspx?id=' + family
 
 def build_family_url_dict(family):
     ''' Make a dictionary that maps genus_species of every plant in that family to species url from "https://www.michiganflora.net"
@@ -134,22 +125,14 @@ def build_family_url_dict(family):
         key is the genus_species of a species and value is the url
         e.g. {'Sambucus canadensis':'https://michiganflora.net/species.aspx?id=11', ...}
     '''
-    family_url = 'https://michiganflora.net/family.aspx?id=' + family
-    species_baseurl = 'https://michiganflora.net/'
+    family_url = make_family_url(family)
+    species_baseurl = SITE_URL
     response = make_url_request_using_cache(family_url)
-    soup = BeautifulSoup(response, 'html.parser')
 
-    family_parent = soup.find('div', class_='taxaList')
-    family_divs = family_parent.find_all('div', recursive=False)
     families_dict = {}
-    for div in family_divs:
-        rows = div.find_all('tr')
-        for row in rows:
-            fam_link_tag = row.find('a')
-            fam_path = fam_link_tag['href']
-            fam_url = species_baseurl + fam_path
-            fam_name = fam_link_tag.text.strip()
-            families_dict[fam_name] = fam_url
+    for fam_path, fam_name in get_extractor().family_links(response):
+        fam_url = species_baseurl + fam_path
+        families_dict[fam_name] = fam_url
     return families_dict
 
 def browse_families():
@@ -165,16 +148,9 @@ def browse_families():
         michigan_families is a list of all plant families found in Michigan in alphabetical order
         e.g. ['Acanthaceae', 'Acoraceae', 'Adoxaceae', ...]
     '''
-    browse_url = 'https://michiganflora.net/browse.aspx'
+    browse_url = SITE_URL + 'browse.aspx'
     response = make_url_request_using_cache(browse_url)
-    soup = BeautifulSoup(response, 'html.parser')
-
-    parent = soup.find('div', class_='browse-links')
-    families = parent.find_all('a', class_='browse')
-    michigan_families = []
-    for fam in families:
-        fam_name = fam.text.strip()
-        michigan_families.append(fam_name)
+    michigan_families = get_extractor().browse_names(response)
     return michigan_families
 
 
@@ -189,35 +165,41 @@ def get_plant_instance(species_url):
     Returns
     -------
     instance
-        a Plant instance
+        a PlantRecord
     '''
     response = make_url_request_using_cache(species_url)
-    soup = BeautifulSoup(response, 'html.parser')
-
-    family_code = soup.find_all('span', {'id':'ctl00_Content_Formview2_FAMILYLabel'})
-    family = family_code[0].text
+    return parse_plant_page(response)
 
-    scientific_code = soup.find_all('span', {'id':'ctl00_Content_speciesHeaderFormview_SCIENTIFIC_NAMELabel'})
-    scientific_name = scientific_code[0].text.split()
-    genus_species = scientific_name[0] + ' ' + scientific_name[1]
+def parse_plant_page(response):
+    '''Make an instance from the text of a species page.
 
-    common_name_code = soup.find_all('span', {'id':'ctl00_Content_FormviewDetails_common_nameLabel'})
-    common_name = common_name_code[0].text.lower()
+    Parameters
+    ----------
+    response: string
+        The HTML of a species page
+    
+    Returns
+    -------
+    instance
+        a PlantRecord
+    '''
+    fields = get_extractor().species_fields(response) # see PageExtract.SPECIES_SPANS for the <span> ids
 
-    phys_code = soup.find_all('span', {'id':'ctl00_Content_FloraRepeater_ctl00_PHYSLabel'})
-    physiognomy = phys_code[0].text
+    family = fields['family']
 
-    conservatism_code = soup.find_all('span', {'id':'ctl00_Content_FloraRepeater_ctl00_CLabel'})
-    conservatism = conservatism_code[0].text
+    scientific_name = fields['scientific_name'].split()
+    genus_species = scientific_name[0] + ' ' + scientific_name[1]
 
-    wetness_code = soup.find_all('span', {'id':'ctl00_Content_FloraRepeater_ctl00_WLabel'})
-    wetness = wetness_code[0].text
+    common_name = fields['common_name'].lower()
+    physiognomy = fields['physiognomy']
+    conservatism = fields['conservatism']
+    wetness = fields['wetness']
 
-    plant_instance = Plant(family, genus_species, common_name, physiognomy, conservatism, wetness)
+    plant_instance = PlantRecord(family, genus_species, common_name, physiognomy, conservatism, wetness)
     return plant_instance
 
 def list_plant_instances(plant_dict):
-    # for every plant in plant_dict, make it an instance of the Plant class and return a list of those instances
+    # for every plant in plant_dict, make it a PlantRecord and return a list of those instances
     '''Make an instance from a species URL.
 
     Parameters
@@ -234,63 +216,378 @@ def list_plant_instances(plant_dict):
         ['Aquifoliaceae', 'Ilex opaca', 'american holly', 'Ad Shrub', '0', '3'], ...]
     '''
     urls = list(plant_dict.values())
+    pages = get_fetcher().fetch_all(urls) # cached pages are reused, the rest are fetched concurrently
     every_plant = []
-    for url in urls:
-        plant = get_plant_instance(url)
+    for page in pages:
+        plant = parse_plant_page(page)
         every_plant.append(plant.plant_facts())
     return every_plant
 
+def iter_species_pages(species_urls, refresh=False, chunk_size=FETCH_CHUNK, max_age=None):
+    '''Yields (url, page) for every species URL.
+    URLs are taken chunk_size at a time so a chunk can be fetched concurrently, while no more
+    than one chunk of pages is held in memory.
+
+    Parameters
+    ----------
+    species_urls: iterable
+        species URLs, e.g. the values of build_family_url_dict()
+    refresh: bool
+        if True, pages are fetched again from the site even if they are cached
+    chunk_size: int
+        how many pages are fetched together
+    max_age: float
+        if given, cached pages fetched more than this many seconds ago are fetched again
+
+    Returns
+    -------
+    generator
+        (url, page) tuples, e.g. ('https://michiganflora.net/species.aspx?id=11', '<html>...')
+    '''
+    species_urls = iter(species_urls)
+    while True:
+        chunk = list(islice(species_urls, chunk_size))
+        if not chunk:
+            break
+        pages = get_fetcher().fetch_all(chunk, refresh, max_age)
+        for url, page in zip(chunk, pages):
+            yield url, page
+
+def iter_family_pages(families, refresh=False):
+    '''Yields (family, url, page) for every species of every family, one family after another.
+
+    Parameters
+    ----------
+    families: iterable
+        family names, e.g. the list returned by browse_families()
+    refresh: bool
+        if True, pages are fetched again from the site even if they are cached
+
+    Returns
+    -------
+    generator
+        e.g. ('Adoxaceae', 'https://michiganflora.net/species.aspx?id=11', '<html>...')
+    '''
+    for fam in families:
+        fam_dict = build_family_url_dict(fam)
+        for url, page in iter_species_pages(fam_dict.values(), refresh):
+            yield fam, url, page
+
+def hash_page(page):
+    return hashlib.sha1(page.encode('utf-8')).hexdigest()
+
+def parse_page_batch(pages):
+    '''Hashes and parses a list of species pages. This is the work done by each process of a
+    parse pool: it receives raw HTML and sends back only the hash, PlantRecord and text of each page.
+
+    Parameters
+    ----------
+    pages: list
+        the HTML of species pages
+
+    Returns
+    -------
+    list
+        (content_hash, plant_record, description) tuples, lined up with pages
+    '''
+    return [(hash_page(page), parse_plant_page(page), species_text(page)) for page in pages]
+
+def iter_parsed_pages(family_pages, pool=None, window=1, batch_size=PARSE_BATCH):
+    '''Parses a stream of species pages, in order.
+    With a process pool, pages are sent to the workers batch_size at a time and up to window batches
+    are parsed at once; results still come out in the order the pages went in.
+
+    Parameters
+    ----------
+    family_pages: iterable
+        (family, url, page) tuples, e.g. from iter_family_pages()
+    pool: concurrent.futures.ProcessPoolExecutor
+        the pool to parse in, or None to parse in this process
+    window: int
+        how many batches can be waiting in the pool at once
+    batch_size: int
+        how many pages are sent to a worker together
+
+    Returns
+    -------
+    generator
+        (family, url, content_hash, plant_record, description) tuples
+    '''
+    family_pages = iter(family_pages)
+    pending = deque()
+    while True:
+        batch = list(islice(family_pages, batch_size))
+        if batch:
+            pages = [page for fam, url, page in batch]
+            if pool is None:
+                pending.append((batch, parse_page_batch(pages)))
+            else:
+                pending.append((batch, pool.submit(parse_page_batch, pages)))
+        while pending and (not batch or len(pending) >= window):
+            done, parsed = pending.popleft()
+            if pool is not None:
+                parsed = parsed.result()
+            for (fam, url, page), (content_hash, species, description) in zip(done, parsed):
+                yield fam, url, content_hash, species, description
+        if not batch:
+            break
+
 
 ################################################################################
 
-conn = sqlite3.connect("michiganplants.sqlite")
+conn = sqlite3.connect(DB_FILENAME)
 cur = conn.cursor()
 
 drop_plants = '''
     DROP TABLE IF EXISTS "Plants";
 '''
 
-create_plants = '''
-    CREATE TABLE IF NOT EXISTS "Plants" (
-        "Id"        INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE,
-        "Family" TEXT NOT NULL,
-        "GenusSpecies" TEXT NOT NULL,
-        "CommonName" TEXT NOT NULL,
-        "Physiognomy" TEXT NOT NULL, 
-        "ConservatismCoef" INTEGER NOT NULL,
-        "WetnessCoef" INTEGER NOT NULL
+# create_plants is in PlantsDB.py, next to the migration that rebuilds older Plants tables
+add_tree = '''
+    INSERT INTO Plants ("Id", "Family", "GenusSpecies", "CommonName", "Physiognomy", "ConservatismCoef", "WetnessCoef",
+                        "IsNative", "GrowthForm")
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+update_plant = '''
+    UPDATE Plants SET "Family" = ?, "GenusSpecies" = ?, "CommonName" = ?, "Physiognomy" = ?, "ConservatismCoef" = ?, "WetnessCoef" = ?,
+                      "IsNative" = ?, "GrowthForm" = ?
+        WHERE "Id" = ?
+'''
+
+create_crawl_state = '''
+    CREATE TABLE IF NOT EXISTS "CrawlState" (
+        "Url" TEXT PRIMARY KEY,
+        "ContentHash" TEXT NOT NULL,
+        "FetchedAt" REAL NOT NULL,
+        "PlantId" INTEGER
     );
 '''
 
-add_tree = '''
-    INSERT INTO Plants ("Id", "Family", "GenusSpecies", "CommonName", "Physiognomy", "ConservatismCoef", "WetnessCoef")
-        VALUES (?, ?, ?, ?, ?, ?, ?)
+create_crawl_checkpoint = '''
+    CREATE TABLE IF NOT EXISTS "CrawlCheckpoint" (
+        "Family" TEXT PRIMARY KEY,
+        "CrawledAt" REAL NOT NULL
+    );
 '''
 
-################################################################################
+select_crawl_state = 'SELECT ContentHash, PlantId FROM CrawlState WHERE Url = ?'
 
-if __name__ == "__main__":
-    CACHE_DICT = open_cache()
+save_crawl_state = '''
+    INSERT OR REPLACE INTO CrawlState ("Url", "ContentHash", "FetchedAt", "PlantId")
+        VALUES (?, ?, ?, ?)
+'''
 
-    cur.execute(drop_plants)
-    cur.execute(create_plants)
+touch_crawl_state = 'UPDATE CrawlState SET FetchedAt = ? WHERE Url = ?'
 
-    michigan_families = browse_families()
+save_checkpoint = 'INSERT OR REPLACE INTO CrawlCheckpoint ("Family", "CrawledAt") VALUES (?, ?)'
 
-    every_family = []
-    for fam in michigan_families:
-        fam_dict = build_family_url_dict(fam)
-        fam_instances = list_plant_instances(fam_dict)
-        every_family.append(fam_instances)
+def plant_text(plant_id, species, description):
+    ''' Returns the PlantsText row of a species: its Plants Id, the name, family and physiognomy columns
+    of its PlantRecord and the text of its page
+    '''
+    return [plant_id, species[1], species[2], species[0], species[3], description]
+
+def insert_plants(connection, parsed_pages, batch_size=INSERT_BATCH):
+    '''Inserts parsed species pages into an empty Plants table as they arrive, committing every batch_size rows.
+    Each plant is given a unique Id (1, 2, 3, ...) in the order it arrives, and the hash of its page is
+    saved in CrawlState for later incremental crawls. Once every row of a family is committed the family
+    is recorded in CrawlCheckpoint. The text of each page goes into the PlantsText full-text index.
+    Each batch is held in a PlantColumns, which executemany reads row by row without a list per plant.
+
+    Parameters
+    ----------
+    connection: sqlite3.Connection
+        the open michiganplants database
+    parsed_pages: iterable
+        (family, url, content_hash, plant_record, description) tuples, e.g. from iter_parsed_pages()
+    batch_size: int
+        how many rows are written in one transaction
 
-    i = 0
-    for family in every_family:
-        for species in family:
-            i += 1
-            index = str(i)
-            indexed_species = [index] + species  # This addes a unique ID to each plant before adding it to database
-            cur.execute(add_tree, indexed_species)
+    Returns
+    -------
+    dict
+        how many plants were added, e.g. {'added': 2906, 'updated': 0, 'unchanged': 0}
+    '''
+    first_id = connection.execute('SELECT COALESCE(MAX(Id), 0) FROM Plants').fetchone()[0]
+    i = first_id
+    batch = PlantColumns()
+    texts = []
+    states = []
+    finished = []
+    current_family = None
+    for fam, url, content_hash, species, description in parsed_pages:
+        if fam != current_family:
+            if current_family is not None:
+                finished.append([current_family, time.time()]) # every row of it is in this batch or an earlier one
+            current_family = fam
+        i += 1
+        batch.append(species) # its unique Id is i, given by batch.rows() below
+        texts.append(plant_text(i, species, description))
+        states.append([url, content_hash, time.time(), i])
+        if len(batch) == batch_size:
+            connection.executemany(add_tree, batch.rows(i - len(batch) + 1))
+            connection.executemany(add_plant_text, texts)
+            connection.executemany(save_crawl_state, states)
+            connection.executemany(save_checkpoint, finished)
+            connection.commit()
+            batch.clear()
+            texts = []
+            states = []
+            finished = []
+    if current_family is not None:
+        finished.append([current_family, time.time()])
+    connection.executemany(add_tree, batch.rows(i - len(batch) + 1))
+    connection.executemany(add_plant_text, texts)
+    connection.executemany(save_crawl_state, states)
+    connection.executemany(save_checkpoint, finished)
+    connection.commit()
+    return {'added': i - first_id, 'updated': 0, 'unchanged': 0}
+
+def sync_plants(connection, species_pages, batch_size=INSERT_BATCH):
+    '''Brings the Plants table up to date with freshly fetched species pages.
+    A page whose hash matches the one saved in CrawlState is not parsed again; only its fetch time is updated.
+    A changed page is parsed and its Plants and PlantsText rows are updated, and a new page is parsed and inserted.
+    Pages crawled before CrawlState existed are matched to their Plants row by GenusSpecies.
 
-    conn.commit()
+    Parameters
+    ----------
+    connection: sqlite3.Connection
+        the open michiganplants database
+    species_pages: iterable
+        (url, page) tuples, e.g. from iter_species_pages()
+    batch_size: int
+        how many pages are handled in one transaction
 
+    Returns
+    -------
+    dict
+        how many plants were added, updated and left unchanged, e.g. {'added': 1, 'updated': 3, 'unchanged': 2902}
+    '''
+    counts = {'added': 0, 'updated': 0, 'unchanged': 0}
+    plant_ids = None
+    pending = 0
+    for url, page in species_pages:
+        content_hash = hash_page(page)
+        state = connection.execute(select_crawl_state, [url]).fetchone()
+        if state is not None and state[0] == content_hash:
+            connection.execute(touch_crawl_state, [time.time(), url])
+            counts['unchanged'] += 1
+        else:
+            species = parse_plant_page(page)
+            plant_id = None
+            if state is not None:
+                plant_id = state[1]
+            if plant_id is None:
+                if plant_ids is None:
+                    plant_ids = dict(connection.execute('SELECT GenusSpecies, Id FROM Plants').fetchall())
+                plant_id = plant_ids.get(species[1])
+            if plant_id is None:
+                plant_id = connection.execute(add_tree, [None] + plant_row(species)).lastrowid
+                plant_ids[species[1]] = plant_id
+                counts['added'] += 1
+            else:
+                connection.execute(update_plant, plant_row(species) + [plant_id])
+                connection.execute('DELETE FROM PlantsText WHERE rowid = ?', [plant_id])
+                counts['updated'] += 1
+            connection.execute(add_plant_text, plant_text(plant_id, species, species_text(page)))
+            connection.execute(save_crawl_state, [url, content_hash, time.time(), plant_id])
+        pending += 1
+        if pending == batch_size:
+            connection.commit()
+            pending = 0
+    connection.commit()
+    return counts
+
+def crawl(connection, incremental=False, resume=False, workers=1, max_age_days=None):
+    '''Crawls every Michigan family into the Plants table, one family at a time.
+    After each family is written it is recorded in CrawlCheckpoint, so an interrupted crawl can be
+    picked up where it stopped with resume=True. The checkpoint is cleared when the crawl finishes.
 
+    Parameters
+    ----------
+    connection: sqlite3.Connection
+        the open michiganplants database
+    incremental: bool
+        if False, the Plants table is dropped and rebuilt from the cached pages.
+        If True, the table is kept, every page is fetched again from the site, and only
+        pages whose content changed are parsed and written. Cached pages are fetched with
+        conditional requests, so a page the site reports unchanged (304) isn't downloaded.
+    resume: bool
+        if True, families finished by an earlier, interrupted crawl are skipped
+    workers: int
+        when rebuilding, how many processes parse pages. The rows written are the same for any number of workers.
+    max_age_days: float
+        when incremental, species pages fetched less than this many days ago are read from the cache
+        instead of being fetched again. None fetches every page.
+
+    Returns
+    -------
+    dict
+        how many plants were added, updated and left unchanged
+    '''
+    start_build(connection, CRAWL_PRAGMAS) # not BULK_PRAGMAS: the committed families must survive a crash to be resumed
+    connection.execute(create_crawl_state)
+    connection.execute(create_crawl_checkpoint)
+    if not resume:
+        connection.execute('DELETE FROM CrawlCheckpoint')
+        if not incremental:
+            connection.execute(drop_plants)
+            connection.execute(drop_plants_text)
+            connection.execute('DELETE FROM CrawlState')
+    connection.execute(create_plants)
+    connection.execute(create_plants_text)
+    connection.commit()
+    if incremental or resume:
+        migrate(connection) # rows are about to be written into the existing Plants table, so it must have every column
+
+    get_fetcher().fetch_all([SITE_URL + 'browse.aspx'], refresh=incremental) # through FETCH_ORIGIN, like every other page
+    michigan_families = browse_families()
+    finished = set(row[0] for row in connection.execute('SELECT Family FROM CrawlCheckpoint'))
+    remaining = [fam for fam in michigan_families if fam not in finished]
+    get_fetcher().fetch_all([make_family_url(fam) for fam in remaining], refresh=incremental)
+
+    start = time.perf_counter()
+    if incremental or resume:
+        max_age = max_age_days * 86400 if incremental and max_age_days is not None else None
+        counts = {'added': 0, 'updated': 0, 'unchanged': 0}
+        for fam in remaining:
+            fam_dict = build_family_url_dict(fam)
+            species_pages = iter_species_pages(fam_dict.values(), refresh=incremental and max_age is None, max_age=max_age)
+            fam_counts = sync_plants(connection, species_pages)
+            for key in counts:
+                counts[key] += fam_counts[key]
+            connection.execute(save_checkpoint, [fam, time.time()])
+            connection.commit()
+    elif workers > 1:
+        with ProcessPoolExecutor(workers, initializer=set_engine, initargs=[get_extractor().name]) as pool:
+            parsed_pages = iter_parsed_pages(iter_family_pages(remaining), pool, window=2 * workers)
+            counts = insert_plants(connection, parsed_pages)
+    else:
+        counts = insert_plants(connection, iter_parsed_pages(iter_family_pages(remaining)))
+    report_load('Plants', counts['added'] + counts['updated'], time.perf_counter() - start)
+
+    connection.execute('DELETE FROM CrawlCheckpoint')
+    connection.commit()
+    finish_build(connection, ['Plants'])
+    return counts
+
+################################################################################
+
+if __name__ == "__main__":
+    CACHE = open_cache()
+
+    parser = argparse.ArgumentParser(description='Crawl Michigan Flora into the Plants table')
+    parser.add_argument('--incremental', action='store_true', help='fetch every page again and only rewrite plants whose page changed')
+    parser.add_argument('--resume', action='store_true', help='continue an interrupted crawl from its checkpoint')
+    parser.add_argument('--origin', default=None, help='crawl this host instead of michiganflora.net (e.g. a FixtureServer)')
+    parser.add_argument('--engine', default='fast', help='page extraction engine: fast, soup or lxml (see PageExtract.py)')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes that parse pages when rebuilding')
+    parser.add_argument('--max-age', type=float, default=None, help='--incremental: reuse species pages fetched less than this many days ago')
+    args = parser.parse_args()
+    set_engine(args.engine)
+    if args.origin:
+        FETCH_ORIGIN = args.origin
+
+    counts = crawl(conn, args.incremental, args.resume, args.workers, args.max_age)
+    print('Added ' + str(counts['added']) + ', updated ' + str(counts['updated']) + ' and kept ' + str(counts['unchanged']) + ' species in the Plants table')
@@ -0,0 +1,241 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+create_pages = '''
+    CREATE TABLE IF NOT EXISTS "Pages" (
+        "Url" TEXT PRIMARY KEY,
+        "Body" TEXT NOT NULL,
+        "FetchedAt" REAL NOT NULL
+    );
+'''
+
+select_page = 'SELECT Body FROM Pages WHERE Url = ?'
+
+select_entry = 'SELECT Body, FetchedAt FROM Pages WHERE Url = ?'
+
+touch_page = 'UPDATE Pages SET FetchedAt = ? WHERE Url = ?'
+
+insert_page = '''
+    INSERT OR REPLACE INTO Pages ("Url", "Body", "FetchedAt")
+        VALUES (?, ?, ?)
+'''
+
+# imported pages never replace pages already fetched, so an import can be run again after a failure
+import_page = '''
+    INSERT OR IGNORE INTO Pages ("Url", "Body", "FetchedAt")
+        VALUES (?, ?, ?)
+'''
+
+# facts about the cache itself, e.g. which old JSON caches were fully imported
+create_meta = '''
+    CREATE TABLE IF NOT EXISTS "Meta" (
+        "Key" TEXT PRIMARY KEY,
+        "Value" TEXT NOT NULL
+    );
+'''
+
+select_meta = 'SELECT Value FROM Meta WHERE Key = ?'
+
+# the ETag and Last-Modified headers a page was sent with, for conditional requests (see PageFetcher.fetch())
+create_validators = '''
+    CREATE TABLE IF NOT EXISTS "Validators" (
+        "Url" TEXT PRIMARY KEY,
+        "ETag" TEXT,
+        "LastModified" TEXT
+    );
+'''
+
+select_validators = 'SELECT ETag, LastModified FROM Validators WHERE Url = ?'
+
+insert_validators = 'INSERT OR REPLACE INTO Validators ("Url", "ETag", "LastModified") VALUES (?, ?, ?)'
+
+insert_meta = 'INSERT OR REPLACE INTO Meta ("Key", "Value") VALUES (?, ?)'
+
+
+class PageCache:
+    '''a persistent cache of fetched pages, stored in its own sqlite file
+
+    Every entry is one row keyed by URL, so a lookup reads a single row through the primary key
+    index instead of parsing the whole cache, and a new entry is appended without rewriting the
+    old ones. The database runs in WAL mode so each write is a small append to the log.
+
+    Instance Attributes
+    -------------------
+    filename: string
+        the sqlite file holding the cache (e.g. 'plants_cache.sqlite')
+    '''
+    def __init__(self, filename):
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(create_pages)
+        self.conn.execute(create_meta)
+        self.conn.execute(create_validators)
+        self.conn.commit()
+
+    def get(self, url, default=None):
+        with self.lock:
+            row = self.conn.execute(select_page, [url]).fetchone()
+        if row is None:
+            return default
+        return row[0]
+
+    def get_entry(self, url):
+        ''' Returns (body, fetched_at) of a cached page, or None if it isn't cached '''
+        with self.lock:
+            return self.conn.execute(select_entry, [url]).fetchone()
+
+    def put(self, url, body, fetched_at=None, validators=None):
+        ''' Saves a page. validators is the (etag, last_modified) pair it was sent with, if it was fetched. '''
+        if fetched_at is None:
+            fetched_at = time.time()
+        with self.lock:
+            self.conn.execute(insert_page, [url, body, fetched_at])
+            if validators is not None:
+                self.conn.execute(insert_validators, [url] + list(validators))
+            self.conn.commit()
+
+    def touch(self, url, fetched_at=None):
+        ''' Marks a cached page as fetched again without changing it, e.g. after a 304 Not Modified '''
+        if fetched_at is None:
+            fetched_at = time.time()
+        with self.lock:
+            self.conn.execute(touch_page, [fetched_at, url])
+            self.conn.commit()
+
+    def validators(self, url):
+        ''' Returns the (etag, last_modified) headers a page was sent with; either can be None '''
+        with self.lock:
+            row = self.conn.execute(select_validators, [url]).fetchone()
+        return (None, None) if row is None else row
+
+    def put_many(self, entries):
+        ''' Adds many (url, body) pairs in a single transaction
+
+        Parameters
+        ----------
+        entries: iterable
+            (url, body) pairs
+
+        Returns
+        -------
+        int
+            the number of entries written
+        '''
+        now = time.time()
+        rows = [(url, body, now) for url, body in entries]
+        with self.lock:
+            self.conn.executemany(insert_page, rows)
+            self.conn.commit()
+        return len(rows)
+
+    def __contains__(self, url):
+        with self.lock:
+            row = self.conn.execute('SELECT 1 FROM Pages WHERE Url = ?', [url]).fetchone()
+        return row is not None
+
+    def __getitem__(self, url):
+        body = self.get(url)
+        if body is None:
+            raise KeyError(url)
+        return body
+
+    def __setitem__(self, url, body):
+        self.put(url, body)
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM Pages').fetchone()[0]
+
+    def keys(self):
+        with self.lock:
+            rows = self.conn.execute('SELECT Url FROM Pages ORDER BY Url').fetchall()
+        return [row[0] for row in rows]
+
+    def has_imported(self, json_filename):
+        ''' Tells whether import_json() has finished importing an old JSON cache of this name '''
+        with self.lock:
+            row = self.conn.execute(select_meta, ['imported:' + os.path.basename(json_filename)]).fetchone()
+        return row is not None
+
+    def import_json(self, json_filename, convert_key=None):
+        ''' Copies every entry of an old whole-file JSON cache into this cache, without replacing pages
+        already in it. Values that are not strings (e.g. decoded API responses) are stored as JSON text.
+        The entries and a Meta row marking the import as done are written in one transaction, so an
+        import that fails leaves nothing behind and is tried again.
+
+        Parameters
+        ----------
+        json_filename: string
+            path of the old cache (e.g. 'plants_cache.json')
+        convert_key: function
+            if given, turns each old key into the key it is stored under, or None to leave the entry out
+
+        Returns
+        -------
+        int
+            the number of entries imported
+        '''
+        with open(json_filename, 'r') as json_file:
+            old_cache = json.load(json_file)
+        now = time.time()
+        rows = []
+        for url, body in old_cache.items():
+            if convert_key is not None:
+                url = convert_key(url)
+                if url is None:
+                    continue
+            if not isinstance(body, str):
+                body = json.dumps(body)
+            rows.append((url, body, now))
+        with self.lock:
+            with self.conn:
+                self.conn.executemany(import_page, rows)
+                self.conn.execute(insert_meta, ['imported:' + os.path.basename(json_filename), str(now)])
+        return len(rows)
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+OPEN_CACHES = {}
+
+def open_page_cache(filename, legacy_json=None, convert_key=None):
+    ''' Opens the page cache stored in filename. The cache is opened once per process and the
+    same object is returned on every later call.
+    When an old JSON cache exists and hasn't been fully imported yet, its entries are imported
+    so nothing has to be fetched again.
+
+    Parameters
+    ----------
+    filename: string
+        the sqlite file holding the cache (e.g. 'plants_cache.sqlite')
+    legacy_json: string
+        an old whole-file JSON cache to import (e.g. 'plants_cache.json')
+    convert_key: function
+        turns the keys of the old cache into keys of this one (see PageCache.import_json())
+
+    Returns
+    -------
+    PageCache
+        the opened cache
+    '''
+    key = os.path.abspath(filename)
+    if key not in OPEN_CACHES:
+        cache = PageCache(filename)
+        if legacy_json is not None and os.path.exists(legacy_json) and not cache.has_imported(legacy_json):
+            try:
+                count = cache.import_json(legacy_json, convert_key)
+            except Exception:
+                cache.close()
+                raise
+            print('Imported ' + str(count) + ' pages from ' + legacy_json)
+        OPEN_CACHES[key] = cache
+    return OPEN_CACHES[key]
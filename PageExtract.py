@@ -0,0 +1,369 @@
+import argparse
+import html
+import re
+import time
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml.html
+except ImportError: # lxml is optional, the 'lxml' engine is only offered when it is installed
+    lxml = None
+
+# the <span> ids holding each field on a species page (e.g. https://michiganflora.net/species.aspx?id=11)
+SPECIES_SPANS = {
+    'family': 'ctl00_Content_Formview2_FAMILYLabel',
+    'scientific_name': 'ctl00_Content_speciesHeaderFormview_SCIENTIFIC_NAMELabel',
+    'common_name': 'ctl00_Content_FormviewDetails_common_nameLabel',
+    'physiognomy': 'ctl00_Content_FloraRepeater_ctl00_PHYSLabel',
+    'conservatism': 'ctl00_Content_FloraRepeater_ctl00_CLabel',
+    'wetness': 'ctl00_Content_FloraRepeater_ctl00_WLabel',
+}
+
+SPAN_FIELDS = {span_id: field for field, span_id in SPECIES_SPANS.items()}
+SPAN_PATTERN = re.compile(r'<span\b[^>]*?\bid\s*=\s*["\'](' + '|'.join(SPAN_FIELDS) + r')["\'][^>]*>(.*?)</span\s*>', re.S | re.I)
+DIV_PATTERN = re.compile(r'<(/?)div\b[^>]*>', re.I)
+ROW_PATTERN = re.compile(r'<tr\b.*?</tr\s*>', re.S | re.I)
+LINK_PATTERN = re.compile(r'<a\b([^>]*)>(.*?)</a\s*>', re.S | re.I)
+HREF_PATTERN = re.compile(r'\bhref\s*=\s*(?:"([^"]*)"|\'([^\']*)\')', re.I)
+CLASS_PATTERN = re.compile(r'\bclass\s*=\s*(?:"([^"]*)"|\'([^\']*)\')', re.I)
+TAG_PATTERN = re.compile(r'<[^>]*>')
+SCRIPT_PATTERN = re.compile(r'<(script|style)\b.*?</\1\s*>', re.S | re.I)
+COMMENT_PATTERN = re.compile(r'<!--.*?-->', re.S)
+
+# everything on a species page from the first element of the ASP.NET content area on is the species' own text;
+# what comes before it is the site header and navigation, which is the same on every page
+CONTENT_PATTERN = re.compile(r'<[a-z][^>]*\bid\s*=\s*["\']ctl00_Content_', re.I)
+
+
+class SoupExtractor:
+    '''reads species, family and browse pages by building a full BeautifulSoup tree (the original parser)'''
+    name = 'soup'
+
+    def species_fields(self, page):
+        ''' Reads the six species fields from a species page
+
+        Parameters
+        ----------
+        page: string
+            the HTML of a species page
+
+        Returns
+        -------
+        dict
+            the text of each field, e.g. {'family': 'Adoxaceae', 'scientific_name': 'Sambucus canadensis L.', ...}
+        '''
+        soup = BeautifulSoup(page, 'html.parser')
+        fields = {}
+        for field, span_id in SPECIES_SPANS.items():
+            fields[field] = soup.find_all('span', {'id':span_id})[0].text
+        return fields
+
+    def family_links(self, page):
+        ''' Reads the species links from a family page
+
+        Parameters
+        ----------
+        page: string
+            the HTML of a family page
+
+        Returns
+        -------
+        list
+            (href, link text) tuples, e.g. [('species.aspx?id=11', 'Sambucus canadensis'), ...]
+
+        Raises
+        ------
+        ValueError
+            if the page has no taxaList div (e.g. an error or maintenance page), rather than reading
+            the links of some other layout as species
+        '''
+        soup = BeautifulSoup(page, 'html.parser')
+        family_parent = soup.find('div', class_='taxaList')
+        if family_parent is None:
+            raise ValueError('not a family page: it has no taxaList div')
+        family_divs = family_parent.find_all('div', recursive=False)
+        links = []
+        for div in family_divs:
+            rows = div.find_all('tr')
+            for row in rows:
+                fam_link_tag = row.find('a')
+                if fam_link_tag is None or not fam_link_tag.has_attr('href'): # e.g. a header row
+                    continue
+                links.append((fam_link_tag['href'], fam_link_tag.text.strip()))
+        return links
+
+    def browse_names(self, page):
+        ''' Reads the family names from the browse page
+
+        Parameters
+        ----------
+        page: string
+            the HTML of https://michiganflora.net/browse.aspx
+
+        Returns
+        -------
+        list
+            family names in page order, e.g. ['Acanthaceae', 'Acoraceae', ...]
+
+        Raises
+        ------
+        ValueError
+            if the page has no browse-links div (e.g. an error or maintenance page)
+        '''
+        soup = BeautifulSoup(page, 'html.parser')
+        parent = soup.find('div', class_='browse-links')
+        if parent is None:
+            raise ValueError('not the browse page: it has no browse-links div')
+        families = parent.find_all('a', class_='browse')
+        return [fam.text.strip() for fam in families]
+
+
+def tag_text(fragment):
+    return html.unescape(TAG_PATTERN.sub('', fragment))
+
+def species_text(page):
+    ''' Returns the readable text of a species page's content area (descriptions, habitat notes and the fields
+    themselves) with tags, scripts and extra whitespace removed, for the full-text index in PlantsText.
+    This is the same for every engine.
+
+    Parameters
+    ----------
+    page: string
+        the HTML of a species page
+
+    Returns
+    -------
+    string
+        e.g. 'Adoxaceae Sambucus canadensis L. common elder Nt Shrub 3 -3 Moist thickets, ...'
+    '''
+    match = CONTENT_PATTERN.search(page)
+    content = page[match.start():] if match else page
+    content = COMMENT_PATTERN.sub(' ', SCRIPT_PATTERN.sub(' ', content))
+    return ' '.join(html.unescape(TAG_PATTERN.sub(' ', content)).split())
+
+def div_contents(page, class_name):
+    ''' Returns the inside of the first <div> with class_name, matching nested divs to find its end.
+    Returns None if there is no such div or it is never closed.
+    '''
+    for match in DIV_PATTERN.finditer(page):
+        if match.group(1):
+            continue
+        classes = CLASS_PATTERN.search(match.group(0))
+        if classes and class_name in (classes.group(1) or classes.group(2)).split():
+            break
+    else:
+        return None
+    start = match.end()
+    depth = 1
+    for tag in DIV_PATTERN.finditer(page, start):
+        depth += -1 if tag.group(1) else 1
+        if depth == 0:
+            return page[start:tag.start()]
+    return None
+
+def child_divs(fragment):
+    ''' Returns the inside of every <div> at the top level of an HTML fragment (not the divs nested in them),
+    like BeautifulSoup's find_all('div', recursive=False)
+    '''
+    contents = []
+    depth = 0
+    start = 0
+    for tag in DIV_PATTERN.finditer(fragment):
+        if tag.group(1):
+            if depth == 0: # a stray closing tag
+                continue
+            depth -= 1
+            if depth == 0:
+                contents.append(fragment[start:tag.start()])
+        else:
+            if depth == 0:
+                start = tag.end()
+            depth += 1
+    return contents
+
+
+class FastExtractor:
+    '''reads pages with a few regular expressions that pull out only the elements we need,
+    without building a document tree. When a page doesn't look the way the expressions expect
+    (a field or list is missing, or a field has a nested <span>), the page is handed to the fallback
+    extractor, which raises ValueError for a family or browse page it can't read either.
+
+    Instance Attributes
+    -------------------
+    fallback: SoupExtractor
+        the extractor used for pages the fast path can't read
+    '''
+    name = 'fast'
+
+    def __init__(self, fallback=None):
+        if fallback is None:
+            fallback = SoupExtractor()
+        self.fallback = fallback
+
+    def species_fields(self, page):
+        fields = {}
+        for match in SPAN_PATTERN.finditer(page):
+            field = SPAN_FIELDS[match.group(1)]
+            if field in fields: # like find_all(...)[0], the first span with an id wins
+                continue
+            inner = match.group(2)
+            if '<span' in inner.lower():
+                return self.fallback.species_fields(page)
+            fields[field] = tag_text(inner)
+        if len(fields) < len(SPECIES_SPANS):
+            return self.fallback.species_fields(page)
+        return fields
+
+    def family_links(self, page):
+        taxa_list = div_contents(page, 'taxaList')
+        if taxa_list is None:
+            return self.fallback.family_links(page)
+        links = []
+        for div in child_divs(taxa_list): # only the rows of its own divs, like the soup extractor
+            for row in ROW_PATTERN.finditer(div):
+                link = LINK_PATTERN.search(row.group(0))
+                href = HREF_PATTERN.search(link.group(1)) if link else None
+                if href is None:
+                    continue
+                links.append((html.unescape(href.group(1) or href.group(2)), tag_text(link.group(2)).strip()))
+        return links
+
+    def browse_names(self, page):
+        browse_links = div_contents(page, 'browse-links')
+        if browse_links is None:
+            return self.fallback.browse_names(page)
+        names = []
+        for link in LINK_PATTERN.finditer(browse_links):
+            classes = CLASS_PATTERN.search(link.group(1))
+            if classes and 'browse' in (classes.group(1) or classes.group(2)).split():
+                names.append(tag_text(link.group(2)).strip())
+        return names
+
+
+class LxmlExtractor:
+    '''reads pages with lxml's C parser; only available when lxml is installed
+
+    Instance Attributes
+    -------------------
+    fallback: SoupExtractor
+        the extractor used for pages lxml can't read
+    '''
+    name = 'lxml'
+
+    def __init__(self, fallback=None):
+        if fallback is None:
+            fallback = SoupExtractor()
+        self.fallback = fallback
+
+    def species_fields(self, page):
+        doc = lxml.html.fromstring(page)
+        fields = {}
+        for field, span_id in SPECIES_SPANS.items():
+            spans = doc.xpath('//span[@id=$span_id]', span_id=span_id)
+            if not spans:
+                return self.fallback.species_fields(page)
+            fields[field] = spans[0].text_content()
+        return fields
+
+    def family_links(self, page):
+        doc = lxml.html.fromstring(page)
+        taxa_lists = doc.xpath('//div[contains(concat(" ", @class, " "), " taxaList ")]')
+        if not taxa_lists:
+            return self.fallback.family_links(page)
+        links = []
+        for row in taxa_lists[0].xpath('./div//tr'):
+            link = row.find('.//a')
+            if link is None or link.get('href') is None:
+                continue
+            links.append((link.get('href'), link.text_content().strip()))
+        return links
+
+    def browse_names(self, page):
+        doc = lxml.html.fromstring(page)
+        browse_links = doc.xpath('//div[contains(concat(" ", @class, " "), " browse-links ")]')
+        if not browse_links:
+            return self.fallback.browse_names(page)
+        return [link.text_content().strip() for link in browse_links[0].xpath('.//a[contains(concat(" ", @class, " "), " browse ")]')]
+
+
+ENGINES = {'fast': FastExtractor, 'soup': SoupExtractor}
+if lxml is not None:
+    ENGINES['lxml'] = LxmlExtractor
+
+EXTRACTOR = None
+
+def get_extractor():
+    ''' Returns the extractor used by MichiganFlora.py (the fast one, unless set_engine() picked another)
+    '''
+    global EXTRACTOR
+    if EXTRACTOR is None:
+        EXTRACTOR = FastExtractor()
+    return EXTRACTOR
+
+def set_engine(name):
+    ''' Picks the extraction engine by name
+
+    Parameters
+    ----------
+    name: string
+        one of the keys of ENGINES, e.g. 'fast', 'soup' or 'lxml'
+
+    Returns
+    -------
+    the new extractor
+    '''
+    global EXTRACTOR
+    EXTRACTOR = ENGINES[name]()
+    return EXTRACTOR
+
+
+def benchmark(pages, engines, repeat=1):
+    ''' Times each engine reading the same species pages and checks that they agree
+
+    Parameters
+    ----------
+    pages: list
+        the HTML of species pages
+    engines: list
+        names of the engines to time, e.g. ['soup', 'fast']
+    repeat: int
+        how many times every page is read
+
+    Returns
+    -------
+    dict
+        pages per second for each engine, e.g. {'soup': 310.2, 'fast': 9120.4}
+    '''
+    results = {}
+    reference = None
+    for name in engines:
+        extractor = ENGINES[name]()
+        start = time.perf_counter()
+        for i in range(repeat):
+            fields = [extractor.species_fields(page) for page in pages]
+        elapsed = time.perf_counter() - start
+        results[name] = len(pages) * repeat / elapsed
+        if reference is None:
+            reference = fields
+        elif fields != reference:
+            print('Warning: ' + name + ' does not read the same fields as ' + engines[0])
+    return results
+
+
+if __name__ == "__main__":
+    from PageCache import open_page_cache
+
+    parser = argparse.ArgumentParser(description='Compare extraction engines on the cached species pages')
+    parser.add_argument('--cache', default='plants_cache.sqlite', help='page cache holding the species pages')
+    parser.add_argument('--limit', type=int, default=None, help='only use this many pages')
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+
+    cache = open_page_cache(args.cache)
+    urls = [url for url in cache.keys() if 'species.aspx' in url][:args.limit]
+    pages = [cache[url] for url in urls]
+    print('Reading ' + str(len(pages)) + ' cached species pages')
+    engines = ['soup'] + [name for name in ENGINES if name != 'soup']
+    for name, rate in benchmark(pages, engines, args.repeat).items():
+        print(name.ljust(6) + ' ' + str(round(rate, 1)) + ' pages per second')
@@ -0,0 +1,167 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+
+
+class HostLimiter:
+    '''limits how many requests run at once against each host and how often they start
+
+    Instance Attributes
+    -------------------
+    max_concurrent: int
+        the most requests that can be open against one host at the same time
+
+    min_interval: float
+        the least number of seconds between the starts of two requests to one host
+    '''
+    def __init__(self, max_concurrent=4, min_interval=0.1):
+        self.max_concurrent = max_concurrent
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.slots = {}
+        self.next_start = {}
+
+    def acquire(self, host):
+        with self.lock:
+            if host not in self.slots:
+                self.slots[host] = threading.BoundedSemaphore(self.max_concurrent)
+                self.next_start[host] = 0.0
+            slot = self.slots[host]
+        slot.acquire()
+        with self.lock: # reserve the next start time so waiting threads are spaced out
+            now = time.monotonic()
+            start = max(now, self.next_start[host])
+            self.next_start[host] = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+    def release(self, host):
+        self.slots[host].release()
+
+
+class PageFetcher:
+    '''fetches many pages at once with a bounded thread pool, reading and filling a page cache
+
+    Instance Attributes
+    -------------------
+    cache: PageCache
+        pages already in the cache are returned without touching the network
+
+    max_workers: int
+        the size of the thread pool
+
+    limiter: HostLimiter
+        the per-host concurrency and rate limit
+
+    origin: string
+        if given, requests are sent to this scheme and host instead of the one in the URL
+        (e.g. 'http://127.0.0.1:8000' for a FixtureServer). The cache is still keyed by the original URL.
+    '''
+    def __init__(self, cache, max_workers=8, per_host=4, min_interval=0.1, origin=None):
+        self.cache = cache
+        self.max_workers = max_workers
+        self.limiter = HostLimiter(per_host, min_interval)
+        self.origin = origin
+        self.local = threading.local()
+
+    def session(self):
+        if not hasattr(self.local, 'session'): # requests sessions are not shared between threads
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def request_url(self, url):
+        if self.origin is None:
+            return url
+        parts = urlsplit(url)
+        request_url = self.origin.rstrip('/') + parts.path
+        if parts.query:
+            request_url += '?' + parts.query
+        return request_url
+
+    def fetch(self, url, revalidate=False):
+        ''' Fetches one page from the network and saves it in the cache
+
+        Parameters
+        ----------
+        url: string
+            the URL of the page (also its cache key)
+        revalidate: bool
+            if True the page is cached, and the request carries the ETag and Last-Modified it was last sent
+            with (If-None-Match, If-Modified-Since), so a server that supports them answers 304 with no body
+            when the page hasn't changed
+
+        Returns
+        -------
+        string
+            the text of the page
+        '''
+        headers = {}
+        if revalidate:
+            etag, last_modified = self.cache.validators(url)
+            if etag is not None:
+                headers['If-None-Match'] = etag
+            if last_modified is not None:
+                headers['If-Modified-Since'] = last_modified
+        host = urlsplit(url).netloc
+        self.limiter.acquire(host)
+        try:
+            response = self.session().get(self.request_url(url), headers=headers)
+            if response.status_code != 304:
+                response.raise_for_status()
+        finally:
+            self.limiter.release(host)
+        if response.status_code == 304:
+            page = self.cache.get(url)
+            if page is not None:
+                self.cache.touch(url)
+                return page
+            return self.fetch(url) # the page left the cache since it was checked
+        self.cache.put(url, response.text, validators=(response.headers.get('ETag'), response.headers.get('Last-Modified')))
+        return response.text
+
+    def fetch_all(self, urls, refresh=False, max_age=None):
+        ''' Returns the text of every page in urls, in the same order as urls.
+        Cached pages are read from the cache; the rest are fetched concurrently. Cached pages that are
+        fetched again are revalidated with conditional requests (see fetch()).
+
+        Parameters
+        ----------
+        urls: list
+            the URLs to fetch, duplicates are only fetched once
+        refresh: bool
+            if True, every page is fetched again even if it is cached
+        max_age: float
+            if given, cached pages fetched more than this many seconds ago are fetched again
+
+        Returns
+        -------
+        list
+            the text of each page, lined up with urls
+        '''
+        pages = {}
+        missing = []
+        stale = []
+        seen = set()
+        now = time.time()
+        for url in urls:
+            if url in seen:
+                continue
+            seen.add(url)
+            entry = self.cache.get_entry(url)
+            if entry is None:
+                missing.append(url)
+            elif refresh or (max_age is not None and now - entry[1] >= max_age):
+                stale.append(url)
+            else:
+                pages[url] = entry[0]
+        if missing or stale:
+            print("Fetching " + str(len(missing)) + " pages" + (" and revalidating " + str(len(stale)) if stale else ""))
+            fetches = missing + stale
+            workers = min(self.max_workers, len(fetches))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for url, page in zip(fetches, executor.map(self.fetch, fetches, [False] * len(missing) + [True] * len(stale))):
+                    pages[url] = page
+        return [pages[url] for url in urls]
@@ -0,0 +1,106 @@
+import threading
+
+from PlantsDB import DB_FILENAME, db_version, get_dao
+
+
+class PlantCatalog:
+    '''every woody plant family and species held in memory, so the interactive loop in FinalCode.py can
+    check names and look plants up without running any SQL.
+    The catalog is loaded the first time it is used and loaded again whenever the database changes (see PlantsDB.db_version()).
+
+    Instance Attributes
+    -------------------
+    db_filename: string
+        the database the catalog is loaded from
+
+    families: list
+        the unique families, in the order unique_families() lists them
+
+    species: list
+        the genus & species name of every woody plant
+
+    family_set: set
+        the same names as families, for O(1) validation
+
+    species_set: set
+        the same names as species, for O(1) validation
+
+    family_plants: dict
+        maps a family to its (genus_species, common_name) tuples
+        e.g. {'Pinaceae': [('Larix laricina', 'larch, tamarack'), ...], ...}
+
+    species_rows: dict
+        maps a genus_species to its species_info() rows (one for each lab site)
+    '''
+    def __init__(self, db_filename=DB_FILENAME):
+        self.db_filename = db_filename
+        self.lock = threading.Lock()
+        self.version = None
+
+    def file_version(self):
+        return db_version(self.db_filename)
+
+    def refresh(self):
+        ''' Loads the catalog if it was never loaded or the database file changed since it was
+        '''
+        version = self.file_version()
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            dao = get_dao(self.db_filename)
+            families = dao.families()
+            species = dao.species()
+            family_plants = {fam: [] for fam in families}
+            for fam, genus_species, common_name in dao.catalog_plants():
+                family_plants[fam].append((genus_species, common_name))
+            for plants in family_plants.values():
+                plants.sort() # the order list_plants_in_family() printed them in
+            species_rows = {}
+            for row in dao.catalog_species_info():
+                species_rows.setdefault(row[0], []).append(row[1:])
+
+            self.families = families
+            self.species = species
+            self.family_set = set(families)
+            self.species_set = set(species)
+            self.family_plants = family_plants
+            self.species_rows = species_rows
+            self.version = version
+
+    def has_family(self, fam):
+        self.refresh()
+        return fam in self.family_set
+
+    def has_species(self, species):
+        self.refresh()
+        return species in self.species_set
+
+    def list_families(self):
+        self.refresh()
+        return self.families
+
+    def list_species(self):
+        self.refresh()
+        return self.species
+
+    def plants_in_family(self, fam):
+        self.refresh()
+        return self.family_plants.get(fam, [])
+
+    def species_info(self, species):
+        self.refresh()
+        return self.species_rows.get(species, [])
+
+
+CATALOGS = {}
+CATALOG_LOCK = threading.Lock()
+
+def get_catalog(db_filename=DB_FILENAME):
+    ''' Returns the PlantCatalog for db_filename, creating it the first time it is asked for
+    '''
+    with CATALOG_LOCK:
+        if db_filename not in CATALOGS:
+            CATALOGS[db_filename] = PlantCatalog(db_filename)
+        return CATALOGS[db_filename]
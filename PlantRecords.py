@@ -0,0 +1,178 @@
+import sys
+from array import array
+from typing import NamedTuple
+
+from PlantsDB import plant_row
+
+
+class PlantRecord(NamedTuple):
+    '''a plant species found in the state of Michigan, as read from its Michigan Flora page.
+    A NamedTuple has no per-instance __dict__, so a record costs one small tuple, and it is already the
+    list of facts plant_row() and executemany take.
+
+    Instance Attributes
+    -------------------
+    family: string
+        the family of a plant species (e.g. 'Magnoliaceae')
+
+    genus_species: string
+        the genus and species of a plant (e.g. 'Liriodendron tulipifera')
+
+    common_name: string
+        the common name of a plant (e.g. 'tulip tree')
+
+    physiognomy: string
+        whether a plant is native (Nt) or non-native (Ad) and its structure (e.g. 'Nt Tree', 'Ad Shrub')
+
+    conservatism: string
+        the coefficient of conservatism as shown on the page, 0 to 10, or '*' (e.g. '9')
+
+    wetness: string
+        the coefficient of wetness as shown on the page, -5 to 5, or '*' (e.g. '-3')
+    '''
+    family: str
+    genus_species: str
+    common_name: str
+    physiognomy: str
+    conservatism: str
+    wetness: str
+
+    @property
+    def genus(self):
+        return self.genus_species.split()[0]
+
+    @property
+    def species(self):
+        return self.genus_species.split()[1]
+
+    def info(self):
+        return self.genus_species + ' is in the ' + self.family + ' family.'
+
+    def plant_facts(self): # returns a list of everything to be added to database
+        return list(self)
+
+
+class PlantColumns:
+    '''many species held column by column, decoded like a Plants row (see PlantsDB.plant_row()).
+    Families, physiognomies and growth forms repeat across thousands of species, so each is stored once in a
+    dictionary list and every row keeps a small integer code; the coefficients and IsNative are packed into
+    arrays. rows() feeds executemany without building a list per species, and to_numpy() hands the numeric
+    columns to NumPy without copying them.
+
+    Instance Attributes
+    -------------------
+    family_codes: array.array
+    physiognomy_codes: array.array
+    growth_form_codes: array.array
+        the position of each row's value in families, physiognomies and growth_forms
+
+    genus_species: list
+    common_names: list
+        the names of every row, interned
+
+    conservatism: array.array
+    wetness: array.array
+        the coefficients of every row as doubles, nan where the species has none
+
+    is_native: array.array
+        1 for every native species, 0 for the rest
+    '''
+    __slots__ = ('families', 'physiognomies', 'growth_forms', 'codes', 'family_codes', 'physiognomy_codes',
+                 'growth_form_codes', 'genus_species', 'common_names', 'conservatism', 'wetness', 'is_native')
+
+    def __init__(self, records=()):
+        self.families = []
+        self.physiognomies = []
+        self.growth_forms = [None]
+        self.codes = ({}, {}, {None: 0}) # value -> code, for families, physiognomies and growth forms
+        self.clear()
+        self.extend(records)
+
+    def clear(self):
+        ''' Empties the columns but keeps the dictionaries, so the next batch reuses their codes '''
+        self.family_codes = array('H')
+        self.physiognomy_codes = array('H')
+        self.growth_form_codes = array('H')
+        self.genus_species = []
+        self.common_names = []
+        self.conservatism = array('d')
+        self.wetness = array('d')
+        self.is_native = array('B')
+
+    def code(self, which, values, value):
+        codes = self.codes[which]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(values)
+            values.append(value)
+        return code
+
+    def append(self, facts):
+        ''' Adds a species from its scraped facts, e.g. a PlantRecord '''
+        self.append_row(plant_row(facts))
+
+    def append_row(self, row):
+        ''' Adds a species from its decoded Plants values (every column but Id), e.g. a row of
+        SELECT Family, GenusSpecies, CommonName, Physiognomy, ConservatismCoef, WetnessCoef, IsNative, GrowthForm
+        '''
+        family, genus_species, common_name, physiognomy, conservatism, wetness, is_native, growth_form = row
+        self.family_codes.append(self.code(0, self.families, family))
+        self.genus_species.append(sys.intern(genus_species))
+        self.common_names.append(sys.intern(common_name))
+        self.physiognomy_codes.append(self.code(1, self.physiognomies, physiognomy))
+        self.conservatism.append(float('nan') if conservatism is None else conservatism)
+        self.wetness.append(float('nan') if wetness is None else wetness)
+        self.is_native.append(is_native)
+        self.growth_form_codes.append(self.code(2, self.growth_forms, growth_form))
+
+    def extend(self, records):
+        for facts in records:
+            self.append(facts)
+
+    def __len__(self):
+        return len(self.genus_species)
+
+    def row(self, i):
+        ''' Returns the decoded Plants values of row i, with None for a missing coefficient '''
+        conservatism = self.conservatism[i]
+        wetness = self.wetness[i]
+        return (self.families[self.family_codes[i]], self.genus_species[i], self.common_names[i],
+                self.physiognomies[self.physiognomy_codes[i]], None if conservatism != conservatism else conservatism,
+                None if wetness != wetness else wetness, self.is_native[i], self.growth_forms[self.growth_form_codes[i]])
+
+    def rows(self, first_id=None):
+        ''' Yields every row for executemany, e.g. with MichiganFlora.add_tree
+
+        Parameters
+        ----------
+        first_id: int
+            if given, each row starts with its Plants Id: first_id, first_id + 1, ...; if None, with None
+            (so sqlite assigns it)
+
+        Returns
+        -------
+        generator
+            (Id, Family, GenusSpecies, CommonName, Physiognomy, ConservatismCoef, WetnessCoef, IsNative, GrowthForm) tuples
+        '''
+        for i in range(len(self)):
+            yield (None if first_id is None else first_id + i,) + self.row(i)
+
+    def to_numpy(self):
+        ''' Returns the numeric columns as NumPy arrays that share memory with the columns (no copy)
+
+        Returns
+        -------
+        dict
+            {'conservatism': float64, 'wetness': float64, 'is_native': bool, 'family': uint16 codes into
+            families, 'growth_form': uint16 codes into growth_forms}. While they are alive the columns
+            can't grow (array raises BufferError), so take them once a batch is complete.
+        '''
+        import numpy as np
+
+        return {
+            'conservatism': np.frombuffer(self.conservatism, dtype=np.float64),
+            'wetness': np.frombuffer(self.wetness, dtype=np.float64),
+            'is_native': np.frombuffer(self.is_native, dtype=np.uint8).view(bool),
+            'family': np.frombuffer(self.family_codes, dtype=np.uint16),
+            'growth_form': np.frombuffer(self.growth_form_codes, dtype=np.uint16),
+        }
@@ -0,0 +1,254 @@
+import argparse
+import heapq
+import threading
+import time
+from collections import Counter
+from itertools import chain
+from operator import itemgetter
+
+from PlantsDB import DB_FILENAME, db_version, get_dao
+
+KINDS = ('genus_species', 'family', 'common_name')
+
+
+def normalize(name):
+    return ' '.join(name.lower().split())
+
+def trigrams(term):
+    padded = '  ' + term + ' '
+    return set(padded[i:i + 3] for i in range(len(padded) - 2))
+
+def edit_distance(a, b, limit):
+    ''' Counts the insertions, deletions, substitutions and swaps of neighbouring letters that turn a into b
+    (optimal string alignment distance). Only the cells within limit of the diagonal are computed, and the
+    count stops early, returning limit + 1, once the distance must be above limit.
+
+    Parameters
+    ----------
+    a: string
+    b: string
+    limit: int
+        the largest distance worth knowing exactly
+
+    Returns
+    -------
+    int
+        e.g. edit_distance('magnolaceae', 'magnoliaceae', 2) is 1
+    '''
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    too_far = limit + 1
+    before = None
+    previous = [j if j <= limit else too_far for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        row = [too_far] * (len(b) + 1)
+        if i <= limit:
+            row[0] = i
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            best = min(previous[j] + 1, row[j - 1] + 1, previous[j - 1] + cost)
+            if cost and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                best = min(best, before[j - 2] + 1)
+            row[j] = best
+        if min(row) > limit:
+            return too_far
+        before, previous = previous, row
+    return min(previous[-1], too_far)
+
+def typo_limit(term):
+    if len(term) <= 4:
+        return 1
+    if len(term) <= 8:
+        return 2
+    return 3
+
+
+class PlantSearch:
+    '''a search index over the genus & species, family and common names of every plant in the Plants table.
+    A trie answers prefix completion and a trigram index finds close spellings of a misspelled name,
+    which are then ranked by edit distance.
+
+    Instance Attributes
+    -------------------
+    terms: list
+        the normalized form of every name (e.g. 'sugar maple')
+
+    entries: list
+        for each term, the (name, kind, genus_species) tuples it stands for, e.g.
+        [('sugar maple', 'common_name', 'Acer saccharum')]. For a family, the last item is the family name.
+
+    trie: dict
+        nested dicts keyed by letter; the key None holds the ids of the terms ending at that node
+
+    grams: dict
+        maps every trigram to the ids of the terms that contain it
+    '''
+    def __init__(self, plants):
+        ''' plants: (genus_species, family, common_name) tuples, e.g. from PlantsDAO.all_plant_names() '''
+        term_ids = {}
+        self.terms = []
+        self.entries = []
+        self.trie = {}
+        self.grams = {}
+
+        def add(name, kind, target):
+            term = normalize(name)
+            if not term:
+                return
+            if term not in term_ids:
+                term_ids[term] = len(self.terms)
+                self.terms.append(term)
+                self.entries.append([])
+                self.add_term(term, term_ids[term])
+            entry = (name.strip(), kind, target)
+            if entry not in self.entries[term_ids[term]]:
+                self.entries[term_ids[term]].append(entry)
+
+        for genus_species, family, common_name in plants:
+            add(genus_species, 'genus_species', genus_species)
+            add(family, 'family', family)
+            for name in common_name.split(','): # e.g. 'sweet-flag, calamus'
+                add(name, 'common_name', genus_species)
+
+    def add_term(self, term, term_id):
+        node = self.trie
+        for letter in term:
+            node = node.setdefault(letter, {})
+        node.setdefault(None, []).append(term_id)
+        for gram in trigrams(term):
+            self.grams.setdefault(gram, []).append(term_id)
+
+    def matches(self, term_id, kinds, accept):
+        results = []
+        for entry in self.entries[term_id]:
+            if kinds is not None and entry[1] not in kinds:
+                continue
+            if accept is not None and not accept(entry[2]):
+                continue
+            results.append(entry)
+        return results
+
+    def complete(self, prefix, limit=10, kinds=None, accept=None):
+        ''' Finds names that start with prefix, in alphabetical order
+
+        Parameters
+        ----------
+        prefix: string
+            the start of a name, e.g. 'acer sac'
+        limit: int
+            the most results to return
+        kinds: list
+            only return these kinds of names (see KINDS); all kinds if None
+        accept: function
+            if given, only names whose genus_species (or family) passes accept() are returned
+
+        Returns
+        -------
+        list
+            (name, kind, genus_species) tuples, e.g. [('Acer saccharinum', 'genus_species', 'Acer saccharinum'), ...]
+        '''
+        node = self.trie
+        for letter in normalize(prefix):
+            node = node.get(letter)
+            if node is None:
+                return []
+        results = []
+        stack = [node]
+        while stack and len(results) < limit:
+            node = stack.pop()
+            for term_id in node.get(None, []):
+                results.extend(self.matches(term_id, kinds, accept))
+            letters = sorted(letter for letter in node if letter is not None)
+            stack.extend(node[letter] for letter in reversed(letters))
+        return results[:limit]
+
+    def suggest(self, query, limit=5, kinds=None, accept=None, candidates=20):
+        ''' Finds the names closest to a possibly misspelled query
+
+        Parameters
+        ----------
+        query: string
+            what the user typed, e.g. 'Magnolaceae'
+        limit: int
+            the most results to return
+        kinds: list
+            only return these kinds of names (see KINDS); all kinds if None
+        accept: function
+            if given, only names whose genus_species (or family) passes accept() are returned
+        candidates: int
+            how many names sharing the most trigrams with the query are compared letter by letter
+
+        Returns
+        -------
+        list
+            (name, kind, genus_species, distance) tuples, closest first, e.g.
+            [('Magnoliaceae', 'family', 'Magnoliaceae', 1)]
+        '''
+        term = normalize(query)
+        if not term:
+            return []
+        grams = trigrams(term)
+        counts = Counter(chain.from_iterable(self.grams.get(gram, ()) for gram in grams))
+        limit_distance = typo_limit(term)
+        # one edit changes at most 3 trigrams, so a name within limit_distance edits shares at least this many
+        needed = len(grams) - 3 * limit_distance
+        close = [item for item in counts.items() if item[1] >= needed]
+        ranked = []
+        compared = 0
+        for term_id, shared in heapq.nlargest(candidates * 4, close, key=itemgetter(1)):
+            if abs(len(self.terms[term_id]) - len(term)) > limit_distance:
+                continue
+            entries = self.matches(term_id, kinds, accept)
+            if not entries:
+                continue
+            distance = edit_distance(term, self.terms[term_id], limit_distance)
+            if distance <= limit_distance:
+                ranked.append((distance, -shared, self.terms[term_id], entries))
+            compared += 1
+            if compared == candidates:
+                break
+        ranked.sort(key=lambda item: item[:3])
+        results = []
+        for distance, shared, name, entries in ranked:
+            for entry in entries:
+                results.append(entry + (distance,))
+        return results[:limit]
+
+
+SEARCH_INDEXES = {}    # db_filename -> (database version, PlantSearch)
+SEARCH_LOCK = threading.Lock()
+
+def get_search_index(db_filename=DB_FILENAME):
+    ''' Returns the PlantSearch index of every plant in db_filename, building it the first time it is asked for
+    and again whenever the database changes (see PlantsDB.db_version(), like PlantCatalog)
+    '''
+    version = db_version(db_filename)
+    entry = SEARCH_INDEXES.get(db_filename)
+    if entry is None or entry[0] != version:
+        with SEARCH_LOCK:
+            entry = SEARCH_INDEXES.get(db_filename)
+            if entry is None or entry[0] != version:
+                entry = (version, PlantSearch(get_dao(db_filename).all_plant_names()))
+                SEARCH_INDEXES[db_filename] = entry
+    return entry[1]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Search plant names by prefix or close spelling')
+    parser.add_argument('query')
+    parser.add_argument('--prefix', action='store_true', help='complete the query as a prefix instead of correcting it')
+    parser.add_argument('--db', default=DB_FILENAME)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = get_search_index(args.db)
+    print('Indexed ' + str(len(index.terms)) + ' names in ' + str(round((time.perf_counter() - start) * 1000, 1)) + ' ms')
+    start = time.perf_counter()
+    if args.prefix:
+        results = index.complete(args.query)
+    else:
+        results = index.suggest(args.query)
+    elapsed = (time.perf_counter() - start) * 1000
+    for result in results:
+        print(' '.join(str(item) for item in result))
+    print('Answered in ' + str(round(elapsed, 3)) + ' ms')
@@ -0,0 +1,356 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from FinalCode import family_query, species_query
+from PlantCatalog import get_catalog
+from PlantsDB import DB_FILENAME, RANKINGS, get_dao
+
+SERVICE_PORT = 8080
+READ_WORKERS = 4         # threads running queries, each with its own pooled read-only connection
+CACHE_SIZE = 512         # how many responses are kept in the LRU response cache
+MAX_HEADER_BYTES = 16384
+
+MAX_BODY_CHUNK = 65536   # request bodies are read and thrown away this many bytes at a time
+
+REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           500: 'Internal Server Error'}
+
+
+class ResponseCache:
+    '''a small LRU cache of encoded JSON responses. Every entry remembers the database version it was
+    computed from, and is thrown away once the database changes.
+    '''
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, version):
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != version:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, version, response):
+        self.entries[key] = (version, response)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+
+class PlantService:
+    '''a read-only HTTP/JSON service over the FinalCode query layer, run on an asyncio event loop.
+    Queries run on a small thread pool, where each thread keeps one read-only connection (see PlantsDAO).
+    Every response carries an ETag made from the database version and the request, so a client that
+    sends it back in If-None-Match gets 304 Not Modified until the database is rebuilt.
+
+    GET /families                   the families taught in Woody Plants
+    GET /families/<family>          the woody plants in a family (list_plants_in_family())
+    GET /species/<genus species>    the facts and lab sites of a species (provide_species_info())
+    GET /ranking?limit=20&scope=woody   the highest coefficients of conservatism (order_by_conservatism())
+    GET /search?q=swamp+shrub       full-text search of the species pages
+
+    Instance Attributes
+    -------------------
+    db_filename: string
+        the database being served
+
+    cache: ResponseCache
+        recent responses, keyed by path and query string
+
+    executor: ThreadPoolExecutor
+        the threads that run queries
+    '''
+    def __init__(self, db_filename=DB_FILENAME, workers=READ_WORKERS, cache_size=CACHE_SIZE):
+        self.db_filename = db_filename
+        self.cache = ResponseCache(cache_size)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.request_count = 0
+
+    def version(self):
+        return get_catalog(self.db_filename).file_version()
+
+    def answer(self, path, params):
+        ''' Runs the query for a path and returns (status, result) '''
+        catalog = get_catalog(self.db_filename)
+        parts = [unquote(part) for part in path.strip('/').split('/')]
+        if parts == ['families']:
+            return 200, catalog.list_families()
+        if len(parts) == 2 and parts[0] == 'families':
+            result = family_query(parts[1], self.db_filename)
+            return (200 if result['found'] else 404), result
+        if len(parts) == 2 and parts[0] == 'species':
+            result = species_query(parts[1], self.db_filename)
+            return (200 if result['found'] else 404), result
+        if parts == ['ranking']:
+            try:
+                limit = int(params.get('limit', ['20'])[0])
+            except ValueError:
+                return 400, {'error': 'limit must be a number'}
+            if limit < 1:
+                return 400, {'error': 'limit must be at least 1'}
+            scope = params.get('scope', ['woody'])[0]
+            if scope not in RANKINGS:
+                return 400, {'error': 'scope must be ' + ' or '.join(RANKINGS)}
+            rows = get_dao(self.db_filename).ranked_by_conservatism(limit, scope)
+            return 200, [{'genus_species': row[0], 'common_name': row[1], 'conservatism': row[2]} for row in rows]
+        if parts == ['search']:
+            rows = get_dao(self.db_filename).text_search(params.get('q', [''])[0].split(), 10)
+            return 200, [{'genus_species': row[0], 'common_name': row[1], 'family': row[2], 'snippet': row[3]} for row in rows]
+        return 404, {'error': 'no such resource: ' + path}
+
+    async def respond(self, method, target, headers):
+        ''' Returns (status, extra headers, body) for one request, from the cache when possible.
+        A query that fails is answered with 500 and a JSON error, and is not cached.
+        '''
+        if method not in ('GET', 'HEAD'):
+            return 405, [], json.dumps({'error': 'only GET is supported'}).encode()
+        try:
+            version = self.version()
+            response = self.cache.get(target, version)
+            if response is None:
+                parts = urlsplit(target)
+                loop = asyncio.get_running_loop()
+                status, result = await loop.run_in_executor(self.executor, self.answer, parts.path, parse_qs(parts.query))
+                body = json.dumps(result).encode()
+                etag = '"' + hashlib.sha1((repr(version) + target).encode()).hexdigest()[:20] + '"'
+                response = (status, etag, body)
+                if status != 400:
+                    self.cache.put(target, version, response)
+        except Exception as error: # e.g. the database is missing or being rebuilt
+            return 500, [], json.dumps({'error': 'the query failed (' + type(error).__name__ + ')'}).encode()
+        status, etag, body = response
+        if etag in [tag.strip() for tag in headers.get('if-none-match', '').split(',')]:
+            return 304, [('ETag', etag)], b''
+        return status, [('ETag', etag), ('Cache-Control', 'no-cache')], body
+
+    async def discard_body(self, reader, headers):
+        ''' Reads the body of a request (which no route uses) so the next request on the connection starts in the right
+        place. Returns False if the body can't be framed, e.g. a chunked body, and the connection must be closed.
+        '''
+        if 'transfer-encoding' in headers:
+            return False
+        length = headers.get('content-length', '0')
+        if not length.isdigit():
+            return False
+        remaining = int(length)
+        while remaining:
+            chunk = await reader.read(min(remaining, MAX_BODY_CHUNK))
+            if not chunk:
+                raise asyncio.IncompleteReadError(b'', remaining)
+            remaining -= len(chunk)
+        return True
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, asyncio.CancelledError):
+                    break # the client hung up, or the service is shutting down
+                lines = head.decode('latin-1').split('\r\n')
+                request_line = lines[0].split()
+                if len(request_line) != 3:
+                    break
+                method, target, protocol = request_line
+                headers = {}
+                for line in lines[1:]:
+                    name, sep, value = line.partition(':')
+                    if sep:
+                        headers[name.strip().lower()] = value.strip()
+                self.request_count += 1
+                try:
+                    framed = await self.discard_body(reader, headers)
+                except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+                    break
+                keep_alive = framed and protocol == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                if framed:
+                    status, extra_headers, body = await self.respond(method, target, headers)
+                else:
+                    status, extra_headers, body = 400, [], json.dumps({'error': 'a request body needs a Content-Length'}).encode()
+                response = ['HTTP/1.1 ' + str(status) + ' ' + REASONS[status]]
+                response.append('Content-Type: application/json')
+                response.append('Content-Length: ' + str(len(body)))
+                response.append('Connection: ' + ('keep-alive' if keep_alive else 'close'))
+                for name, value in extra_headers:
+                    response.append(name + ': ' + value)
+                writer.write(('\r\n'.join(response) + '\r\n\r\n').encode('latin-1'))
+                if method != 'HEAD':
+                    writer.write(body)
+                try:
+                    await writer.drain()
+                except (ConnectionError, asyncio.CancelledError):
+                    break
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=SERVICE_PORT):
+        get_catalog(self.db_filename).refresh() # load the catalog before the first request arrives
+        return await asyncio.start_server(self.handle_connection, host, port, limit=MAX_HEADER_BYTES)
+
+
+def serve_in_thread(db_filename=DB_FILENAME, port=0):
+    ''' Starts a PlantService on its own event loop in a background thread
+
+    Returns
+    -------
+    tuple
+        (service, port, stop): call stop() to shut the service down
+    '''
+    service = PlantService(db_filename)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    state = {}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        state['server'] = loop.run_until_complete(service.start(port=port))
+        started.set()
+        loop.run_forever()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    started.wait()
+
+    async def shutdown():
+        state['server'].close()
+        connections = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in connections:
+            task.cancel()
+        await asyncio.gather(*connections, return_exceptions=True)
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(shutdown(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+        service.executor.shutdown()
+
+    return service, state['server'].sockets[0].getsockname()[1], stop
+
+
+################################################################################
+# Load testing
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+async def load_test(host, port, paths, requests=2000, concurrency=16, revalidate=False):
+    ''' Sends requests GET requests for paths (taken in turn) over concurrency keep-alive connections
+
+    Parameters
+    ----------
+    host: string
+    port: int
+    paths: list
+        the paths to request, e.g. ['/families/Pinaceae', '/species/Pinus%20strobus']
+    requests: int
+        how many requests are sent in all
+    concurrency: int
+        how many connections send requests at the same time
+    revalidate: bool
+        if True, every request after a path's first sends its ETag back in If-None-Match, like a browser cache
+
+    Returns
+    -------
+    dict
+        e.g. {'requests': 2000, 'seconds': 0.9, 'rps': 2222.2, 'p50_ms': 6.1, 'p99_ms': 14.3, 'statuses': {200: 2000}}
+    '''
+    latencies = []
+    statuses = {}
+    etags = {}
+    counter = iter(range(requests))
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        for i in counter:
+            path = paths[i % len(paths)]
+            request = 'GET ' + path + ' HTTP/1.1\r\nHost: ' + host + '\r\n'
+            if revalidate and path in etags:
+                request += 'If-None-Match: ' + etags[path] + '\r\n'
+            start = time.perf_counter()
+            writer.write((request + '\r\n').encode('latin-1'))
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = 0
+            status = int(head.split(b' ', 2)[1])
+            for line in head.decode('latin-1').split('\r\n')[1:]:
+                name, sep, value = line.partition(':')
+                if name.lower() == 'content-length':
+                    length = int(value)
+                elif name.lower() == 'etag':
+                    etags[path] = value.strip()
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[client() for i in range(concurrency)])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'seconds': round(elapsed, 3),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'statuses': statuses,
+    }
+
+def default_paths(db_filename=DB_FILENAME):
+    ''' A mix of every kind of request: every family and species, plus rankings '''
+    catalog = get_catalog(db_filename)
+    paths = ['/families', '/ranking?limit=20', '/ranking?limit=20&scope=statewide']
+    paths += ['/families/' + fam.replace(' ', '%20') for fam in catalog.list_families()]
+    paths += ['/species/' + species.replace(' ', '%20') for species in catalog.list_species()]
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve the plant database over HTTP, or load test the service')
+    parser.add_argument('command', choices=['serve', 'loadtest'])
+    parser.add_argument('--db', default=DB_FILENAME)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=None, help='port to serve on; for loadtest, a running service to test (default: start one)')
+    parser.add_argument('--requests', type=int, default=5000, help='loadtest: number of requests')
+    parser.add_argument('--concurrency', type=int, default=16, help='loadtest: number of connections')
+    parser.add_argument('--revalidate', action='store_true', help='loadtest: send ETags back, so repeat requests get 304')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        async def serve():
+            service = PlantService(args.db)
+            server = await service.start(args.host, args.port or SERVICE_PORT)
+            print('Serving ' + args.db + ' at http://' + args.host + ':' + str(args.port or SERVICE_PORT))
+            async with server:
+                await server.serve_forever()
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            pass
+    else:
+        stop = None
+        port = args.port
+        if port is None:
+            service, port, stop = serve_in_thread(args.db)
+        report = asyncio.run(load_test(args.host, port, default_paths(args.db), args.requests, args.concurrency, args.revalidate))
+        if stop is not None:
+            report['cache_hits'] = service.cache.hits
+            report['cache_misses'] = service.cache.misses
+            stop()
+        print(json.dumps(report, indent=1))
@@ -0,0 +1,156 @@
+import argparse
+import sqlite3
+import time
+
+from PlantsDB import DB_FILENAME, migrate
+from TrefleClient import CACHE_FILENAME, get_trefle_client
+
+BATCH_SIZE = 20         # species looked up with one /species request, which then fits on one page of results
+MAX_AGE_DAYS = 90       # traits fetched longer ago than this are looked up again
+
+SCOPES = {
+    'woody': 'AND Plants.Id IN (SELECT PlantId FROM WoodyPlants)',
+    'statewide': '',
+}
+
+select_species_to_enrich = '''
+    SELECT Plants.Id, Plants.GenusSpecies, PlantTraits.FetchedAt
+    FROM Plants
+    LEFT JOIN PlantTraits ON PlantTraits.GenusSpecies = Plants.GenusSpecies
+    WHERE (PlantTraits.FetchedAt IS NULL OR PlantTraits.FetchedAt < ?) {scope}
+    ORDER BY Plants.GenusSpecies
+'''
+
+add_plant_traits = '''
+    INSERT OR REPLACE INTO PlantTraits ("GenusSpecies", "PlantId", "TrefleId", "Slug", "MaximumHeightCm", "AverageHeightCm",
+                                        "LigneousType", "GrowthHabit", "GrowthRate", "Toxicity", "FetchedAt")
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def normalize(name):
+    return ' '.join(name.lower().split())
+
+def species_to_enrich(connection, scope='woody', max_age_days=MAX_AGE_DAYS):
+    ''' Finds the species with no PlantTraits row, and those whose row is older than max_age_days
+
+    Returns
+    -------
+    tuple
+        (missing, stale): two lists of (plant_id, genus_species)
+    '''
+    cutoff = time.time() - max_age_days * 86400
+    missing = []
+    stale = []
+    for plant_id, genus_species, fetched_at in connection.execute(select_species_to_enrich.format(scope=SCOPES[scope]), [cutoff]):
+        (missing if fetched_at is None else stale).append((plant_id, genus_species))
+    return missing, stale
+
+def batches(species, size=BATCH_SIZE):
+    ''' Splits (plant_id, genus_species) pairs into batches of size different names. Names that only differ
+    in case or spacing are looked up once, and the batch keeps every plant that has them.
+    '''
+    names = {}
+    for plant_id, genus_species in species:
+        names.setdefault(normalize(genus_species), []).append((plant_id, genus_species))
+    keys = list(names)
+    return [[names[key] for key in keys[i:i + size]] for i in range(0, len(keys), size)]
+
+def traits_row(genus_species, plant_id, record, fetched_at):
+    ''' Returns the PlantTraits row of a species from its Trefle /species/<id> record, or a row with no traits if record is None '''
+    if record is None:
+        return (genus_species, plant_id, None, None, None, None, None, None, None, None, fetched_at)
+    specifications = record.get('specifications') or {}
+    return (genus_species, plant_id, record['id'], record.get('slug'),
+            (specifications.get('maximum_height') or {}).get('cm'), (specifications.get('average_height') or {}).get('cm'),
+            specifications.get('ligneous_type'), specifications.get('growth_habit'), specifications.get('growth_rate'),
+            specifications.get('toxicity'), fetched_at)
+
+def enrich_batch(client, batch, refresh=False):
+    ''' Looks up one batch of species with a single filtered /species request, then reads the full records
+    of every species found together on the client's thread pool (the list records don't hold the growth specifications)
+
+    Parameters
+    ----------
+    client: TrefleClient
+    batch: list
+        one entry per name to look up, each a list of the (plant_id, genus_species) pairs with that name
+    refresh: bool
+        if True, the responses are fetched again instead of read from the client's cache
+
+    Returns
+    -------
+    list
+        PlantTraits rows, one for every plant in the batch
+    '''
+    names = [plants[0][1] for plants in batch]
+    found = {}
+    for record in client.iter_pages('/species', {'filter[scientific_name]': ','.join(names)}, refresh):
+        found.setdefault(normalize(record['scientific_name']), record)
+    ids = []
+    for plants in batch:
+        record = found.get(normalize(plants[0][1]))
+        if record is not None and record['id'] not in ids: # two names can be synonyms of one Trefle species
+            ids.append(record['id'])
+    responses = client.get_many([('/species/' + str(trefle_id), None) for trefle_id in ids], refresh)
+    details = {trefle_id: response['data'] for trefle_id, response in zip(ids, responses)}
+    rows = []
+    now = time.time()
+    for plants in batch:
+        record = found.get(normalize(plants[0][1]))
+        for plant_id, genus_species in plants:
+            rows.append(traits_row(genus_species, plant_id, None if record is None else details[record['id']], now))
+    return rows
+
+def enrich(db_filename=DB_FILENAME, client=None, scope='woody', max_age_days=MAX_AGE_DAYS):
+    ''' Fills PlantTraits with the Trefle traits of every species that is missing or stale. Batches are looked
+    up one after another, each with its requests spread over the client's thread pool (the only pool, so no
+    pool waits on another), and each batch is written and committed as soon as it is done, so an
+    interrupted run keeps what it got and the next run only asks for the rest.
+
+    Parameters
+    ----------
+    db_filename: string
+        the database holding Plants (and WoodyPlants)
+    client: TrefleClient
+        defaults to get_trefle_client(), which sends requests to trefle.io
+    scope: string
+        'woody' for the plants taught in Woody Plants, or 'statewide' for every plant in Michigan
+    max_age_days: float
+        traits fetched longer ago than this are fetched again, bypassing the response cache
+
+    Returns
+    -------
+    dict
+        e.g. {'missing': 116, 'stale': 0, 'found': 104, 'not_found': 12, 'seconds': 3.2}
+    '''
+    start = time.perf_counter()
+    client = client or get_trefle_client(CACHE_FILENAME)
+    connection = sqlite3.connect(db_filename)
+    migrate(connection) # creates PlantTraits and links it to Plants
+    missing, stale = species_to_enrich(connection, scope, max_age_days)
+    work = [(batch, False) for batch in batches(missing)] + [(batch, True) for batch in batches(stale)]
+    found = 0
+    written = 0
+    for batch, refresh in work:
+        rows = enrich_batch(client, batch, refresh)
+        connection.executemany(add_plant_traits, rows)
+        connection.commit()
+        written += len(rows)
+        found += sum(1 for row in rows if row[2] is not None)
+    connection.close()
+    return {'missing': len(missing), 'stale': len(stale), 'found': found, 'not_found': written - found,
+            'seconds': round(time.perf_counter() - start, 2)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Add Trefle traits (height, ligneous type, growth habit...) to the PlantTraits table')
+    parser.add_argument('--scope', choices=list(SCOPES), default='woody')
+    parser.add_argument('--max-age', type=float, default=MAX_AGE_DAYS, help='days before fetched traits are looked up again')
+    parser.add_argument('--db', default=DB_FILENAME)
+    parser.add_argument('--cache', default=CACHE_FILENAME)
+    parser.add_argument('--origin', help='send requests here instead of trefle.io (see FixtureServer.py --trefle)')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    print(enrich(args.db, get_trefle_client(args.cache, args.origin, max_workers=args.workers), args.scope, args.max_age))
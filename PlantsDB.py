@@ -0,0 +1,848 @@
+import os
+import sqlite3
+import threading
+import time
+from urllib.request import pathname2url
+
+DB_FILENAME = "michiganplants.sqlite"
+
+# used while WoodyPlants and LabSites are bulk loaded from the CSV files: a load that is interrupted is simply
+# run again, so skip the fsyncs and keep the rollback journal and temporary b-trees in memory
+BULK_PRAGMAS = [
+    'PRAGMA journal_mode=MEMORY',
+    'PRAGMA synchronous=OFF',
+    'PRAGMA cache_size=-65536',
+    'PRAGMA temp_store=MEMORY',
+]
+
+# used while Plants is crawled: every committed batch must survive a crash, since CrawlState and CrawlCheckpoint
+# resume the crawl from it. The write-ahead log stays on disk, and with synchronous=NORMAL a crash can lose the
+# last commits but never corrupts the database.
+CRAWL_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-65536',
+    'PRAGMA temp_store=MEMORY',
+]
+
+NORMAL_PRAGMAS = [
+    'PRAGMA journal_mode=DELETE',
+    'PRAGMA synchronous=FULL',
+]
+
+# indexes are created after the rows are loaded, which is much faster than updating them row by row.
+# Most of them hold every column a FinalCode query reads from the table, so the query never visits the table itself.
+INDEXES = {
+    'Plants': [
+        'CREATE INDEX IF NOT EXISTS "PlantsGenusSpecies" ON "Plants" ("GenusSpecies")',
+        'CREATE INDEX IF NOT EXISTS "PlantsFamily" ON "Plants" ("Family", "GenusSpecies", "CommonName")',
+        'CREATE INDEX IF NOT EXISTS "PlantsConservatism" ON "Plants" ("ConservatismCoef", "GenusSpecies", "CommonName")',
+        'CREATE INDEX IF NOT EXISTS "PlantsNative" ON "Plants" ("IsNative", "ConservatismCoef")',
+        'CREATE INDEX IF NOT EXISTS "PlantsGrowthForm" ON "Plants" ("GrowthForm", "IsNative")',
+    ],
+    'WoodyPlants': [
+        'CREATE INDEX IF NOT EXISTS "WoodyPlantsGenusSpecies" ON "WoodyPlants" ("GenusSpecies")',
+        'CREATE INDEX IF NOT EXISTS "WoodyPlantsPlantId" ON "WoodyPlants" ("PlantId", "LabId", "YoutubeVideo")',
+        'CREATE INDEX IF NOT EXISTS "WoodyPlantsLabId" ON "WoodyPlants" ("LabId")',
+    ],
+    'LabSites': [
+        'CREATE UNIQUE INDEX IF NOT EXISTS "LabSitesLabId" ON "LabSites" ("LabId")',
+    ],
+    'PlantTraits': [
+        'CREATE INDEX IF NOT EXISTS "PlantTraitsPlantId" ON "PlantTraits" ("PlantId")',
+    ],
+}
+
+# ConservatismCoef and WetnessCoef are NULL where Michigan Flora shows '*' (not applicable, e.g. the
+# conservatism of every non-native species). IsNative and GrowthForm are decoded from Physiognomy ('Nt P-Forb'
+# is IsNative 1, GrowthForm 'p-forb') when the row is written, so queries never pick the string apart.
+plants_columns = '''(
+        "Id"        INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE,
+        "Family" TEXT NOT NULL,
+        "GenusSpecies" TEXT NOT NULL,
+        "CommonName" TEXT NOT NULL,
+        "Physiognomy" TEXT NOT NULL,
+        "ConservatismCoef" REAL,
+        "WetnessCoef" REAL,
+        "IsNative" INTEGER NOT NULL,
+        "GrowthForm" TEXT
+    );
+'''
+
+create_plants = 'CREATE TABLE IF NOT EXISTS "Plants" ' + plants_columns
+
+# WoodyPlants.PlantId is the integer key of the species in Plants, so joins compare integers
+# through the Plants primary key instead of GenusSpecies text
+link_woody_plants = '''
+    UPDATE WoodyPlants SET PlantId = (
+        SELECT Plants.Id FROM Plants WHERE Plants.GenusSpecies = WoodyPlants.GenusSpecies
+    )
+'''
+
+# Trefle traits of the Plants species, filled by PlantTraits.py. Rows are keyed by GenusSpecies so they survive a
+# rebuild of Plants, and PlantId is linked again like WoodyPlants.PlantId. A species Trefle doesn't know has a row
+# with a NULL TrefleId, so it isn't asked for again until the row is stale (FetchedAt is a Unix time).
+create_plant_traits = '''
+    CREATE TABLE IF NOT EXISTS "PlantTraits" (
+        "GenusSpecies" TEXT PRIMARY KEY,
+        "PlantId" INTEGER REFERENCES "Plants" ("Id"),
+        "TrefleId" INTEGER,
+        "Slug" TEXT,
+        "MaximumHeightCm" REAL,
+        "AverageHeightCm" REAL,
+        "LigneousType" TEXT,
+        "GrowthHabit" TEXT,
+        "GrowthRate" TEXT,
+        "Toxicity" TEXT,
+        "FetchedAt" REAL NOT NULL
+    );
+'''
+
+link_plant_traits = '''
+    UPDATE PlantTraits SET PlantId = (
+        SELECT Plants.Id FROM Plants WHERE Plants.GenusSpecies = PlantTraits.GenusSpecies
+    )
+'''
+
+
+def decode_coefficient(text):
+    ''' Turns a coefficient from a species page into a number, e.g. '-3' into -3.0, and '*' into None
+    '''
+    text = str(text).strip()
+    if text in ('*', ''):
+        return None
+    return float(text)
+
+def decode_physiognomy(physiognomy):
+    ''' Splits a physiognomy like 'Nt P-Forb' into (is_native, growth_form), e.g. (1, 'p-forb').
+    Only 'Nt' species are native; 'Ad' (adventive) species are not.
+    '''
+    words = physiognomy.split()
+    is_native = 1 if words and words[0] == 'Nt' else 0
+    growth_form = words[1].lower() if len(words) > 1 else None
+    return is_native, growth_form
+
+def plant_row(facts):
+    ''' Turns the scraped facts of a species into the values of its Plants row (every column but Id)
+
+    Parameters
+    ----------
+    facts: list
+        [family, genus_species, common_name, physiognomy, conservatism, wetness] as text, e.g. a PlantRecord
+
+    Returns
+    -------
+    list
+        e.g. ['Pinaceae', 'Pinus strobus', 'white pine', 'Nt Tree', 3.0, 3.0, 1, 'tree']
+    '''
+    family, genus_species, common_name, physiognomy, conservatism, wetness = facts
+    is_native, growth_form = decode_physiognomy(physiognomy)
+    return [family, genus_species, common_name, physiognomy, decode_coefficient(conservatism), decode_coefficient(wetness),
+            is_native, growth_form]
+
+
+def start_build(connection, pragmas=BULK_PRAGMAS):
+    ''' Switches a connection to the faster settings used while tables are rebuilt
+
+    Parameters
+    ----------
+    connection: sqlite3.Connection
+        the open michiganplants database
+    pragmas: list
+        BULK_PRAGMAS (the default) for a one-shot load, or CRAWL_PRAGMAS when the rows must survive a crash
+
+    Returns
+    -------
+    None
+    '''
+    connection.commit() # pragmas like synchronous can't be changed inside a transaction
+    for pragma in pragmas:
+        connection.execute(pragma)
+
+def finish_build(connection, tables):
+    ''' Creates the indexes of the rebuilt tables, updates the query planner's statistics and
+    switches the connection back to the normal, crash-safe settings
+
+    Parameters
+    ----------
+    connection: sqlite3.Connection
+        the open michiganplants database
+    tables: list
+        the tables that were rebuilt, e.g. ['WoodyPlants', 'LabSites']
+
+    Returns
+    -------
+    None
+    '''
+    start = time.perf_counter()
+    for table in tables:
+        for create_index in INDEXES.get(table, []):
+            connection.execute(create_index)
+    connection.commit()
+    migrate(connection)
+    connection.execute('ANALYZE')
+    connection.commit()
+    print('Built indexes in ' + str(round(time.perf_counter() - start, 2)) + ' s')
+    for pragma in NORMAL_PRAGMAS:
+        connection.execute(pragma)
+
+# a full-text index over every species; its rowid is the Plants Id of the species
+create_plants_text = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS "PlantsText" USING fts5(
+        "GenusSpecies", "CommonName", "Family", "Physiognomy", "Description",
+        tokenize = 'porter unicode61'
+    );
+'''
+
+drop_plants_text = 'DROP TABLE IF EXISTS "PlantsText"'
+
+add_plant_text = '''
+    INSERT INTO PlantsText ("rowid", "GenusSpecies", "CommonName", "Family", "Physiognomy", "Description")
+        VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+# species crawled before PlantsText existed are indexed without their description until the next crawl
+fill_plants_text = '''
+    INSERT INTO PlantsText ("rowid", "GenusSpecies", "CommonName", "Family", "Physiognomy", "Description")
+        SELECT Id, GenusSpecies, CommonName, Family, Physiognomy, ''
+        FROM Plants
+        WHERE Id NOT IN (SELECT rowid FROM PlantsText)
+'''
+
+# Summary tables, rebuilt by refresh_summaries() whenever the data is loaded or migrated, so the histogram
+# and rankings read a few precomputed rows instead of aggregating the joined tables on every request.
+# Each summary is kept for two scopes: 'woody' (the plants taught in Woody Plants) and 'statewide' (every Michigan species).
+SUMMARY_TOP_N = 100     # how many species are kept in TopConservatism for each scope
+
+SUMMARY_SOURCES = {
+    'woody': 'Plants JOIN WoodyPlants ON Plants.Id = WoodyPlants.PlantId',
+    'statewide': 'Plants',
+}
+
+create_summaries = [
+    '''
+    CREATE TABLE IF NOT EXISTS "CoefficientCounts" (
+        "Scope" TEXT NOT NULL,
+        "IsNative" INTEGER NOT NULL,
+        "Coefficient" REAL,
+        "Species" INTEGER NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS "CoefficientCountsScope" ON "CoefficientCounts" ("Scope", "Coefficient", "IsNative", "Species")',
+    '''
+    CREATE TABLE IF NOT EXISTS "FamilySummary" (
+        "Scope" TEXT NOT NULL,
+        "Family" TEXT NOT NULL,
+        "Species" INTEGER NOT NULL,
+        "NativeSpecies" INTEGER NOT NULL,
+        "MeanCoef" REAL,
+        "MinCoef" REAL,
+        "MaxCoef" REAL,
+        PRIMARY KEY ("Scope", "Family")
+    )''',
+    '''
+    CREATE TABLE IF NOT EXISTS "LabSiteSummary" (
+        "LabId" INTEGER PRIMARY KEY,
+        "SiteName" TEXT NOT NULL,
+        "Species" INTEGER NOT NULL,
+        "NativeSpecies" INTEGER NOT NULL,
+        "MeanCoef" REAL,
+        "MinCoef" REAL,
+        "MaxCoef" REAL
+    )''',
+    '''
+    CREATE TABLE IF NOT EXISTS "TopConservatism" (
+        "Scope" TEXT NOT NULL,
+        "Rank" INTEGER NOT NULL,
+        "GenusSpecies" TEXT NOT NULL,
+        "CommonName" TEXT NOT NULL,
+        "ConservatismCoef" REAL NOT NULL,
+        PRIMARY KEY ("Scope", "Rank")
+    )''',
+]
+
+# MeanCoef, MinCoef and MaxCoef only count the species that have a coefficient (non-native species don't)
+refresh_coefficient_counts = '''
+    INSERT INTO CoefficientCounts ("Scope", "IsNative", "Coefficient", "Species")
+        SELECT ?, IsNative, ConservatismCoef, COUNT(*)
+        FROM {source}
+        GROUP BY IsNative, ConservatismCoef
+'''
+
+refresh_family_summary = '''
+    INSERT INTO FamilySummary ("Scope", "Family", "Species", "NativeSpecies", "MeanCoef", "MinCoef", "MaxCoef")
+        SELECT ?, Family, COUNT(*), SUM(IsNative), AVG(ConservatismCoef), MIN(ConservatismCoef), MAX(ConservatismCoef)
+        FROM {source}
+        GROUP BY Family
+'''
+
+refresh_top_conservatism = '''
+    INSERT INTO TopConservatism ("Scope", "Rank", "GenusSpecies", "CommonName", "ConservatismCoef")
+        SELECT ?, ROW_NUMBER() OVER (ORDER BY ConservatismCoef DESC, Plants.GenusSpecies), Plants.GenusSpecies, CommonName, ConservatismCoef
+        FROM {source}
+        WHERE ConservatismCoef IS NOT NULL
+        ORDER BY ConservatismCoef DESC, Plants.GenusSpecies
+        LIMIT ?
+'''
+
+refresh_lab_site_summary = '''
+    INSERT INTO LabSiteSummary ("LabId", "SiteName", "Species", "NativeSpecies", "MeanCoef", "MinCoef", "MaxCoef")
+        SELECT LabSites.LabId, SiteName, COUNT(*), SUM(IsNative), AVG(ConservatismCoef), MIN(ConservatismCoef), MAX(ConservatismCoef)
+        FROM (Plants
+        JOIN WoodyPlants
+        ON Plants.Id = WoodyPlants.PlantId)
+        JOIN LabSites ON WoodyPlants.LabId=LabSites.LabId
+        GROUP BY LabSites.LabId
+'''
+
+def refresh_summaries(connection, tables):
+    ''' Rebuilds every summary table from Plants, WoodyPlants and LabSites. Scopes whose tables
+    don't exist yet are left empty.
+
+    Parameters
+    ----------
+    connection: sqlite3.Connection
+        the open michiganplants database
+    tables: list
+        the tables in the database
+
+    Returns
+    -------
+    None
+    '''
+    for create_summary in create_summaries:
+        connection.execute(create_summary)
+    for table in ['CoefficientCounts', 'FamilySummary', 'LabSiteSummary', 'TopConservatism']:
+        connection.execute('DELETE FROM "' + table + '"')
+    if 'Plants' not in tables:
+        return
+    for scope, source in SUMMARY_SOURCES.items():
+        if scope == 'woody' and 'WoodyPlants' not in tables:
+            continue
+        connection.execute(refresh_coefficient_counts.format(source=source), [scope])
+        connection.execute(refresh_family_summary.format(source=source), [scope])
+        connection.execute(refresh_top_conservatism.format(source=source), [scope, SUMMARY_TOP_N])
+    if 'WoodyPlants' in tables and 'LabSites' in tables:
+        connection.execute(refresh_lab_site_summary)
+
+def table_columns(connection, table):
+    return [row[1] for row in connection.execute('PRAGMA table_info("' + table + '")')]
+
+def retype_plants(connection):
+    ''' Rebuilds a Plants table from before the typed coefficient, IsNative and GrowthForm columns, keeping every Id.
+    SQLite can't change the type of a column, so the rows are copied into a new table that then takes its name.
+    '''
+    connection.execute('DROP TABLE IF EXISTS "PlantsNew"')
+    connection.execute('CREATE TABLE "PlantsNew" ' + plants_columns)
+    rows = connection.execute('SELECT Id, Family, GenusSpecies, CommonName, Physiognomy, ConservatismCoef, WetnessCoef FROM Plants')
+    connection.executemany('INSERT INTO PlantsNew VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                           ([row[0]] + plant_row(row[1:]) for row in rows.fetchall()))
+    connection.execute('DROP TABLE "Plants"')
+    connection.execute('ALTER TABLE "PlantsNew" RENAME TO "Plants"')
+
+def migrate(connection):
+    ''' Brings a database built by an older version of this code up to the current schema, and
+    links WoodyPlants to Plants again and refreshes the summary tables after any table was rebuilt. Safe to run any number of times;
+    tables that don't exist yet are skipped.
+
+    Parameters
+    ----------
+    connection: sqlite3.Connection
+        the open michiganplants database
+
+    Returns
+    -------
+    None
+    '''
+    tables = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    if 'Plants' in tables and 'IsNative' not in table_columns(connection, 'Plants'):
+        retype_plants(connection)
+    if 'WoodyPlants' in tables:
+        if 'PlantId' not in table_columns(connection, 'WoodyPlants'):
+            connection.execute('ALTER TABLE "WoodyPlants" ADD COLUMN "PlantId" INTEGER REFERENCES "Plants" ("Id")')
+        if 'Plants' in tables:
+            connection.execute(link_woody_plants)
+    if 'Plants' in tables:
+        connection.execute(create_plants_text)
+        connection.execute(fill_plants_text)
+        connection.execute(create_plant_traits)
+        connection.execute(link_plant_traits)
+        if 'PlantTraits' not in tables:
+            tables.append('PlantTraits')
+    for table in tables:
+        for create_index in INDEXES.get(table, []):
+            connection.execute(create_index)
+    refresh_summaries(connection, tables)
+    connection.commit()
+
+def drop_indexes(connection, table):
+    ''' Drops the indexes of a table before it is bulk loaded (finish_build() creates them again)
+    '''
+    rows = connection.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", [table])
+    for row in rows.fetchall():
+        connection.execute('DROP INDEX IF EXISTS "' + row[0] + '"')
+
+def report_load(table, count, seconds):
+    rate = count / seconds if seconds > 0 else float(count)
+    print('Loaded ' + str(count) + ' rows into ' + table + ' in ' + str(round(seconds, 2)) + ' s (' + str(int(rate)) + ' rows per second)')
+
+def bulk_load(connection, table, insert_sql, rows):
+    ''' Inserts every row with one executemany in a single transaction. rows can be any iterable,
+    e.g. a generator over a CSV reader, so the rows are streamed and never held in a list.
+
+    Parameters
+    ----------
+    connection: sqlite3.Connection
+        the open michiganplants database
+    table: string
+        the table being loaded, used in the report
+    insert_sql: string
+        an INSERT statement with one ? per column
+    rows: iterable
+        the rows to insert
+
+    Returns
+    -------
+    int
+        the number of rows inserted
+    '''
+    start = time.perf_counter()
+    before = connection.total_changes
+    connection.executemany(insert_sql, rows)
+    connection.commit()
+    count = connection.total_changes - before
+    report_load(table, count, time.perf_counter() - start)
+    return count
+
+
+################################################################################
+# Read-only queries used by FinalCode.py. Every statement is parameterized, so sqlite compiles
+# each one once per connection and reuses it from its statement cache.
+
+# non-native species have no coefficient; the histogram counts them as 0
+select_coefficients = '''
+    SELECT IFNULL(ConservatismCoef, 0)
+    FROM Plants
+    JOIN WoodyPlants
+    ON Plants.Id = WoodyPlants.PlantId
+'''
+
+# rankings longer than TopConservatism keeps, in the same order (ties in alphabetical order)
+select_ranked_by_conservatism = '''
+    SELECT Plants.GenusSpecies, CommonName, ConservatismCoef
+    FROM Plants
+    JOIN WoodyPlants
+    ON Plants.Id = WoodyPlants.PlantId
+    WHERE ConservatismCoef IS NOT NULL
+    ORDER BY ConservatismCoef DESC, Plants.GenusSpecies
+    LIMIT ?
+'''
+
+select_ranked_by_conservatism_statewide = '''
+    SELECT GenusSpecies, CommonName, ConservatismCoef
+    FROM Plants
+    WHERE ConservatismCoef IS NOT NULL
+    ORDER BY ConservatismCoef DESC, GenusSpecies
+    LIMIT ?
+'''
+
+RANKINGS = {
+    'woody': select_ranked_by_conservatism,
+    'statewide': select_ranked_by_conservatism_statewide,
+}
+
+select_families = '''
+    SELECT DISTINCT Family
+    FROM Plants
+    JOIN WoodyPlants
+    ON Plants.Id = WoodyPlants.PlantId
+'''
+
+select_species = '''
+    SELECT Plants.GenusSpecies
+    FROM Plants
+    JOIN WoodyPlants
+    ON Plants.Id = WoodyPlants.PlantId
+'''
+
+select_plants_in_family = '''
+    SELECT Plants.GenusSpecies, CommonName
+    FROM Plants
+    JOIN WoodyPlants
+    ON Plants.Id = WoodyPlants.PlantId
+    WHERE Family = ?
+'''
+
+select_species_info = '''
+    SELECT Family, IsNative, GrowthForm, ConservatismCoef, YoutubeVideo, SiteName, Latitude, Longitude, CommonName
+    FROM (Plants
+    JOIN WoodyPlants
+    ON Plants.Id = WoodyPlants.PlantId)
+    JOIN LabSites ON WoodyPlants.LabId=LabSites.LabId
+    WHERE Plants.GenusSpecies = ?
+'''
+
+# the two queries PlantCatalog loads everything from. They read every woody plant on purpose, once per
+# database version, so they are left out of QUERIES (as is select_plant_names below).
+select_catalog_plants = '''
+    SELECT Family, Plants.GenusSpecies, CommonName
+    FROM Plants
+    JOIN WoodyPlants
+    ON Plants.Id = WoodyPlants.PlantId
+'''
+
+select_catalog_species_info = '''
+    SELECT Plants.GenusSpecies, Family, IsNative, GrowthForm, ConservatismCoef, YoutubeVideo, SiteName, Latitude, Longitude, CommonName
+    FROM (Plants
+    JOIN WoodyPlants
+    ON Plants.Id = WoodyPlants.PlantId)
+    JOIN LabSites ON WoodyPlants.LabId=LabSites.LabId
+    ORDER BY Plants.GenusSpecies, WoodyPlants.LabId
+'''
+
+# every name in the statewide Plants table, read once to build PlantSearch
+select_plant_names = '''
+    SELECT GenusSpecies, Family, CommonName
+    FROM Plants
+    ORDER BY Id
+'''
+
+# the coefficients of every species and the species list of every lab site, read whole by FloristicQuality.py
+select_fqa_species = '''
+    SELECT Id, GenusSpecies, ConservatismCoef, WetnessCoef, IsNative
+    FROM Plants
+    ORDER BY Id
+'''
+
+select_lab_site_species = '''
+    SELECT LabSites.LabId, SiteName, PlantId
+    FROM WoodyPlants
+    JOIN LabSites ON WoodyPlants.LabId=LabSites.LabId
+    WHERE PlantId IS NOT NULL
+'''
+
+# the three tables as they are, read whole by Snapshot.py to write its columns
+select_snapshot_plants = '''
+    SELECT Id, Family, GenusSpecies, CommonName, Physiognomy, ConservatismCoef, WetnessCoef, IsNative, GrowthForm
+    FROM Plants
+    ORDER BY Id
+'''
+
+select_snapshot_woody_plants = '''
+    SELECT PlantId, LabId, YoutubeVideo
+    FROM WoodyPlants
+    ORDER BY rowid
+'''
+
+select_snapshot_lab_sites = '''
+    SELECT LabId, SiteName, Latitude, Longitude, "DistanceFromCampus(mi)"
+    FROM LabSites
+    ORDER BY LabId
+'''
+
+# every lab site with the woody plants taught there (one row with NULL plant columns for a site with none), read whole by SiteReport.py
+select_site_report = '''
+    SELECT LabSites.LabId, SiteName, Latitude, Longitude, "DistanceFromCampus(mi)",
+           Plants.GenusSpecies, CommonName, Family, IsNative, GrowthForm, ConservatismCoef, YoutubeVideo
+    FROM LabSites
+    LEFT JOIN (WoodyPlants
+    JOIN Plants
+    ON Plants.Id = WoodyPlants.PlantId)
+    ON WoodyPlants.LabId = LabSites.LabId
+    ORDER BY LabSites.LabId, Plants.GenusSpecies
+'''
+
+# ranked full-text search over every species, best match first (bm25 is lower for better matches)
+select_text_search = '''
+    SELECT GenusSpecies, CommonName, Family, snippet(PlantsText, -1, '[', ']', '...', 12), bm25(PlantsText) AS Rank
+    FROM PlantsText
+    WHERE PlantsText MATCH ?
+    ORDER BY Rank
+    LIMIT ?
+'''
+
+# the Trefle traits of one species (see PlantTraits.py)
+select_plant_traits = '''
+    SELECT MaximumHeightCm, AverageHeightCm, LigneousType, GrowthHabit, GrowthRate, Toxicity
+    FROM PlantTraits
+    WHERE GenusSpecies = ? AND TrefleId IS NOT NULL
+'''
+
+# the precomputed summaries (see refresh_summaries())
+select_coefficient_counts = '''
+    SELECT Coefficient, IsNative, Species
+    FROM CoefficientCounts
+    WHERE Scope = ?
+    ORDER BY Coefficient
+'''
+
+select_top_conservatism = '''
+    SELECT GenusSpecies, CommonName, ConservatismCoef
+    FROM TopConservatism
+    WHERE Scope = ? AND Rank <= ?
+    ORDER BY Rank
+'''
+
+select_family_summary = '''
+    SELECT Family, Species, NativeSpecies, MeanCoef, MinCoef, MaxCoef
+    FROM FamilySummary
+    WHERE Scope = ?
+    ORDER BY Family
+'''
+
+# one row per lab site, read whole on purpose, so it is left out of QUERIES like the catalog queries
+select_lab_site_summary = '''
+    SELECT LabId, SiteName, Species, NativeSpecies, MeanCoef, MinCoef, MaxCoef
+    FROM LabSiteSummary
+    ORDER BY LabId
+'''
+
+# every statement above, with example parameters, for check_query_plans()
+QUERIES = {
+    'coefficients': (select_coefficients, []),
+    'ranked_by_conservatism': (select_ranked_by_conservatism, [200]),
+    'ranked_by_conservatism_statewide': (select_ranked_by_conservatism_statewide, [200]),
+    'families': (select_families, []),
+    'species': (select_species, []),
+    'plants_in_family': (select_plants_in_family, ['Pinaceae']),
+    'species_info': (select_species_info, ['Pinus strobus']),
+    'text_search': (select_text_search, ['"wetland" OR "shrub"', 10]),
+    'coefficient_counts': (select_coefficient_counts, ['woody']),
+    'top_conservatism': (select_top_conservatism, ['woody', 20]),
+    'family_summary': (select_family_summary, ['statewide']),
+    'plant_traits': (select_plant_traits, ['Pinus strobus']),
+}
+
+
+def db_version(db_filename=DB_FILENAME):
+    ''' The version of a database: the modification time and size of its file and of its write-ahead log.
+    In WAL mode (see CRAWL_PRAGMAS) a commit only reaches the main file at a checkpoint, so the log is part of
+    the version. The catalog, the search index, the query service's ETags, the figure cache and the snapshots
+    are all keyed on it.
+
+    Returns
+    -------
+    tuple
+        (mtime_ns, size, wal_mtime_ns, wal_size), the last two 0 when there is no log
+    '''
+    stat = os.stat(db_filename)
+    try:
+        wal = os.stat(db_filename + '-wal')
+    except FileNotFoundError:
+        return (stat.st_mtime_ns, stat.st_size, 0, 0)
+    return (stat.st_mtime_ns, stat.st_size, wal.st_mtime_ns, wal.st_size)
+
+def connect_readonly(db_filename=DB_FILENAME):
+    ''' Opens a read-only connection through a file: URI, so a reader can never change or lock the database for writing
+
+    Parameters
+    ----------
+    db_filename: string
+        the database to open
+
+    Returns
+    -------
+    sqlite3.Connection
+    '''
+    uri = 'file:' + pathname2url(os.path.abspath(db_filename)) + '?mode=ro'
+    return sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=64)
+
+
+class PlantsDAO:
+    '''read-only access to the plant database, shared by every query function in FinalCode.py.
+    Each thread gets its own long-lived connection the first time it runs a query, and keeps using it,
+    so no query pays for opening the database and compiled statements are reused.
+
+    Instance Attributes
+    -------------------
+    db_filename: string
+        the database to read (e.g. 'michiganplants.sqlite')
+    '''
+    def __init__(self, db_filename=DB_FILENAME):
+        self.db_filename = db_filename
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = []
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = connect_readonly(self.db_filename)
+            self.local.connection = connection
+            with self.lock:
+                self.connections.append(connection)
+        return connection
+
+    def query(self, sql, params=()):
+        return self.connection().execute(sql, params).fetchall()
+
+    def close(self):
+        with self.lock:
+            for connection in self.connections:
+                connection.close()
+            self.connections = []
+        self.local = threading.local()
+
+    def coefficients(self):
+        ''' Returns every coefficient of conservatism of the woody plants, with 0 for non-native species, e.g. [6.0, 9.0, 0, ...] '''
+        return [row[0] for row in self.query(select_coefficients)]
+
+    def ranked_by_conservatism(self, limit=20, scope='woody'):
+        ''' Returns (genus_species, common_name, coefficient) of the native plants with the highest coefficients,
+        highest first and ties in alphabetical order. Up to SUMMARY_TOP_N species are read from TopConservatism;
+        longer rankings are computed from the tables, in the same order.
+        '''
+        if limit <= SUMMARY_TOP_N:
+            return self.query(select_top_conservatism, [scope, limit])
+        return self.query(RANKINGS[scope], [limit])
+
+    def coefficient_counts(self, scope='woody'):
+        ''' Returns (coefficient, is_native, number of species) for every coefficient of conservatism, lowest first.
+        Non-native species have the coefficient None, e.g. [(None, 0, 21), (0.0, 1, 1), (1.0, 1, 2), ...]
+        '''
+        return self.query(select_coefficient_counts, [scope])
+
+    def family_summary(self, scope='statewide'):
+        ''' Returns (family, species, native species, mean, min and max coefficient) of every family '''
+        return self.query(select_family_summary, [scope])
+
+    def lab_site_summary(self):
+        ''' Returns (lab id, site name, species, native species, mean, min and max coefficient) of every lab site '''
+        return self.query(select_lab_site_summary)
+
+    def families(self):
+        ''' Returns the unique families of the woody plants, e.g. ['Pinaceae', 'Sapindaceae', ...] '''
+        return [row[0] for row in self.query(select_families)]
+
+    def species(self):
+        ''' Returns the genus & species name of every woody plant, e.g. ['Abies concolor', 'Acer negundo', ...] '''
+        return [row[0] for row in self.query(select_species)]
+
+    def plants_in_family(self, fam):
+        ''' Returns (genus_species, common_name) of every woody plant in a family '''
+        return self.query(select_plants_in_family, [fam])
+
+    def species_info(self, species):
+        ''' Returns (Family, IsNative, GrowthForm, ConservatismCoef, YoutubeVideo, SiteName, Latitude, Longitude, CommonName)
+        for every lab site where a species was taught
+        '''
+        return self.query(select_species_info, [species])
+
+    def text_search(self, words, limit=10):
+        ''' Returns (GenusSpecies, CommonName, Family, snippet, rank) of the species whose text best matches any of words,
+        best match first. Each word is quoted, so punctuation typed by the user can't break the FTS5 query syntax.
+        '''
+        terms = ['"' + word.replace('"', '""') + '"' for word in words]
+        if not terms:
+            return []
+        return self.query(select_text_search, [' OR '.join(terms), limit])
+
+    def plant_traits(self, species):
+        ''' Returns (MaximumHeightCm, AverageHeightCm, LigneousType, GrowthHabit, GrowthRate, Toxicity) of a species
+        from Trefle, or None if PlantTraits.py hasn't found it
+        '''
+        rows = self.query(select_plant_traits, [species])
+        return rows[0] if rows else None
+
+    def catalog_plants(self):
+        ''' Returns (Family, GenusSpecies, CommonName) of every woody plant '''
+        return self.query(select_catalog_plants)
+
+    def catalog_species_info(self):
+        ''' Returns the species_info() rows of every woody plant, each with its GenusSpecies in front '''
+        return self.query(select_catalog_species_info)
+
+    def all_plant_names(self):
+        ''' Returns (GenusSpecies, Family, CommonName) of every plant in Michigan '''
+        return self.query(select_plant_names)
+
+    def fqa_species(self):
+        ''' Returns (Id, GenusSpecies, ConservatismCoef, WetnessCoef, IsNative) of every plant in Michigan '''
+        return self.query(select_fqa_species)
+
+    def snapshot_plants(self):
+        ''' Returns every Plants row, (Id, Family, GenusSpecies, CommonName, Physiognomy, ConservatismCoef, WetnessCoef,
+        IsNative, GrowthForm), ordered by Id
+        '''
+        return self.query(select_snapshot_plants)
+
+    def snapshot_woody_plants(self):
+        ''' Returns (PlantId, LabId, YoutubeVideo) of every WoodyPlants row '''
+        return self.query(select_snapshot_woody_plants)
+
+    def snapshot_lab_sites(self):
+        ''' Returns (LabId, SiteName, Latitude, Longitude, DistanceFromCampus) of every lab site '''
+        return self.query(select_snapshot_lab_sites)
+
+    def site_report(self):
+        ''' Returns (LabId, SiteName, Latitude, Longitude, DistanceFromCampus, GenusSpecies, CommonName, Family, IsNative,
+        GrowthForm, ConservatismCoef, YoutubeVideo) for every woody plant at every lab site, ordered by site
+        '''
+        return self.query(select_site_report)
+
+    def lab_site_species(self):
+        ''' Returns (LabId, SiteName, PlantId) for every woody plant taught at every lab site '''
+        return self.query(select_lab_site_species)
+
+
+DAOS = {}
+DAO_LOCK = threading.Lock()
+
+def get_dao(db_filename=DB_FILENAME):
+    ''' Returns the PlantsDAO for db_filename, creating it the first time it is asked for
+    '''
+    with DAO_LOCK:
+        if db_filename not in DAOS:
+            DAOS[db_filename] = PlantsDAO(db_filename)
+        return DAOS[db_filename]
+
+
+def check_query_plans(connection):
+    ''' Runs EXPLAIN QUERY PLAN on every query in QUERIES and finds the ones that read a whole table
+    without an index (a "SCAN" step with no "USING ... INDEX")
+
+    Parameters
+    ----------
+    connection: sqlite3.Connection
+        the open michiganplants database
+
+    Returns
+    -------
+    dict
+        the plan steps of every query, and the steps that scan a table, e.g.
+        {'families': (['SCAN WoodyPlants USING COVERING INDEX WoodyPlantsPlantId', ...], []), ...}
+    '''
+    plans = {}
+    for name, (sql, params) in QUERIES.items():
+        steps = [row[3] for row in connection.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+        scans = [step for step in steps if step.startswith('SCAN') and 'INDEX' not in step]
+        plans[name] = (steps, scans)
+    return plans
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Maintain the michiganplants database')
+    parser.add_argument('command', choices=['migrate', 'check'], help='migrate: bring the schema up to date; check: show the plan of every FinalCode query and fail if one scans a table')
+    parser.add_argument('--db', default=DB_FILENAME)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    if args.command == 'migrate':
+        migrate(conn)
+        conn.execute('ANALYZE')
+        conn.commit()
+        print('Migrated ' + args.db)
+    else:
+        failed = False
+        for name, (steps, scans) in check_query_plans(conn).items():
+            print(name + ':')
+            for step in steps:
+                print('    ' + step)
+            if scans:
+                failed = True
+                print('    FULL TABLE SCAN: ' + ', '.join(scans))
+        conn.close()
+        if failed:
+            raise SystemExit(1)
+        print('Every query uses an index')
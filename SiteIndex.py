@@ -0,0 +1,220 @@
+import argparse
+import math
+import time
+
+import numpy as np
+
+from PlantsDB import DB_FILENAME, get_dao
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE = 69.05    # along a meridian
+CELL_DEGREES = 0.25         # the side of a grid cell; about 17 miles north to south
+CAMPUS = (42.2768, -83.7382) # the Diag, University of Michigan, where DistanceFromCampus(mi) is measured from
+NEAREST_BLOCK = 1000000     # most point-to-site distances held at once by nearest_sites()
+
+
+def haversine(lat, lon, latitudes, longitudes):
+    ''' Returns the great-circle distance in miles from one point to every point in two arrays.
+    The arguments are broadcast like any NumPy operation, so lat and lon can also be arrays, e.g.
+    a column of points against a row of sites gives the distance from every point to every site.
+
+    Parameters
+    ----------
+    lat: float
+    lon: float
+        the point, in degrees
+    latitudes: numpy.ndarray
+    longitudes: numpy.ndarray
+        the other points, in degrees
+
+    Returns
+    -------
+    numpy.ndarray
+        e.g. haversine(42.2768, -83.7382, np.array([42.365205]), np.array([-83.523242])) is about [12.6]
+    '''
+    lat1 = np.radians(lat)
+    lat2 = np.radians(latitudes)
+    dlat = lat2 - lat1
+    dlon = np.radians(longitudes) - np.radians(lon)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class SiteIndex:
+    '''the coordinates of every lab site in NumPy arrays with a grid over them, and the sites of every species,
+    for radius and nearest-site queries. A radius query only measures the sites in the grid cells its circle
+    touches, so it stays fast with hundreds or thousands of field sites.
+
+    Instance Attributes
+    -------------------
+    lab_ids: numpy.ndarray
+    names: list
+    latitudes: numpy.ndarray
+    longitudes: numpy.ndarray
+        one entry for every site, lined up
+
+    cells: dict
+        maps a grid cell (row, column) to the positions of the sites in it
+
+    species_sites: dict
+        maps a genus & species name to the positions of the sites where it grows (or is taught)
+    '''
+    def __init__(self, sites, species_sites, cell_degrees=CELL_DEGREES):
+        ''' sites: (lab_id, name, latitude, longitude) tuples; species_sites: (genus_species, lab_id) pairs '''
+        sites = list(sites)
+        self.lab_ids = np.array([site[0] for site in sites], dtype=np.int64)
+        self.names = [site[1] for site in sites]
+        self.latitudes = np.array([site[2] for site in sites], dtype=float)
+        self.longitudes = np.array([site[3] for site in sites], dtype=float)
+        self.cell_degrees = cell_degrees
+        positions = {lab_id: i for i, lab_id in enumerate(self.lab_ids.tolist())}
+
+        cells = {}
+        for i, cell in enumerate(zip(self.cell_of(self.latitudes).tolist(), self.cell_of(self.longitudes).tolist())):
+            cells.setdefault(cell, []).append(i)
+        self.cells = {cell: np.array(members, dtype=np.int64) for cell, members in cells.items()}
+
+        by_species = {}
+        for genus_species, lab_id in species_sites:
+            by_species.setdefault(genus_species, set()).add(positions[lab_id])
+        self.species_sites = {name: np.array(sorted(members), dtype=np.int64) for name, members in by_species.items()}
+
+    def cell_of(self, degrees):
+        return np.floor(np.asarray(degrees) / self.cell_degrees).astype(np.int64)
+
+    def candidates(self, lat, lon, miles):
+        ''' Returns the positions of the sites in every grid cell the circle of radius miles around (lat, lon) touches '''
+        dlat = miles / MILES_PER_DEGREE
+        dlon = miles / (MILES_PER_DEGREE * max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 1e-6))
+        rows = range(int(self.cell_of(lat - dlat)), int(self.cell_of(lat + dlat)) + 1)
+        columns = range(int(self.cell_of(lon - dlon)), int(self.cell_of(lon + dlon)) + 1)
+        if len(rows) * len(columns) > len(self.cells):
+            return np.arange(len(self.lab_ids)) # a circle this big touches most cells anyway
+        found = [self.cells[cell] for cell in ((row, column) for row in rows for column in columns) if cell in self.cells]
+        return np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+
+    def within(self, lat, lon, miles, species=None):
+        ''' Finds the sites within miles of a point, closest first
+
+        Parameters
+        ----------
+        lat: float
+        lon: float
+            the point, in degrees
+        miles: float
+            the radius
+        species: string
+            if given, only sites holding this genus & species are returned
+
+        Returns
+        -------
+        list
+            (lab_id, name, miles) tuples, e.g. [(9, 'Campus Walk', 0.1), (2, 'Radrick Forest', 3.8), ...]
+        '''
+        positions = self.candidates(lat, lon, miles)
+        if species is not None:
+            positions = np.intersect1d(positions, self.species_sites.get(species, np.zeros(0, dtype=np.int64)))
+        distances = haversine(lat, lon, self.latitudes[positions], self.longitudes[positions])
+        close = distances <= miles
+        positions = positions[close]
+        distances = distances[close]
+        order = np.argsort(distances, kind='stable')
+        return [(int(self.lab_ids[i]), self.names[i], float(distance)) for i, distance in zip(positions[order], distances[order])]
+
+    def nearest_for_species(self, species, lat, lon):
+        ''' Finds the nearest site holding each of many species. The distance to every site is computed once.
+
+        Parameters
+        ----------
+        species: list
+            genus & species names
+        lat: float
+        lon: float
+            the point, in degrees
+
+        Returns
+        -------
+        dict
+            maps each name to (lab_id, name, miles) of its nearest site, or None if no site holds it,
+            e.g. {'Pinus strobus': (7, 'Stinchfield Woods', 12.4)}
+        '''
+        distances = haversine(lat, lon, self.latitudes, self.longitudes)
+        results = {}
+        for name in species:
+            positions = self.species_sites.get(name)
+            if positions is None or not len(positions):
+                results[name] = None
+                continue
+            i = positions[np.argmin(distances[positions])]
+            results[name] = (int(self.lab_ids[i]), self.names[i], float(distances[i]))
+        return results
+
+    def nearest_sites(self, latitudes, longitudes):
+        ''' Finds the nearest site to each of many points. The distances from a block of points to every site
+        are computed as one array, NEAREST_BLOCK distances at a time.
+
+        Parameters
+        ----------
+        latitudes: sequence
+        longitudes: sequence
+            the points, in degrees
+
+        Returns
+        -------
+        list
+            (lab_id, name, miles) of the nearest site to each point, or None for every point if there are no sites
+        '''
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        if not len(self.lab_ids):
+            return [None] * len(latitudes)
+        nearest = np.empty(len(latitudes), dtype=np.int64)
+        miles = np.empty(len(latitudes))
+        block = max(1, NEAREST_BLOCK // len(self.lab_ids))
+        for start in range(0, len(latitudes), block):
+            stop = start + block
+            distances = haversine(latitudes[start:stop, None], longitudes[start:stop, None], self.latitudes, self.longitudes)
+            nearest[start:stop] = np.argmin(distances, axis=1)
+            miles[start:stop] = distances[np.arange(len(distances)), nearest[start:stop]]
+        return [(int(self.lab_ids[i]), self.names[i], float(distance)) for i, distance in zip(nearest.tolist(), miles.tolist())]
+
+
+SITE_INDEXES = {}
+
+def get_site_index(db_filename=DB_FILENAME):
+    ''' Returns the SiteIndex of every lab site in db_filename, building it the first time it is asked for
+    '''
+    if db_filename not in SITE_INDEXES:
+        rows = get_dao(db_filename).site_report()
+        sites = {}
+        species_sites = []
+        for lab_id, name, latitude, longitude, distance, genus_species, *rest in rows:
+            sites[lab_id] = (lab_id, name, latitude, longitude)
+            if genus_species is not None:
+                species_sites.append((genus_species, lab_id))
+        SITE_INDEXES[db_filename] = SiteIndex(sites.values(), species_sites)
+    return SITE_INDEXES[db_filename]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Find lab sites near a point')
+    parser.add_argument('command', choices=['within', 'nearest'], help='within: sites within --miles; nearest: the nearest site holding each species')
+    parser.add_argument('species', nargs='*', help='genus & species names, e.g. "Pinus strobus"')
+    parser.add_argument('--miles', type=float, default=25.0)
+    parser.add_argument('--lat', type=float, default=CAMPUS[0])
+    parser.add_argument('--lon', type=float, default=CAMPUS[1])
+    parser.add_argument('--db', default=DB_FILENAME)
+    args = parser.parse_args()
+
+    index = get_site_index(args.db)
+    start = time.perf_counter()
+    if args.command == 'within':
+        for name in args.species or [None]:
+            if name is not None:
+                print(name + ':')
+            for lab_id, site, miles in index.within(args.lat, args.lon, args.miles, name):
+                print('    ' + site + ' (' + str(round(miles, 1)) + ' mi)')
+    else:
+        for name, nearest in index.nearest_for_species(args.species, args.lat, args.lon).items():
+            print(name + ': ' + ('no lab site' if nearest is None else nearest[1] + ' (' + str(round(nearest[2], 1)) + ' mi)'))
+    print('Answered in ' + str(round((time.perf_counter() - start) * 1000, 3)) + ' ms')
@@ -0,0 +1,168 @@
+import argparse
+import html
+import time
+
+import plotly.graph_objs as go
+
+from PlantsDB import DB_FILENAME, get_dao
+
+REPORT_FILENAME = 'lab_sites_report.html'
+MAPS_URL = 'https://www.google.com/maps/search/?api=1&query='
+
+
+class LabSite:
+    '''a lab site and the woody plants taught there, gathered from PlantsDAO.site_report() rows
+
+    Instance Attributes
+    -------------------
+    lab_id: int
+    name: string
+    latitude: float
+    longitude: float
+    distance: int
+        miles from campus
+    plants: list
+        (genus_species, common_name, family, is_native, growth_form, conservatism, video) tuples
+    '''
+    def __init__(self, lab_id, name, latitude, longitude, distance):
+        self.lab_id = lab_id
+        self.name = name
+        self.latitude = latitude
+        self.longitude = longitude
+        self.distance = distance
+        self.plants = []
+
+    def mean_conservatism(self):
+        coefficients = [plant[5] for plant in self.plants if plant[5] is not None]
+        return sum(coefficients) / len(coefficients) if coefficients else None
+
+    def map_url(self):
+        return MAPS_URL + str(self.latitude) + ',' + str(self.longitude)
+
+
+def read_sites(rows):
+    ''' Groups site_report() rows (ordered by site) into LabSite objects in one pass '''
+    sites = []
+    for lab_id, name, latitude, longitude, distance, *plant in rows:
+        if not sites or sites[-1].lab_id != lab_id:
+            sites.append(LabSite(lab_id, name, latitude, longitude, distance))
+        if plant[0] is not None:
+            sites[-1].plants.append(tuple(plant))
+    return sites
+
+def layer_trace(name, sites, plants_of, visible=True, include_empty=False):
+    ''' Makes one scattergeo trace holding a marker for every site that has plants in this layer
+
+    Parameters
+    ----------
+    name: string
+        the name of the layer in the legend
+    sites: list
+        LabSite objects
+    plants_of: function
+        returns the plants of a site that belong to the layer
+    visible: bool
+        if False the layer starts hidden, and is shown by clicking it in the legend
+    include_empty: bool
+        if True, sites with no plants in the layer still get a marker
+
+    Returns
+    -------
+    plotly.graph_objs.Scattergeo
+    '''
+    latitudes = []
+    longitudes = []
+    sizes = []
+    texts = []
+    for site in sites:
+        plants = plants_of(site)
+        if not plants and not include_empty:
+            continue
+        latitudes.append(site.latitude)
+        longitudes.append(site.longitude)
+        sizes.append(8 + 2 * len(plants))
+        names = [plant[0] for plant in plants[:15]] + (['...'] if len(plants) > 15 else [])
+        texts.append('<b>' + html.escape(site.name) + '</b><br>' + str(len(plants)) + ' species<br>' + '<br>'.join(names))
+    return go.Scattergeo(name=name, lat=latitudes, lon=longitudes, text=texts, hoverinfo='text', mode='markers',
+                         marker=dict(size=sizes, opacity=0.7, line=dict(width=1, color='white')),
+                         visible=True if visible else 'legendonly')
+
+def all_plants(site):
+    return site.plants
+
+def site_map(sites):
+    ''' Builds the map: one trace with every lab site, and one hidden trace for each growth form '''
+    traces = [layer_trace('All lab sites', sites, all_plants, include_empty=True)]
+    growth_forms = sorted(set(plant[4] for site in sites for plant in site.plants if plant[4]))
+    for growth_form in growth_forms:
+        traces.append(layer_trace(growth_form.capitalize(), sites,
+                                  lambda site, form=growth_form: [plant for plant in site.plants if plant[4] == form], visible=False))
+    layout = go.Layout(title='Woody Plants lab sites', height=650, margin=dict(l=0, r=0, t=40, b=0),
+                       geo=dict(fitbounds='locations', resolution=50, showland=True, landcolor='lightgoldenrodyellow',
+                                showlakes=True, showrivers=True, showsubunits=True))
+    return go.Figure(data=traces, layout=layout)
+
+def format_coefficient(value):
+    return '' if value is None else format(value, 'g')
+
+def site_section(site):
+    ''' Returns the HTML of one site: a heading, a map link and the table of its plants '''
+    parts = ['<h2 id="site-' + str(site.lab_id) + '">' + html.escape(site.name) + '</h2>']
+    mean = site.mean_conservatism()
+    parts.append('<p>' + str(len(site.plants)) + ' species, ' + str(site.distance) + ' miles from campus'
+                 + ('' if mean is None else ', mean coefficient of conservatism ' + format(mean, '.1f'))
+                 + '. <a href="' + html.escape(site.map_url()) + '">Google Maps</a></p>')
+    if not site.plants:
+        return '\n'.join(parts)
+    parts.append('<table><tr><th>Genus &amp; species</th><th>Common name</th><th>Family</th><th>Native</th>'
+                 '<th>Growth form</th><th>C</th><th>Video</th></tr>')
+    for genus_species, common_name, family, is_native, growth_form, conservatism, video in site.plants:
+        parts.append('<tr><td><i>' + html.escape(genus_species) + '</i></td><td>' + html.escape(common_name) + '</td><td>'
+                     + html.escape(family) + '</td><td>' + ('yes' if is_native else 'no') + '</td><td>' + html.escape(growth_form or '')
+                     + '</td><td>' + format_coefficient(conservatism) + '</td><td><a href="' + html.escape(video) + '">watch</a></td></tr>')
+    parts.append('</table>')
+    return '\n'.join(parts)
+
+def build_report(db_filename=DB_FILENAME, include_plotlyjs=True):
+    ''' Renders every lab site and its plants into one HTML page: a map and a table for each site
+
+    Parameters
+    ----------
+    db_filename: string
+        the database to read
+    include_plotlyjs: bool or string
+        True embeds plotly.js so the page works offline; 'cdn' links to it instead (a much smaller file)
+
+    Returns
+    -------
+    string
+        the HTML of the report
+    '''
+    sites = read_sites(get_dao(db_filename).site_report())
+    parts = ['<!DOCTYPE html>', '<html><head><meta charset="utf-8"><title>Woody Plants lab sites</title>',
+             '<style>body{font-family:sans-serif;margin:2em} table{border-collapse:collapse} '
+             'td,th{border:1px solid #ccc;padding:2px 8px;text-align:left}</style></head><body>',
+             '<h1>Woody Plants lab sites</h1>']
+    parts.append(site_map(sites).to_html(full_html=False, include_plotlyjs=include_plotlyjs))
+    parts.append('<ul>')
+    for site in sites:
+        parts.append('<li><a href="#site-' + str(site.lab_id) + '">' + html.escape(site.name) + '</a> (' + str(len(site.plants)) + ' species)</li>')
+    parts.append('</ul>')
+    for site in sites:
+        parts.append(site_section(site))
+    parts.append('</body></html>')
+    return '\n'.join(parts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Write a single HTML map and report of every lab site and its plants')
+    parser.add_argument('--output', default=REPORT_FILENAME)
+    parser.add_argument('--db', default=DB_FILENAME)
+    parser.add_argument('--cdn', action='store_true', help='link to plotly.js online instead of embedding it')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    report = build_report(args.db, 'cdn' if args.cdn else True)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        file.write(report)
+    print('Wrote ' + args.output + ' (' + str(len(report) // 1024) + ' KB) in ' + str(round(time.perf_counter() - start, 2)) + ' s')
@@ -0,0 +1,244 @@
+import argparse
+import json
+import os
+import shutil
+import time
+from array import array
+
+import numpy as np
+
+from FloristicQuality import FloristicQuality, site_records
+from PlantRecords import PlantColumns
+from PlantsDB import DB_FILENAME, db_version, get_dao
+
+SNAPSHOT_DIRECTORY = 'plants_snapshot'
+SNAPSHOT_FORMAT = 1
+
+# every .npy column of a snapshot and its dtype; the species columns are lined up with plant_id (sorted),
+# the woody_ columns with the WoodyPlants rows and the site_ columns with the lab sites (sorted by LabId)
+COLUMNS = {
+    'plant_id': np.int64,
+    'conservatism': np.float64,     # nan where a species has no coefficient
+    'wetness': np.float64,
+    'is_native': np.bool_,
+    'family': np.uint16,            # codes into strings['families']
+    'physiognomy': np.uint16,       # codes into strings['physiognomies']
+    'growth_form': np.uint16,       # codes into strings['growth_forms']; 0 is None
+    'name_rank': np.int32,          # the place of each genus & species name in alphabetical order, for ties
+    'woody_position': np.int32,     # the species of each WoodyPlants row, as a position in the species columns (-1 if unlinked)
+    'woody_lab_id': np.int64,
+    'site_lab_id': np.int64,
+    'site_latitude': np.float64,
+    'site_longitude': np.float64,
+    'site_distance': np.int64,
+}
+
+
+def export_snapshot(db_filename=DB_FILENAME, directory=SNAPSHOT_DIRECTORY):
+    ''' Writes the joined Plants, WoodyPlants and LabSites tables to a directory of NumPy .npy columns, with the
+    strings in strings.json and the database version in manifest.json. The snapshot is written next to the old
+    one and swapped in at the end, so a reader never loads half of it.
+
+    Parameters
+    ----------
+    db_filename: string
+        the database to export
+    directory: string
+        where the snapshot is written
+
+    Returns
+    -------
+    dict
+        the manifest, e.g. {'format': 1, 'db_version': [...], 'species': 2906, 'woody_plants': 122, 'lab_sites': 10, ...}
+    '''
+    start = time.perf_counter()
+    dao = get_dao(db_filename)
+    version = db_version(db_filename)
+    plant_ids = array('q')
+    species = PlantColumns()
+    for row in dao.snapshot_plants():
+        plant_ids.append(row[0])
+        species.append_row(row[1:])
+    columns = species.to_numpy()
+    columns['plant_id'] = np.frombuffer(plant_ids, dtype=np.int64)
+    columns['physiognomy'] = np.frombuffer(species.physiognomy_codes, dtype=np.uint16)
+    name_order = np.argsort(np.array(species.genus_species, dtype=object), kind='stable')
+    columns['name_rank'] = np.empty(len(species), dtype=np.int32)
+    columns['name_rank'][name_order] = np.arange(len(species), dtype=np.int32)
+
+    woody = dao.snapshot_woody_plants()
+    woody_ids = np.array([-1 if row[0] is None else row[0] for row in woody], dtype=np.int64)
+    positions = np.searchsorted(columns['plant_id'], woody_ids)
+    positions[positions == len(plant_ids)] = 0
+    found = (columns['plant_id'][positions] == woody_ids) if len(plant_ids) else np.zeros(len(woody), dtype=bool)
+    columns['woody_position'] = np.where(found, positions, -1)
+    columns['woody_lab_id'] = [row[1] for row in woody]
+
+    sites = dao.snapshot_lab_sites()
+    for i, name in enumerate(['site_lab_id', None, 'site_latitude', 'site_longitude', 'site_distance']):
+        if name is not None:
+            columns[name] = [row[i] for row in sites]
+
+    strings = {
+        'families': species.families,
+        'physiognomies': species.physiognomies,
+        'growth_forms': species.growth_forms,
+        'genus_species': species.genus_species,
+        'common_names': species.common_names,
+        'woody_videos': [row[2] for row in woody],
+        'site_names': [row[1] for row in sites],
+    }
+    manifest = {
+        'format': SNAPSHOT_FORMAT,
+        'db_filename': os.path.abspath(db_filename),
+        'db_version': list(version),
+        'created': time.time(),
+        'species': len(species),
+        'woody_plants': len(woody),
+        'lab_sites': len(sites),
+        'columns': {name: np.dtype(dtype).str for name, dtype in COLUMNS.items()},
+    }
+
+    temporary = directory.rstrip('/\\') + '.tmp'
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+    for name, dtype in COLUMNS.items():
+        np.save(os.path.join(temporary, name + '.npy'), np.asarray(columns[name], dtype=dtype))
+    with open(os.path.join(temporary, 'strings.json'), 'w', encoding='utf-8') as file:
+        json.dump(strings, file)
+    with open(os.path.join(temporary, 'manifest.json'), 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, indent=1)
+    old = directory.rstrip('/\\') + '.old'
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(directory):
+        os.rename(directory, old)
+    os.rename(temporary, directory)
+    shutil.rmtree(old, ignore_errors=True)
+    manifest['seconds'] = round(time.perf_counter() - start, 3)
+    return manifest
+
+
+class Snapshot:
+    '''a snapshot written by export_snapshot(), loaded for analytics without SQLite. Every column is a NumPy
+    array memory-mapped from its .npy file, so loading reads no data and the coefficient and wetness arrays are
+    the file's pages themselves (read-only, never copied); strings are read from strings.json.
+
+    Instance Attributes
+    -------------------
+    manifest: dict
+        the database version, row counts and dtypes the snapshot was written with
+
+    columns: dict
+        maps every name in COLUMNS to its array, e.g. columns['conservatism']
+
+    strings: dict
+        the string dictionaries and names: 'families', 'physiognomies', 'growth_forms', 'genus_species',
+        'common_names' (lined up with the species columns), 'woody_videos' and 'site_names'
+    '''
+    def __init__(self, directory=SNAPSHOT_DIRECTORY, mmap=True):
+        self.directory = directory
+        with open(os.path.join(directory, 'manifest.json'), encoding='utf-8') as file:
+            self.manifest = json.load(file)
+        if self.manifest['format'] != SNAPSHOT_FORMAT:
+            raise ValueError(directory + ' is a format ' + str(self.manifest['format']) + ' snapshot; export it again')
+        self.columns = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r' if mmap else None) for name in COLUMNS}
+        with open(os.path.join(directory, 'strings.json'), encoding='utf-8') as file:
+            self.strings = json.load(file)
+
+    @property
+    def conservatism(self):
+        return self.columns['conservatism']
+
+    @property
+    def wetness(self):
+        return self.columns['wetness']
+
+    def is_current(self, db_filename=DB_FILENAME):
+        ''' True if the database hasn't changed since the snapshot was exported '''
+        return os.path.exists(db_filename) and list(db_version(db_filename)) == self.manifest['db_version']
+
+    def scope_positions(self, scope):
+        ''' Returns the species position of every row of a scope: every WoodyPlants row for 'woody'
+        (like the Plants JOIN WoodyPlants summaries), or every species for 'statewide'
+        '''
+        if scope == 'woody':
+            positions = np.asarray(self.columns['woody_position'])
+            return positions[positions >= 0]
+        return np.arange(len(self.conservatism))
+
+    def coefficient_counts(self, scope='woody'):
+        ''' Returns (coefficient, is native, species) for every coefficient like PlantsDAO.coefficient_counts(),
+        e.g. [(None, 0, 21), (0.0, 1, 1), (1.0, 1, 2), ...]
+        '''
+        positions = self.scope_positions(scope)
+        coefficients = self.conservatism[positions]
+        native = np.asarray(self.columns['is_native'])[positions]
+        missing = np.isnan(coefficients)
+        results = []
+        for is_native in (0, 1):
+            count = int(np.count_nonzero(missing & (native == is_native)))
+            if count:
+                results.append((None, is_native, count))
+        for is_native in (0, 1):
+            values, counts = np.unique(coefficients[~missing & (native == is_native)], return_counts=True)
+            results.extend((float(value), is_native, int(count)) for value, count in zip(values, counts))
+        results.sort(key=lambda result: (result[0] is not None, result[0] or 0, result[1]))
+        return results
+
+    def ranked_by_conservatism(self, limit=20, scope='woody'):
+        ''' Returns (genus_species, common_name, coefficient) of the species with the highest coefficients,
+        like PlantsDAO.ranked_by_conservatism(), highest first and ties in alphabetical order
+        '''
+        positions = self.scope_positions(scope)
+        positions = positions[~np.isnan(self.conservatism[positions])]
+        order = np.lexsort((np.asarray(self.columns['name_rank'])[positions], -self.conservatism[positions]))[:limit]
+        names = self.strings['genus_species']
+        common_names = self.strings['common_names']
+        return [(names[i], common_names[i], float(self.conservatism[i])) for i in positions[order].tolist()]
+
+    def floristic_quality(self):
+        ''' Returns a FloristicQuality engine over the snapshot's columns, sharing their memory '''
+        return FloristicQuality.from_columns(self.columns['plant_id'], self.strings['genus_species'],
+                                             self.conservatism, self.wetness, self.columns['is_native'])
+
+    def assess_lab_sites(self):
+        ''' Scores every lab site like FloristicQuality.assess_lab_sites(), without opening the database '''
+        positions = np.asarray(self.columns['woody_position'])
+        linked = positions >= 0
+        site_names = dict(zip(self.columns['site_lab_id'].tolist(), self.strings['site_names']))
+        sites, metrics = self.floristic_quality().assess(np.asarray(self.columns['woody_lab_id'])[linked], positions[linked])
+        return site_records([site_names[site] for site in sites.tolist()], metrics)
+
+
+SNAPSHOTS = {}
+
+def get_snapshot(directory=SNAPSHOT_DIRECTORY):
+    ''' Returns the Snapshot in directory, loading it the first time it is asked for
+    '''
+    if directory not in SNAPSHOTS:
+        SNAPSHOTS[directory] = Snapshot(directory)
+    return SNAPSHOTS[directory]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export the plant database to memory-mappable NumPy columns, or describe an export')
+    parser.add_argument('command', choices=['export', 'info'])
+    parser.add_argument('--db', default=DB_FILENAME)
+    parser.add_argument('--directory', default=SNAPSHOT_DIRECTORY)
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        manifest = export_snapshot(args.db, args.directory)
+        print('Wrote ' + str(manifest['species']) + ' species, ' + str(manifest['woody_plants']) + ' woody plants and '
+              + str(manifest['lab_sites']) + ' lab sites to ' + args.directory + ' in ' + str(manifest['seconds']) + ' s')
+    else:
+        start = time.perf_counter()
+        snapshot = Snapshot(args.directory)
+        print('Loaded ' + args.directory + ' in ' + str(round((time.perf_counter() - start) * 1000, 2)) + ' ms ('
+              + ('current' if snapshot.is_current(args.db) else 'older than ' + args.db) + ')')
+        for name, work in [('histogram', lambda: snapshot.coefficient_counts('statewide')),
+                           ('ranking', lambda: snapshot.ranked_by_conservatism(20, 'statewide')),
+                           ('lab site FQA', snapshot.assess_lab_sites)]:
+            start = time.perf_counter()
+            work()
+            print(name + ': ' + str(round((time.perf_counter() - start) * 1000, 2)) + ' ms')
@@ -0,0 +1,236 @@
+import argparse
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import requests
+
+from PageCache import open_page_cache
+from PageFetcher import HostLimiter
+
+TREFLE_URL = 'https://trefle.io/api/v1'
+CACHE_FILENAME = 'trefle_cache.sqlite'
+LEGACY_CACHE_FILENAME = 'trefle_cache.json'
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def cache_key(path, params=None):
+    ''' Returns the cache key of a request: its URL with the parameters sorted and the token left out,
+    e.g. cache_key('/families', {'page': 2}) is 'https://trefle.io/api/v1/families?page=2'
+    '''
+    query = sorted((name, str(value)) for name, value in (params or {}).items() if name != 'token')
+    return TREFLE_URL + path + ('?' + urlencode(query) if query else '')
+
+def legacy_cache_key(key):
+    ''' Returns the cache_key() of an entry of the old trefle_cache.json, or None for a key it can't read.
+    Those keys were made by trefle_checkpoint.construct_unique_key(): the base URL (with ?token=... in it),
+    then '_' and the sorted name_value parameters, which were only ever the page,
+    e.g. 'https://trefle.io/api/v1/families?token=abc_page_2' is cache_key('/families', {'page': 2})
+    '''
+    base, separator, page = key.rpartition('_page_')
+    if not separator:
+        base, page = (key[:-1], None) if key.endswith('_') else (None, None)
+    elif not page.isdigit():
+        return None
+    if base is None or not base.startswith(TREFLE_URL):
+        return None
+    parts = urlsplit(base)
+    params = {name: values[0] for name, values in parse_qs(parts.query).items()}
+    if page is not None:
+        params['page'] = int(page)
+    return cache_key(parts.path[len(urlsplit(TREFLE_URL).path):], params)
+
+def page_number(link):
+    ''' Returns the page parameter of a Trefle link such as '/api/v1/families?page=34', or None '''
+    if not link:
+        return None
+    pages = parse_qs(urlsplit(link).query).get('page')
+    return int(pages[0]) if pages else None
+
+
+class TrefleClient:
+    '''a client for the paginated Trefle API. Every response is kept in a PageCache keyed by cache_key(),
+    so a page is one indexed row that is read or written on its own. A paginated endpoint is walked by
+    reading the page count from the "last" link of the first page and fetching the other pages on a thread
+    pool, with requests that fail with 429 or 5xx (or can't connect) retried after an exponential backoff.
+
+    Instance Attributes
+    -------------------
+    cache: PageCache
+        the saved responses, as JSON text
+
+    token: string
+        the Trefle API token, sent with every request (but never part of a cache key)
+
+    max_workers: int
+        how many pages are fetched at once
+
+    limiter: HostLimiter
+        the per-host concurrency and rate limit, shared with PageFetcher
+
+    retries: int
+    backoff: float
+        a failed request is tried again up to retries times, waiting backoff, 2 * backoff, 4 * backoff... seconds
+        (or what the server asks for in Retry-After, but never more than backoff * 2 ** retries)
+
+    origin: string
+        if given, requests are sent to this scheme and host instead of trefle.io (e.g. a mock from
+        FixtureServer.serve_trefle()). The cache is still keyed by the trefle.io URL.
+
+    executor: ThreadPoolExecutor
+        the one pool of max_workers threads every request runs on, shared by iter_pages() and get_many().
+        Those two wait on the pool, so they must not be called from a task running on it.
+    '''
+    def __init__(self, cache, token=None, max_workers=4, per_host=4, min_interval=0.05, retries=4, backoff=0.5, origin=None):
+        self.cache = cache
+        self.token = token if token is not None else os.environ.get('TREFLE_TOKEN', '')
+        self.max_workers = max_workers
+        self.limiter = HostLimiter(per_host, min_interval)
+        self.retries = retries
+        self.backoff = backoff
+        self.origin = origin
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.retry_count = 0
+
+    def session(self):
+        if not hasattr(self.local, 'session'): # requests sessions are not shared between threads
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def request_url(self, path):
+        if self.origin is None:
+            return TREFLE_URL + path
+        return self.origin.rstrip('/') + urlsplit(TREFLE_URL).path + path
+
+    def fetch(self, path, params=None):
+        ''' Sends one request to the API, retrying it if it fails on the server's side
+
+        Parameters
+        ----------
+        path: string
+            the endpoint, e.g. '/families' or '/species/pinus-strobus'
+        params: dict
+            the query parameters, e.g. {'page': 2}
+
+        Returns
+        -------
+        dict
+            the decoded JSON response
+        '''
+        url = self.request_url(path)
+        host = urlsplit(url).netloc
+        query = dict(params or {})
+        query['token'] = self.token
+        for attempt in range(self.retries + 1):
+            self.limiter.acquire(host)
+            try:
+                with self.lock:
+                    self.request_count += 1
+                response = self.session().get(url, params=query, timeout=30)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+                response = None
+            finally:
+                self.limiter.release(host)
+            if response is not None and (response.status_code not in RETRY_STATUSES or attempt == self.retries):
+                response.raise_for_status()
+                return response.json()
+            wait = self.backoff * 2 ** attempt
+            retry_after = response.headers.get('Retry-After', '') if response is not None else ''
+            if retry_after.isdigit():
+                wait = min(int(retry_after), self.backoff * 2 ** self.retries)
+            with self.lock:
+                self.retry_count += 1
+            time.sleep(wait)
+
+    def get(self, path, params=None, refresh=False):
+        ''' Returns the decoded response for path and params, from the cache when it was fetched before '''
+        key = cache_key(path, params)
+        body = None if refresh else self.cache.get(key)
+        if body is not None:
+            return json.loads(body)
+        result = self.fetch(path, params)
+        self.cache[key] = json.dumps(result)
+        return result
+
+    def get_many(self, requests, refresh=False):
+        ''' Returns the decoded responses of many (path, params) requests, in order, fetching them on the thread pool '''
+        return list(self.executor.map(lambda request: self.get(request[0], request[1], refresh), requests))
+
+    def iter_pages(self, path, params=None, refresh=False):
+        ''' Yields every record of a paginated endpoint, in order, as each page arrives.
+        Only a few pages are in flight (or waiting to be read) at once, so an endpoint with
+        thousands of pages streams through in constant memory.
+
+        Parameters
+        ----------
+        path: string
+            the endpoint, e.g. '/families' or '/species'
+        params: dict
+            more query parameters, e.g. {'filter[scientific_name]': 'Acer rubrum,Pinus strobus'}
+        refresh: bool
+            if True, every page is fetched again even if it is cached
+
+        Returns
+        -------
+        generator
+            the records, e.g. {'id': 1, 'name': 'Acanthaceae', ...} for /families
+        '''
+        params = dict(params or {})
+        first = self.get(path, dict(params, page=1), refresh)
+        yield from first['data']
+        last = page_number(first.get('links', {}).get('last')) or 1
+        window = deque()
+        try:
+            for page in range(2, last + 1):
+                window.append(self.executor.submit(self.get, path, dict(params, page=page), refresh))
+                if len(window) >= 2 * self.max_workers:
+                    yield from window.popleft().result()['data']
+            while window:
+                yield from window.popleft().result()['data']
+        finally:
+            for future in window: # if the caller stops early, pages not yet started are dropped
+                future.cancel()
+
+    def close(self):
+        ''' Stops the thread pool once the requests already started are done '''
+        self.executor.shutdown(cancel_futures=True)
+
+
+CLIENTS = {}
+
+def get_trefle_client(cache_filename=CACHE_FILENAME, origin=None, **options):
+    ''' Returns a TrefleClient over the response cache in cache_filename (importing the old JSON cache under
+    the keys cache_key() makes, see legacy_cache_key()), making it the first time it is asked for
+    '''
+    key = (os.path.abspath(cache_filename), origin)
+    if key not in CLIENTS:
+        cache = open_page_cache(cache_filename, LEGACY_CACHE_FILENAME, legacy_cache_key)
+        CLIENTS[key] = TrefleClient(cache, origin=origin, **options)
+    return CLIENTS[key]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Walk a paginated Trefle endpoint and print its record count')
+    parser.add_argument('path', nargs='?', default='/families', help='the endpoint, e.g. /families')
+    parser.add_argument('--cache', default=CACHE_FILENAME)
+    parser.add_argument('--origin', help='send requests here instead of trefle.io, e.g. http://127.0.0.1:8000 (see FixtureServer.py --trefle)')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--refresh', action='store_true', help='fetch every page again')
+    args = parser.parse_args()
+
+    client = get_trefle_client(args.cache, args.origin, max_workers=args.workers)
+    start = time.perf_counter()
+    count = 0
+    for record in client.iter_pages(args.path, refresh=args.refresh):
+        count += 1
+    print(str(count) + ' records in ' + str(round(time.perf_counter() - start, 2)) + ' s (' + str(client.request_count)
+          + ' requests, ' + str(client.retry_count) + ' retries)')
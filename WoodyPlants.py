@@ -1,10 +1,8 @@
 import csv
 import sqlite3
-import requests
-import pandas
+from PlantsDB import DB_FILENAME, bulk_load, drop_indexes, finish_build, start_build
 
-def create_db():
-    conn = sqlite3.connect('michiganplants.sqlite')
+def create_db(conn):
     cur = conn.cursor()
 
     drop_woody_plants_sql = 'DROP TABLE IF EXISTS "WoodyPlants"'
@@ -14,7 +12,8 @@ def create_db():
         CREATE TABLE IF NOT EXISTS "WoodyPlants" (
             "GenusSpecies" TEXT NOT NULL,
             "LabId" INTEGER NOT NULL, 
-            "YoutubeVideo" TEXT NOT NULL
+            "YoutubeVideo" TEXT NOT NULL,
+            "PlantId" INTEGER REFERENCES "Plants" ("Id")
         );
     '''
 
@@ -34,43 +33,44 @@ def create_db():
     cur.execute(create_woody_plants_sql)
     cur.execute(create_lab_sites_sql)
     conn.commit()
-    conn.close()
 
-def load_woody_plants():
-    file_contents = open('SpeciesList.csv', 'r')
-    csv_reader = csv.reader(file_contents)
-    next(csv_reader)
+def load_woody_plants(conn, csv_filename='SpeciesList.csv'):
     insert_plant_sql = '''
-        INSERT INTO WoodyPlants
+        INSERT INTO WoodyPlants ("GenusSpecies", "LabId", "YoutubeVideo")
             VALUES (?, ?, ?)
     '''
-    conn = sqlite3.connect('michiganplants.sqlite')
-    cur = conn.cursor()
-    for row in csv_reader:
-        cur.execute(insert_plant_sql, [row[0], row[1], row[2]])
-    
-    conn.commit()
-    conn.close()
+    drop_indexes(conn, 'WoodyPlants')
+    with open(csv_filename, 'r') as file_contents:
+        csv_reader = csv.reader(file_contents)
+        next(csv_reader)
+        rows = ([row[0], row[1], row[2]] for row in csv_reader)
+        return bulk_load(conn, 'WoodyPlants', insert_plant_sql, rows)
 
-def load_lab_sites():
-    file_contents = open('LabSites.csv', 'r')
-    csv_reader = csv.reader(file_contents)
-    next(csv_reader)
+def load_lab_sites(conn, csv_filename='LabSites.csv'):
     insert_lab_sql = '''
         INSERT INTO LabSites
             VALUES (?, ?, ?, ?, ?, ?)
     '''
-    conn = sqlite3.connect('michiganplants.sqlite')
-    cur = conn.cursor()
-    for row in csv_reader:
-        cur.execute(insert_lab_sql, [row[0], row[1], row[2], row[3],row[4],row[5]])
-    
-    conn.commit()
+    drop_indexes(conn, 'LabSites')
+    with open(csv_filename, 'r') as file_contents:
+        csv_reader = csv.reader(file_contents)
+        next(csv_reader)
+        rows = ([row[0], row[1], row[2], row[3],row[4],row[5]] for row in csv_reader)
+        return bulk_load(conn, 'LabSites', insert_lab_sql, rows)
+
+def build_tables(db_filename=DB_FILENAME):
+    ''' Rebuilds the WoodyPlants and LabSites tables from the two CSV files
+    '''
+    conn = sqlite3.connect(db_filename)
+    start_build(conn)
+    create_db(conn)
+    load_woody_plants(conn)
+    load_lab_sites(conn)
+    finish_build(conn, ['WoodyPlants', 'LabSites']) # also links WoodyPlants.PlantId to Plants
     conn.close()
 
-create_db()
-load_woody_plants()
-load_lab_sites()
+if __name__ == "__main__":
+    build_tables()
 
 
 # how to join Woody Plants and Lab Sites using LabId
@@ -86,6 +86,12 @@ SELECT *
     JOIN WoodyPlants
     ON Plants.GenusSpecies = WoodyPlants.GenusSpecies
 
+#the same join through the integer key (faster, see PlantsDB.migrate)
+SELECT *
+    FROM Plants
+    JOIN WoodyPlants
+    ON Plants.Id = WoodyPlants.PlantId
+
 #how to do double join
 SELECT *
     FROM (Plants
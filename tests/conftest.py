@@ -0,0 +1,74 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# the modules are scripts at the top of the repository, not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import FloristicQuality
+import PlantCatalog
+import PlantsDB
+import PlantSearch
+import WoodyPlants
+
+# a small michiganplants database: the scraped facts of every Plants row, and the woody plants taught at each lab site
+PLANTS = [
+    ['Adoxaceae', 'Sambucus canadensis', 'common elder', 'Nt Shrub', '3', '-3'],
+    ['Adoxaceae', 'Viburnum opulus', 'highbush-cranberry', 'Ad Shrub', '*', '0'],
+    ['Cupressaceae', 'Juniperus virginiana', 'red-cedar', 'Nt Tree', '*', '3'], # native, but without a coefficient
+    ['Pinaceae', 'Pinus strobus', 'white pine', 'Nt Tree', '3', '3'],
+    ['Pinaceae', 'Tsuga canadensis', 'hemlock', 'Nt Tree', '5', '3'],
+    ['Pinaceae', 'Abies balsamea', 'balsam fir', 'Nt Tree', '3', '0'],
+    ['Rosaceae', 'Prunus serotina', 'wild black cherry', 'Nt Tree', '2', '3'],
+    ['Rosaceae', 'Rosa multiflora', 'multiflora rose', 'Ad Shrub', '*', '3'],
+    ['Rosaceae', 'Fragaria virginiana', 'wild strawberry', 'Nt P-Forb', '2', '3'], # not a woody plant
+]
+
+WOODY_PLANTS = [
+    ['Sambucus canadensis', 1, 'https://www.youtube.com/watch?v=elder'],
+    ['Viburnum opulus', 1, 'https://www.youtube.com/watch?v=viburnum'],
+    ['Juniperus virginiana', 2, 'https://www.youtube.com/watch?v=juniper'],
+    ['Pinus strobus', 2, 'https://www.youtube.com/watch?v=pine'],
+    ['Tsuga canadensis', 2, 'https://www.youtube.com/watch?v=hemlock'],
+    ['Abies balsamea', 2, 'https://www.youtube.com/watch?v=fir'],
+    ['Prunus serotina', 1, 'https://www.youtube.com/watch?v=cherry'],
+    ['Rosa multiflora', 1, 'https://www.youtube.com/watch?v=rose'],
+]
+
+LAB_SITES = [
+    [1, 'Nichols Arboretum', 4, 42.2807, -83.7253, 1],
+    [2, 'Stinchfield Woods', 4, 42.404298, -83.91032, 15],
+]
+
+
+def build_plants_db(filename):
+    ''' Writes PLANTS, WOODY_PLANTS and LAB_SITES to a new database with every index and summary table '''
+    connection = sqlite3.connect(filename)
+    connection.execute(PlantsDB.create_plants)
+    connection.executemany('INSERT INTO Plants VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?)', [PlantsDB.plant_row(facts) for facts in PLANTS])
+    WoodyPlants.create_db(connection)
+    connection.executemany('INSERT INTO WoodyPlants ("GenusSpecies", "LabId", "YoutubeVideo") VALUES (?, ?, ?)', WOODY_PLANTS)
+    connection.executemany('INSERT INTO LabSites VALUES (?, ?, ?, ?, ?, ?)', LAB_SITES)
+    connection.commit()
+    PlantsDB.migrate(connection)
+    connection.close()
+
+def forget_loaded_data(monkeypatch):
+    ''' Drops every DAO, catalog, search index and FQA engine, so nothing loaded by another test is reused '''
+    monkeypatch.setattr(PlantsDB, 'DAOS', {})
+    monkeypatch.setattr(FloristicQuality, 'ENGINES', {})
+    monkeypatch.setattr(PlantCatalog, 'CATALOGS', {})
+    monkeypatch.setattr(PlantSearch, 'SEARCH_INDEXES', {})
+
+@pytest.fixture
+def plants_db(tmp_path, monkeypatch):
+    ''' Builds the small database as michiganplants.sqlite in a temporary directory and makes that the current
+    directory, with no DAO, catalog, search index or FQA engine left over from another test. Returns the database's path.
+    '''
+    filename = str(tmp_path / PlantsDB.DB_FILENAME)
+    build_plants_db(filename)
+    monkeypatch.chdir(tmp_path)
+    forget_loaded_data(monkeypatch)
+    return filename
@@ -0,0 +1,60 @@
+import io
+
+import PageCache
+from Benchmarks import compare, generate_corpus, print_report
+from conftest import PLANTS
+
+BASELINE = {'results': {
+    'slower': {'median_us': 100.0},
+    'faster': {'median_us': 100.0},
+    'same': {'median_us': 100.0},
+    'slightly_slower': {'median_us': 100.0},
+    'dropped': {'median_us': 50.0},
+    'was_free': {'median_us': 0.0},
+}}
+
+RESULTS = {
+    'slower': {'median_us': 130.0},
+    'faster': {'median_us': 70.0},
+    'same': {'median_us': 100.0},
+    'slightly_slower': {'median_us': 124.0},
+    'added': {'median_us': 10.0},
+    'was_free': {'median_us': 5.0},
+}
+
+
+def test_compare_gives_every_benchmark_a_status():
+    comparison = compare(RESULTS, BASELINE)
+    assert {name: line['status'] for name, line in comparison.items()} == {
+        'slower': 'regression', 'faster': 'improvement', 'same': 'ok', 'slightly_slower': 'ok',
+        'added': 'new', 'dropped': 'missing', 'was_free': 'ok'}
+    assert comparison['slower'] == {'baseline_us': 100.0, 'current_us': 130.0, 'ratio': 1.3, 'status': 'regression'}
+    assert comparison['added'] == {'baseline_us': None, 'current_us': 10.0, 'ratio': None, 'status': 'new'}
+    assert comparison['dropped'] == {'baseline_us': 50.0, 'current_us': None, 'ratio': None, 'status': 'missing'}
+
+def test_the_threshold_decides_what_is_a_regression():
+    assert compare(RESULTS, BASELINE, threshold=0.2)['slightly_slower']['status'] == 'regression'
+    assert compare(RESULTS, BASELINE, threshold=0.5)['slower']['status'] == 'ok'
+    assert compare(RESULTS, BASELINE, threshold=0.5)['faster']['status'] == 'ok' # 100 / 70 is under 1.5
+
+def test_without_a_baseline_everything_is_new():
+    assert {line['status'] for line in compare(RESULTS, {}).values()} == {'new'}
+
+def test_the_report_flags_regressions_and_missing_benchmarks():
+    report = {'results': RESULTS, 'comparison': compare(RESULTS, BASELINE), 'meta': {'skipped': ['scale 100']}}
+    output = io.StringIO()
+    print_report(report, output)
+    lines = output.getvalue().splitlines()
+    assert [line.split()[0] for line in lines if line.endswith('<- regression')] == ['slower']
+    assert [line.split()[0] for line in lines if line.endswith('<- improvement')] == ['faster']
+    assert [line.split()[0] for line in lines if line.endswith('<- missing')] == ['dropped']
+    assert lines[-1] == 'skipped: scale 100'
+
+def test_generate_corpus_leaves_no_open_cache_behind(plants_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(PageCache, 'OPEN_CACHES', {})
+    corpus = str(tmp_path / 'corpus.sqlite')
+    assert generate_corpus(plants_db, corpus) > len(PLANTS)
+    assert PageCache.OPEN_CACHES == {}
+    cache = PageCache.open_page_cache(corpus)
+    assert len([url for url in cache.keys() if 'species.aspx' in url]) == len(PLANTS)
+    cache.close()
@@ -0,0 +1,120 @@
+import sqlite3
+
+import pytest
+
+import MichiganFlora
+from FixtureServer import record_site_pages, serve_recorded_pages
+from PageCache import PageCache
+
+PLANTS = [
+    ('Adoxaceae', 'Sambucus canadensis', 'common elder', 'Nt Shrub', 3.0, -3.0),
+    ('Adoxaceae', 'Viburnum opulus', 'highbush-cranberry', 'Ad Shrub', None, 0.0),
+    ('Pinaceae', 'Pinus strobus', 'white pine', 'Nt Tree', 3.0, 3.0),
+    ('Pinaceae', 'Tsuga canadensis', 'hemlock', 'Nt Tree', 5.0, 3.0),
+    ('Rosaceae', 'Prunus serotina', 'wild black cherry', 'Nt Tree', 2.0, 3.0),
+    ('Rosaceae', 'Rosa multiflora', 'multiflora rose', 'Ad Shrub', None, 3.0),
+]
+
+# the Plants rows the crawl should write, in crawl order: IsNative and GrowthForm are decoded from Physiognomy
+EXPECTED = [plant + (1 if plant[3].startswith('Nt') else 0, plant[3].split()[1].lower()) for plant in PLANTS]
+
+select_plants = '''
+    SELECT Family, GenusSpecies, CommonName, Physiognomy, ConservatismCoef, WetnessCoef, IsNative, GrowthForm
+    FROM Plants
+    ORDER BY Id
+'''
+
+
+@pytest.fixture
+def site(tmp_path, monkeypatch):
+    ''' Serves a recorded stand-in for michiganflora.net, and points the crawl at it with an empty page cache '''
+    recorded = PageCache(str(tmp_path / 'site.sqlite'))
+    record_site_pages(recorded, PLANTS)
+    server = serve_recorded_pages(recorded)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(MichiganFlora, 'CACHE_FILENAME', str(tmp_path / 'plants_cache.sqlite'))
+    monkeypatch.setattr(MichiganFlora, 'FETCH_ORIGIN', 'http://127.0.0.1:' + str(server.server_port))
+    monkeypatch.setattr(MichiganFlora, 'FETCH_INTERVAL', 0.0)
+    monkeypatch.setattr(MichiganFlora, 'FETCHER', None)
+    server.recorded = recorded
+    yield server
+    server.shutdown()
+    server.server_close()
+    recorded.close()
+
+@pytest.fixture
+def connection(tmp_path):
+    connection = sqlite3.connect(str(tmp_path / 'michiganplants.sqlite'))
+    yield connection
+    connection.close()
+
+
+def test_crawl_writes_every_plant(site, connection):
+    counts = MichiganFlora.crawl(connection)
+    assert counts == {'added': 6, 'updated': 0, 'unchanged': 0}
+    assert connection.execute(select_plants).fetchall() == EXPECTED
+    assert site.request_count == 1 + 3 + 6 # the browse page, every family page and every species page, once each
+    assert connection.execute('SELECT COUNT(*) FROM PlantsText').fetchone()[0] == 6
+    assert connection.execute('SELECT COUNT(*) FROM CrawlState').fetchone()[0] == 6
+    assert connection.execute('SELECT COUNT(*) FROM CrawlCheckpoint').fetchone()[0] == 0
+
+def test_rebuild_reads_the_page_cache(site, connection):
+    MichiganFlora.crawl(connection)
+    requests = site.request_count
+    counts = MichiganFlora.crawl(connection)
+    assert counts['added'] == 6
+    assert site.request_count == requests
+    assert connection.execute(select_plants).fetchall() == EXPECTED
+
+def test_parse_workers_write_the_same_rows(site, connection):
+    MichiganFlora.crawl(connection, workers=2)
+    assert connection.execute(select_plants).fetchall() == EXPECTED
+
+def test_incremental_crawl_only_rewrites_changed_pages(site, connection):
+    MichiganFlora.crawl(connection)
+    url = 'https://michiganflora.net/species.aspx?id=3'
+    site.recorded[url] = site.recorded[url].replace('CLabel">3<', 'CLabel">4<')
+    counts = MichiganFlora.crawl(connection, incremental=True)
+    assert counts == {'added': 0, 'updated': 1, 'unchanged': 5}
+    expected = list(EXPECTED)
+    expected[2] = expected[2][:4] + (4.0,) + expected[2][5:]
+    assert connection.execute(select_plants).fetchall() == expected
+
+def test_resumed_crawl_skips_finished_families(site, connection):
+    MichiganFlora.crawl(connection)
+    # as if the crawl had stopped after Adoxaceae
+    connection.execute("DELETE FROM Plants WHERE Family <> 'Adoxaceae'")
+    connection.execute("DELETE FROM CrawlState WHERE PlantId NOT IN (SELECT Id FROM Plants)")
+    connection.execute("INSERT INTO CrawlCheckpoint VALUES ('Adoxaceae', 0)")
+    connection.commit()
+    counts = MichiganFlora.crawl(connection, resume=True)
+    assert counts == {'added': 4, 'updated': 0, 'unchanged': 0}
+    assert connection.execute(select_plants).fetchall() == EXPECTED
+
+def test_crawl_commits_survive_a_crash(site, connection, monkeypatch):
+    settings = []
+    insert_plants = MichiganFlora.insert_plants
+
+    def recording_insert_plants(connection, parsed_pages):
+        settings.append((connection.execute('PRAGMA journal_mode').fetchone()[0], connection.execute('PRAGMA synchronous').fetchone()[0]))
+        return insert_plants(connection, parsed_pages)
+
+    monkeypatch.setattr(MichiganFlora, 'insert_plants', recording_insert_plants)
+    MichiganFlora.crawl(connection)
+    assert settings == [('wal', 1)] # synchronous=NORMAL, with the journal on disk
+    assert connection.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+
+def test_incremental_crawl_revalidates_cached_pages(site, connection):
+    MichiganFlora.crawl(connection)
+    requests = site.request_count
+    counts = MichiganFlora.crawl(connection, incremental=True)
+    assert counts == {'added': 0, 'updated': 0, 'unchanged': 6}
+    assert site.request_count - requests == 1 + 3 + 6
+    assert site.not_modified_count == 1 + 3 + 6 # every page was asked for, but none was sent again
+
+def test_incremental_crawl_reuses_recent_pages(site, connection):
+    MichiganFlora.crawl(connection)
+    requests = site.request_count
+    counts = MichiganFlora.crawl(connection, incremental=True, max_age_days=1)
+    assert counts == {'added': 0, 'updated': 0, 'unchanged': 6}
+    assert site.request_count - requests == 1 + 3 # only the browse and family pages
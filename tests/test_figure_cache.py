@@ -0,0 +1,65 @@
+import json
+import os
+import sqlite3
+
+import pytest
+
+from FigureCache import FigureCache
+from FinalCode import conservatism_counts, conservatism_histogram
+
+
+@pytest.fixture
+def figures(plants_db, tmp_path):
+    ''' A FigureCache of the small database, and a count of the times its data was loaded '''
+    cache = FigureCache(str(tmp_path / 'figures'), plants_db)
+    cache.loads = []
+
+    def load_data(scope):
+        cache.loads.append(scope)
+        return conservatism_counts(scope)
+
+    cache.load_data = load_data
+    return cache
+
+def draw(figures, scope='woody'):
+    return figures.html('conservatism_histogram', {'scope': scope}, figures.load_data, conservatism_histogram)
+
+def cached_files(figures):
+    return sorted(name for name in os.listdir(figures.directory) if name.startswith('conservatism_histogram-'))
+
+
+def test_a_figure_is_drawn_once(figures):
+    path = draw(figures)
+    assert os.path.exists(path) and path.endswith('.html')
+    assert draw(figures) == path
+    assert (figures.misses, figures.hits) == (1, 1)
+    assert figures.loads == ['woody']
+    assert os.path.exists(os.path.join(figures.directory, 'plotly.min.js')) # shared by every page
+    assert [name[-5:] for name in cached_files(figures)] == ['.html', '.json']
+
+def test_a_figure_is_read_back_from_its_json(figures):
+    path = draw(figures)
+    os.remove(path)
+    assert draw(figures) == path
+    assert figures.loads == ['woody'] # redrawn from the saved data, without a query
+    figure = figures.figure('conservatism_histogram', {'scope': 'woody'}, figures.load_data, conservatism_histogram)
+    assert figure.data[0].type == 'histogram'
+    with open(figures.path('conservatism_histogram', {'scope': 'woody'}, '.json'), encoding='utf-8') as file:
+        assert json.load(file)['data'] == [[0, 0, 2.0, 3.0, 5.0], [2, 1, 1, 3, 1]]
+
+def test_parameters_are_kept_apart(figures):
+    assert draw(figures, 'woody') != draw(figures, 'statewide')
+    assert figures.loads == ['woody', 'statewide']
+    assert len(cached_files(figures)) == 4
+
+def test_older_versions_are_pruned_when_the_database_changes(figures, plants_db):
+    old_path = draw(figures)
+    connection = sqlite3.connect(plants_db)
+    connection.execute("UPDATE Plants SET ConservatismCoef = 9 WHERE GenusSpecies = 'Tsuga canadensis'")
+    connection.commit()
+    connection.close()
+    new_path = draw(figures)
+    assert new_path != old_path
+    assert figures.loads == ['woody', 'woody']
+    assert not os.path.exists(old_path)
+    assert len(cached_files(figures)) == 2
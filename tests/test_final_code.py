@@ -0,0 +1,37 @@
+import FinalCode
+
+
+def answer(monkeypatch, *replies):
+    replies = iter(replies)
+    monkeypatch.setattr('builtins.input', lambda prompt='': next(replies))
+
+def test_unique_families_and_species(plants_db, capsys):
+    assert FinalCode.unique_families() == ['Adoxaceae', 'Cupressaceae', 'Pinaceae', 'Rosaceae']
+    assert '3. Pinaceae' in capsys.readouterr().out
+    assert sorted(FinalCode.unique_species()) == ['Abies balsamea', 'Juniperus virginiana', 'Pinus strobus', 'Prunus serotina',
+                                                   'Rosa multiflora', 'Sambucus canadensis', 'Tsuga canadensis', 'Viburnum opulus']
+
+def test_list_plants_in_family(plants_db, capsys):
+    FinalCode.list_plants_in_family('Pinaceae')
+    out = capsys.readouterr().out
+    assert '1. Abies balsamea (balsam fir)' in out
+    assert '3. Tsuga canadensis (hemlock)' in out
+
+def test_species_info_of_a_native_plant(plants_db, monkeypatch, capsys):
+    answer(monkeypatch, '3')
+    FinalCode.provide_species_info('Tsuga canadensis')
+    out = capsys.readouterr().out
+    assert 'Tsuga canadensis (hemlock) is a native tree in the Pinaceae family.' in out
+    assert 'coefficient of conservatism of 5, indicating that it has moderate priority' in out
+
+def test_species_info_of_a_native_plant_without_a_coefficient(plants_db, monkeypatch, capsys):
+    answer(monkeypatch, '3')
+    FinalCode.provide_species_info('Juniperus virginiana')
+    out = capsys.readouterr().out
+    assert 'is a native tree in the Cupressaceae family.' in out
+    assert "doesn't give it a coefficient of conservatism" in out
+    assert 'Sorry' not in out
+
+def test_species_info_of_an_unknown_plant(plants_db, capsys):
+    FinalCode.provide_species_info('Fragaria virginiana')
+    assert "Sorry, I don't have any information on that plant!" in capsys.readouterr().out
@@ -0,0 +1,64 @@
+import math
+import sqlite3
+
+import pytest
+
+from FloristicQuality import METRICS, assess_inventory, assess_lab_sites, get_engine
+
+# worked out by hand from the PLANTS of conftest.py; Juniperus virginiana is native but has no coefficient,
+# so it counts as a native species but not in mean_c or fqi
+FEN = ['Tsuga canadensis', 'Abies balsamea', 'Viburnum opulus', 'Juniperus virginiana']
+FEN_METRICS = {
+    'species': 4, 'native_species': 3, 'native_percent': 75.0,
+    'mean_c': 4.0,                              # (5 + 3) / 2
+    'mean_c_all': 2.0,                          # (5 + 3) / 4
+    'fqi': 4.0 * math.sqrt(2),
+    'fqi_all': 2.0 * math.sqrt(4),
+    'adjusted_fqi': 100 * 0.4 * math.sqrt(3 / 4),
+    'mean_w': 1.5,                              # (3 + 0 + 0 + 3) / 4
+    'mean_w_native': 2.0,                       # (3 + 0 + 3) / 3
+}
+
+def assert_metrics(result, expected):
+    assert set(result) == {'site'} | set(METRICS)
+    for name, value in expected.items():
+        assert result[name] == pytest.approx(value), name
+
+
+def test_inventory_counts_duplicates_once_and_skips_unknown_names(plants_db):
+    records = [('Fen', name) for name in FEN] + [('Fen', ' tsuga  CANADENSIS'), ('Fen', 'Quercus imaginaria')]
+    results, unknown = assess_inventory(records)
+    assert unknown == ['Quercus imaginaria']
+    assert [result['site'] for result in results] == ['Fen']
+    assert_metrics(results[0], FEN_METRICS)
+
+def test_a_site_without_known_species_has_no_means(plants_db):
+    results, unknown = assess_inventory([('Fen', name) for name in FEN] + [('Lot', 'Quercus imaginaria')])
+    assert [result['site'] for result in results] == ['Fen', 'Lot']
+    lot = results[1]
+    assert (lot['species'], lot['native_species']) == (0, 0)
+    for name in ['native_percent', 'mean_c', 'mean_c_all', 'fqi', 'fqi_all', 'adjusted_fqi', 'mean_w', 'mean_w_native']:
+        assert lot[name] is None, name
+
+def test_lab_sites(plants_db):
+    results = assess_lab_sites()
+    assert [result['site'] for result in results] == ['Nichols Arboretum', 'Stinchfield Woods']
+    assert_metrics(results[0], {
+        'species': 4, 'native_species': 2, 'native_percent': 50.0, 'mean_c': 2.5, 'mean_c_all': 1.25,
+        'fqi': 2.5 * math.sqrt(2), 'adjusted_fqi': 100 * 0.25 * math.sqrt(1 / 2), 'mean_w': 0.75, 'mean_w_native': 0.0,
+    })
+    assert_metrics(results[1], { # every species is native, but only 3 of the 4 have a coefficient
+        'species': 4, 'native_species': 4, 'native_percent': 100.0, 'mean_c': 11 / 3, 'mean_c_all': 11 / 4,
+        'fqi': 11 / 3 * math.sqrt(3), 'adjusted_fqi': 100 * 11 / 30, 'mean_w': 2.25, 'mean_w_native': 2.25,
+    })
+
+def test_engine_is_reloaded_when_the_database_changes(plants_db):
+    engine = get_engine()
+    assert get_engine() is engine
+    connection = sqlite3.connect(plants_db)
+    connection.execute("UPDATE Plants SET ConservatismCoef = 9 WHERE GenusSpecies = 'Tsuga canadensis'")
+    connection.commit()
+    connection.close()
+    assert get_engine() is not engine
+    results, unknown = assess_inventory([('Fen', 'Tsuga canadensis')])
+    assert results[0]['mean_c'] == 9.0
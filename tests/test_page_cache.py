@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+import PageCache
+from PageCache import PageCache as Cache, open_page_cache
+
+
+@pytest.fixture
+def open_caches(monkeypatch):
+    ''' Gives every test its own OPEN_CACHES and closes what it opened '''
+    caches = {}
+    monkeypatch.setattr(PageCache, 'OPEN_CACHES', caches)
+    yield caches
+    for cache in caches.values():
+        cache.close()
+
+def write_json(filename, entries):
+    with open(filename, 'w') as json_file:
+        json.dump(entries, json_file)
+
+
+def test_pages_are_kept_by_url(tmp_path):
+    cache = Cache(str(tmp_path / 'cache.sqlite'))
+    cache['https://example.org/b'] = 'two'
+    assert cache.put_many([('https://example.org/a', 'one'), ('https://example.org/b', 'TWO')]) == 2
+    assert cache['https://example.org/b'] == 'TWO'
+    assert cache.get('https://example.org/c') is None
+    assert 'https://example.org/a' in cache and 'https://example.org/c' not in cache
+    with pytest.raises(KeyError):
+        cache['https://example.org/c']
+    assert len(cache) == 2
+    assert cache.keys() == ['https://example.org/a', 'https://example.org/b']
+    cache.close()
+    cache = Cache(str(tmp_path / 'cache.sqlite')) # and they outlive the connection
+    assert cache['https://example.org/a'] == 'one'
+    cache.close()
+
+def test_import_json_stores_other_values_as_json_and_keeps_fetched_pages(tmp_path):
+    write_json(str(tmp_path / 'old.json'), {'https://example.org/a': 'old', 'https://example.org/b': {'data': [1, 2]}})
+    cache = Cache(str(tmp_path / 'cache.sqlite'))
+    cache['https://example.org/a'] = 'new'
+    assert not cache.has_imported(str(tmp_path / 'old.json'))
+    assert cache.import_json(str(tmp_path / 'old.json')) == 2
+    assert cache.has_imported(str(tmp_path / 'old.json'))
+    assert cache['https://example.org/a'] == 'new'
+    assert json.loads(cache['https://example.org/b']) == {'data': [1, 2]}
+    cache.close()
+
+def test_open_page_cache_opens_each_file_once(tmp_path, monkeypatch, open_caches):
+    monkeypatch.chdir(tmp_path)
+    cache = open_page_cache('cache.sqlite')
+    assert open_page_cache(str(tmp_path / 'cache.sqlite')) is cache
+    assert open_page_cache('other.sqlite') is not cache
+
+def test_open_page_cache_imports_the_legacy_cache_once(tmp_path, open_caches):
+    filename = str(tmp_path / 'cache.sqlite')
+    legacy = str(tmp_path / 'old.json')
+    write_json(legacy, {'https://example.org/a': 'one'})
+    assert open_page_cache(filename, legacy)['https://example.org/a'] == 'one'
+    open_caches.pop(filename).close()
+    write_json(legacy, {'https://example.org/a': 'one', 'https://example.org/b': 'two'})
+    assert 'https://example.org/b' not in open_page_cache(filename, legacy)
+
+def test_a_failed_import_is_tried_again(tmp_path, open_caches):
+    filename = str(tmp_path / 'cache.sqlite')
+    legacy = str(tmp_path / 'old.json')
+    with open(legacy, 'w') as json_file:
+        json_file.write('{"https://example.org/a": "one", "https://exa') # cut short
+    with pytest.raises(ValueError):
+        open_page_cache(filename, legacy)
+    assert filename not in open_caches
+    write_json(legacy, {'https://example.org/a': 'one', 'https://example.org/b': 'two'})
+    cache = open_page_cache(filename, legacy)
+    assert len(cache) == 2 and cache.has_imported(legacy)
@@ -0,0 +1,44 @@
+import pytest
+
+from PageExtract import ENGINES
+
+FAMILY_PAGES = {
+    'usual': '<html><div class="taxaList"><div><table><tr><th>Species</th></tr>'
+             '<tr><td><a href="species.aspx?id=1"> Pinus strobus </a></td></tr></table>'
+             '<div><table><tr><td><a href="species.aspx?id=2">Tsuga canadensis</a></td></tr></table></div></div>'
+             '<table><tr><td><a href="family.aspx?id=Cupressaceae">not one of its own rows</a></td></tr></table></div></html>',
+    'no header': '<html><div class="taxaList"><div><table><tr><td><a href="species.aspx?id=1">Pinus strobus</a></td></tr>'
+                 '<tr><td>no link</td></tr><tr><td><a href="species.aspx?id=2">Tsuga canadensis</a></td></tr></table></div></div></html>',
+}
+
+# an error page, whose navigation links must not be taken for species or families
+ERROR_PAGE = ('<html><h1>The site is down for maintenance</h1><table><tr><td><a href="default.aspx">Home</a></td></tr></table>'
+              '<a class="browse" href="help.aspx">Help</a></html>')
+
+BROWSE_PAGES = {
+    'usual': '<html><a class="browse" href="x">Outside</a><div class="browse-links"><a class="browse" href="family.aspx?id=Pinaceae"> Pinaceae </a>'
+             '<a href="help.aspx">Help</a><a class="browse" href="family.aspx?id=Rosaceae">Rosaceae</a></div></html>',
+    'nested': '<html><div class="browse-links"><div><a class="browse" href="family.aspx?id=Pinaceae">Pinaceae</a></div>'
+              '<a class="browse" href="family.aspx?id=Rosaceae">Rosaceae</a></div></html>',
+}
+
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+@pytest.mark.parametrize('layout', list(FAMILY_PAGES))
+def test_family_links_agree(engine, layout):
+    links = ENGINES[engine]().family_links(FAMILY_PAGES[layout])
+    assert links == [('species.aspx?id=1', 'Pinus strobus'), ('species.aspx?id=2', 'Tsuga canadensis')]
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+@pytest.mark.parametrize('layout', list(BROWSE_PAGES))
+def test_browse_names_agree(engine, layout):
+    expected = ['Pinaceae', 'Rosaceae']
+    assert ENGINES[engine]().browse_names(BROWSE_PAGES[layout]) == expected
+
+@pytest.mark.parametrize('engine', list(ENGINES))
+def test_unexpected_layouts_are_refused(engine):
+    extractor = ENGINES[engine]()
+    with pytest.raises(ValueError):
+        extractor.family_links(ERROR_PAGE)
+    with pytest.raises(ValueError):
+        extractor.browse_names(ERROR_PAGE)
@@ -0,0 +1,42 @@
+import math
+
+import numpy as np
+import pytest
+
+from conftest import PLANTS
+from PlantRecords import PlantColumns, PlantRecord
+from PlantsDB import plant_row
+
+RECORDS = [PlantRecord(*facts) for facts in PLANTS]
+
+
+def test_rows_decode_like_plant_row():
+    columns = PlantColumns(RECORDS)
+    assert len(columns) == len(PLANTS)
+    assert [row[1:] for row in columns.rows()] == [tuple(plant_row(facts)) for facts in PLANTS]
+    assert [row[0] for row in columns.rows()] == [None] * len(PLANTS)
+    assert [row[0] for row in columns.rows(first_id=10)] == list(range(10, 10 + len(PLANTS)))
+
+def test_repeated_values_share_a_code():
+    columns = PlantColumns(RECORDS)
+    assert columns.families == ['Adoxaceae', 'Cupressaceae', 'Pinaceae', 'Rosaceae']
+    assert list(columns.family_codes) == [0, 0, 1, 2, 2, 2, 3, 3, 3]
+    columns.clear()
+    columns.append(RECORDS[3])
+    assert len(columns) == 1 and list(columns.family_codes) == [2] # the next batch reuses the codes
+    assert columns.row(0) == tuple(plant_row(PLANTS[3]))
+
+def test_to_numpy_shares_the_columns():
+    columns = PlantColumns(RECORDS)
+    arrays = columns.to_numpy()
+    rows = [plant_row(facts) for facts in PLANTS]
+    assert [None if math.isnan(value) else value for value in arrays['conservatism']] == [row[4] for row in rows]
+    assert [None if math.isnan(value) else value for value in arrays['wetness']] == [row[5] for row in rows]
+    assert arrays['is_native'].dtype == bool and arrays['is_native'].tolist() == [bool(row[6]) for row in rows]
+    assert [columns.families[code] for code in arrays['family']] == [row[0] for row in rows]
+    assert [columns.growth_forms[code] for code in arrays['growth_form']] == [row[7] for row in rows]
+    assert np.nanmean(arrays['conservatism']) == pytest.approx(3.0) # (3 + 3 + 5 + 3 + 2 + 2) / 6
+    columns.conservatism[0] = 4.0
+    assert arrays['conservatism'][0] == 4.0 # no copy
+    with pytest.raises(BufferError):
+        columns.append(RECORDS[0])
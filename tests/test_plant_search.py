@@ -0,0 +1,39 @@
+import os
+import sqlite3
+
+import PlantsDB
+from PlantSearch import get_search_index
+
+
+def test_search_index_is_rebuilt_when_the_database_changes(plants_db):
+    index = get_search_index()
+    assert get_search_index() is index
+    assert [result[2] for result in index.complete('pinus')] == ['Pinus strobus']
+
+    connection = sqlite3.connect(plants_db)
+    facts = ['Pinaceae', 'Pinus resinosa', 'red pine', 'Nt Tree', '6', '3']
+    connection.execute('INSERT INTO Plants VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?)', PlantsDB.plant_row(facts))
+    connection.commit()
+    connection.close()
+
+    rebuilt = get_search_index()
+    assert rebuilt is not index
+    assert sorted(result[2] for result in rebuilt.complete('pinus')) == ['Pinus resinosa', 'Pinus strobus']
+    assert rebuilt.suggest('Pinus resinoza')[0][2] == 'Pinus resinosa'
+
+def test_writes_still_in_the_write_ahead_log_change_the_version(plants_db):
+    index = get_search_index()
+    connection = sqlite3.connect(plants_db)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA wal_autocheckpoint=0') # like a crawl between checkpoints: the main file doesn't change
+    version = PlantsDB.db_version(plants_db)
+    stat = os.stat(plants_db)
+    facts = ['Pinaceae', 'Pinus resinosa', 'red pine', 'Nt Tree', '6', '3']
+    connection.execute('INSERT INTO Plants VALUES (NULL, ?, ?, ?, ?, ?, ?, ?, ?)', PlantsDB.plant_row(facts))
+    connection.commit()
+    assert (os.stat(plants_db).st_mtime_ns, os.stat(plants_db).st_size) == (stat.st_mtime_ns, stat.st_size)
+    assert PlantsDB.db_version(plants_db) != version
+    rebuilt = get_search_index()
+    assert rebuilt is not index
+    assert sorted(result[2] for result in rebuilt.complete('pinus')) == ['Pinus resinosa', 'Pinus strobus']
+    connection.close()
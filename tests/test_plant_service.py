@@ -0,0 +1,71 @@
+import http.client
+import json
+import socket
+
+import pytest
+
+from conftest import build_plants_db, forget_loaded_data
+from PlantService import serve_in_thread
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    ''' Serves a database that is not the default michiganplants.sqlite, from a directory without one '''
+    filename = str(tmp_path / 'other.sqlite')
+    build_plants_db(filename)
+    monkeypatch.chdir(tmp_path)
+    forget_loaded_data(monkeypatch)
+    service, port, stop = serve_in_thread(filename)
+    service.port = port
+    yield service
+    stop()
+
+def get(connection, path, method='GET', body=None):
+    connection.request(method, path, body)
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def test_every_route_reads_the_served_database(service):
+    connection = http.client.HTTPConnection('127.0.0.1', service.port)
+    assert get(connection, '/families') == (200, ['Adoxaceae', 'Cupressaceae', 'Pinaceae', 'Rosaceae'])
+    status, result = get(connection, '/families/Pinaceae')
+    assert status == 200 and [plant['genus_species'] for plant in result['plants']] == ['Abies balsamea', 'Pinus strobus', 'Tsuga canadensis']
+    status, result = get(connection, '/species/Pinus%20strobus')
+    assert status == 200 and result['sites'][0]['site'] == 'Stinchfield Woods'
+    status, result = get(connection, '/families/Pinacea')
+    assert status == 404 and result['suggestions'] == ['Pinaceae']
+    assert get(connection, '/ranking?limit=1')[1][0]['genus_species'] == 'Tsuga canadensis'
+    connection.close()
+
+@pytest.mark.parametrize('query', ['limit=0', 'limit=-1', 'limit=ten', 'scope=bogus', 'limit=5&scope=Woody'])
+def test_a_bad_ranking_query_answers_400(service, query):
+    connection = http.client.HTTPConnection('127.0.0.1', service.port)
+    status, result = get(connection, '/ranking?' + query)
+    assert status == 400 and 'error' in result
+    connection.close()
+
+def test_a_request_body_is_skipped(service):
+    connection = http.client.HTTPConnection('127.0.0.1', service.port)
+    status, result = get(connection, '/families', 'POST', b'{"family": "Pinaceae"}' * 100)
+    assert status == 405
+    assert get(connection, '/families/Rosaceae')[0] == 200 # the same connection, after the body
+    connection.close()
+
+def test_a_chunked_body_closes_the_connection(service):
+    with socket.create_connection(('127.0.0.1', service.port)) as client:
+        client.sendall(b'POST /families HTTP/1.1\r\nHost: localhost\r\nTransfer-Encoding: chunked\r\n\r\n5\r\nhello\r\n0\r\n\r\n')
+        response = client.makefile('rb').read()
+    assert response.startswith(b'HTTP/1.1 400 ')
+    assert b'Connection: close' in response
+
+def test_a_failed_query_answers_500(service):
+    def fail(path, params):
+        raise FileNotFoundError('other.sqlite')
+    service.answer = fail
+    connection = http.client.HTTPConnection('127.0.0.1', service.port)
+    status, result = get(connection, '/families/Pinaceae')
+    assert status == 500 and 'FileNotFoundError' in result['error']
+    del service.answer
+    assert get(connection, '/families/Pinaceae')[0] == 200 # the failure wasn't cached, and the connection is still open
+    connection.close()
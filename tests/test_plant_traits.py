@@ -0,0 +1,74 @@
+import sqlite3
+
+import pytest
+
+from conftest import PLANTS, WOODY_PLANTS
+from FixtureServer import serve_trefle, trefle_records
+from PageCache import PageCache
+from PlantTraits import enrich
+from TrefleClient import TrefleClient
+
+RECORDS = trefle_records([(facts[1], facts[0], facts[2]) for facts in PLANTS])
+KNOWN = {record['scientific_name']: record for record in RECORDS['species']}
+
+
+@pytest.fixture
+def trefle():
+    ''' A mock Trefle API holding the small database's plants, where every 5th request fails with 503 or 429 '''
+    server = serve_trefle(RECORDS, fail_every=5)
+    server.origin = 'http://127.0.0.1:' + str(server.server_port)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def client(tmp_path, trefle):
+    cache = PageCache(str(tmp_path / 'trefle_cache.sqlite'))
+    client = TrefleClient(cache, origin=trefle.origin, max_workers=3, min_interval=0.0, backoff=0.0)
+    yield client
+    client.close()
+    cache.close()
+
+def plant_traits(db_filename):
+    connection = sqlite3.connect(db_filename)
+    rows = connection.execute('SELECT GenusSpecies, TrefleId, MaximumHeightCm, FetchedAt FROM PlantTraits').fetchall()
+    connection.close()
+    return {row[0]: row[1:] for row in rows}
+
+
+def test_first_run_fills_every_missing_species(plants_db, client):
+    woody = [row[0] for row in WOODY_PLANTS]
+    found = [name for name in woody if name in KNOWN]
+    result = enrich(plants_db, client)
+    assert (result['missing'], result['stale']) == (len(woody), 0)
+    assert (result['found'], result['not_found']) == (len(found), len(woody) - len(found))
+    traits = plant_traits(plants_db)
+    assert sorted(traits) == sorted(woody)
+    for name in woody:
+        record = KNOWN.get(name)
+        if record is None:
+            assert traits[name][:2] == (None, None)
+        else:
+            assert traits[name][:2] == (record['id'], record['specifications']['maximum_height']['cm'])
+
+def test_second_run_requests_nothing(plants_db, client):
+    enrich(plants_db, client)
+    requests = client.request_count
+    result = enrich(plants_db, client)
+    assert (result['missing'], result['stale'], result['found'], result['not_found']) == (0, 0, 0, 0)
+    assert client.request_count == requests
+
+def test_max_age_zero_refetches_stale_species(plants_db, client, trefle):
+    enrich(plants_db, client)
+    fetched_at = {name: row[2] for name, row in plant_traits(plants_db).items()}
+    requests = trefle.request_count
+    result = enrich(plants_db, client, max_age_days=0)
+    assert (result['missing'], result['stale']) == (0, len(WOODY_PLANTS))
+    assert trefle.request_count > requests # stale species bypass the response cache
+    assert all(row[2] >= fetched_at[name] for name, row in plant_traits(plants_db).items())
+
+def test_statewide_scope_adds_the_other_plants(plants_db, client):
+    enrich(plants_db, client)
+    result = enrich(plants_db, client, scope='statewide')
+    assert (result['missing'], result['stale']) == (len(PLANTS) - len(WOODY_PLANTS), 0)
+    assert len(plant_traits(plants_db)) == len(PLANTS)
@@ -0,0 +1,85 @@
+import sqlite3
+
+import pytest
+
+import FinalCode
+import PlantsDB
+from FixtureServer import page_coefficient
+from PlantsDB import decode_coefficient, get_dao
+
+# the Plants table as the first version of MichiganFlora.py made it, with the coefficients as page text
+create_old_plants = '''
+    CREATE TABLE "Plants" (
+        "Id"        INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE,
+        "Family" TEXT NOT NULL,
+        "GenusSpecies" TEXT NOT NULL,
+        "CommonName" TEXT NOT NULL,
+        "Physiognomy" TEXT NOT NULL,
+        "ConservatismCoef" INTEGER NOT NULL,
+        "WetnessCoef" INTEGER NOT NULL
+    );
+'''
+
+
+@pytest.fixture
+def short_summaries(plants_db, monkeypatch):
+    ''' Keeps only the top 2 species of each scope in TopConservatism, so longer rankings come from the tables '''
+    monkeypatch.setattr(PlantsDB, 'SUMMARY_TOP_N', 2)
+    connection = sqlite3.connect(plants_db)
+    PlantsDB.migrate(connection)
+    connection.close()
+    return plants_db
+
+
+def test_coefficients_of_conservatism_lists_every_woody_plant(plants_db):
+    assert FinalCode.coefficients_of_conservatism() == [0, 0, 0, 2.0, 3.0, 3.0, 3.0, 5.0]
+    assert FinalCode.conservatism_counts() == ([0, 0, 2.0, 3.0, 5.0], [2, 1, 1, 3, 1])
+    assert len(FinalCode.coefficients_of_conservatism('statewide')) == 9
+
+@pytest.mark.parametrize('scope', ['woody', 'statewide'])
+def test_summary_and_table_rankings_agree(short_summaries, scope):
+    dao = get_dao()
+    longer = dao.ranked_by_conservatism(5, scope)
+    assert len(longer) == 5
+    assert dao.ranked_by_conservatism(2, scope) == longer[:2]
+
+def test_ties_are_ranked_alphabetically(short_summaries):
+    names = [row[0] for row in get_dao().ranked_by_conservatism(10)]
+    assert names == ['Tsuga canadensis', 'Abies balsamea', 'Pinus strobus', 'Sambucus canadensis', 'Prunus serotina']
+
+def test_statewide_ranking_is_not_capped_by_the_summary(short_summaries):
+    names = [row[0] for row in get_dao().ranked_by_conservatism(10, 'statewide')]
+    assert names == ['Tsuga canadensis', 'Abies balsamea', 'Pinus strobus', 'Sambucus canadensis', 'Fragaria virginiana',
+                     'Prunus serotina']
+
+def test_every_query_uses_an_index(plants_db):
+    connection = sqlite3.connect(plants_db)
+    connection.execute('ANALYZE')
+    scans = {name: scans for name, (steps, scans) in PlantsDB.check_query_plans(connection).items() if scans}
+    connection.close()
+    assert scans == {}
+
+@pytest.mark.parametrize('text, value', [('3', 3.0), (' -3 ', -3.0), ('0', 0.0), ('4.5', 4.5), ('*', None), ('', None)])
+def test_decode_coefficient_round_trips_through_the_page_text(text, value):
+    assert decode_coefficient(text) == value
+    assert decode_coefficient(page_coefficient(value)) == value
+
+def test_retype_plants_keeps_every_id_and_decodes_the_text(tmp_path):
+    connection = sqlite3.connect(str(tmp_path / 'old.sqlite'))
+    connection.execute(create_old_plants)
+    old_rows = [
+        [4, 'Pinaceae', 'Pinus strobus', 'white pine', 'Nt Tree', '3', '3'],
+        [7, 'Rosaceae', 'Rosa multiflora', 'multiflora rose', 'Ad Shrub', '*', '3'],
+        [9, 'Adoxaceae', 'Sambucus canadensis', 'common elder', 'Nt Shrub', '3', '-3'],
+        [12, 'Rosaceae', 'Fragaria virginiana', 'wild strawberry', 'Nt P-Forb', '2', '3'],
+    ]
+    connection.executemany('INSERT INTO Plants VALUES (?, ?, ?, ?, ?, ?, ?)', old_rows)
+    connection.commit()
+    PlantsDB.migrate(connection)
+    assert 'IsNative' in PlantsDB.table_columns(connection, 'Plants')
+    rows = connection.execute('SELECT Id, ConservatismCoef, WetnessCoef, IsNative, GrowthForm, typeof(ConservatismCoef) FROM Plants ORDER BY Id').fetchall()
+    assert rows == [(4, 3.0, 3.0, 1, 'tree', 'real'), (7, None, 3.0, 0, 'shrub', 'null'),
+                    (9, 3.0, -3.0, 1, 'shrub', 'real'), (12, 2.0, 3.0, 1, 'p-forb', 'real')]
+    PlantsDB.migrate(connection) # a second migration changes nothing
+    assert connection.execute('SELECT Id, ConservatismCoef, WetnessCoef, IsNative, GrowthForm, typeof(ConservatismCoef) FROM Plants ORDER BY Id').fetchall() == rows
+    connection.close()
@@ -0,0 +1,39 @@
+import numpy as np
+
+import SiteIndex
+from SiteIndex import CAMPUS, SiteIndex as Index, haversine
+
+SITES = [
+    (1, 'Nichols Arboretum', 42.2807, -83.7253),
+    (2, 'Stinchfield Woods', 42.404298, -83.91032),
+    (3, 'Radrick Forest', 42.2874, -83.6690),
+    (4, 'Saginaw Forest', 42.2710, -83.8060),
+]
+
+SPECIES_SITES = [('Pinus strobus', 2), ('Pinus strobus', 4), ('Quercus alba', 1), ('Quercus alba', 3)]
+
+
+def test_nearest_sites_matches_each_point_measured_alone(monkeypatch):
+    monkeypatch.setattr(SiteIndex, 'NEAREST_BLOCK', 10) # several blocks of points
+    index = Index(SITES, SPECIES_SITES)
+    generator = np.random.default_rng(7)
+    latitudes = generator.uniform(42.0, 42.6, 25)
+    longitudes = generator.uniform(-84.1, -83.5, 25)
+    expected = []
+    for lat, lon in zip(latitudes, longitudes):
+        distances = haversine(lat, lon, index.latitudes, index.longitudes)
+        i = int(np.argmin(distances))
+        expected.append((SITES[i][0], SITES[i][1], float(distances[i])))
+    assert index.nearest_sites(latitudes, longitudes) == expected
+
+def test_nearest_sites_without_sites():
+    index = Index([], [])
+    assert index.nearest_sites([42.3, 42.4], [-83.7, -83.8]) == [None, None]
+    assert index.nearest_sites([], []) == []
+
+def test_within_and_nearest_for_species():
+    index = Index(SITES, SPECIES_SITES)
+    assert [site[0] for site in index.within(CAMPUS[0], CAMPUS[1], 5)] == [1, 4, 3]
+    assert [site[0] for site in index.within(CAMPUS[0], CAMPUS[1], 50, 'Pinus strobus')] == [4, 2]
+    nearest = index.nearest_for_species(['Quercus alba', 'Acer rubrum'], CAMPUS[0], CAMPUS[1])
+    assert nearest['Quercus alba'][0] == 1 and nearest['Acer rubrum'] is None
@@ -0,0 +1,52 @@
+import sqlite3
+
+import pytest
+
+from PlantsDB import get_dao
+from SiteReport import build_report, read_sites, site_map
+
+
+@pytest.fixture
+def report_db(plants_db):
+    ''' The small database with a third lab site where no woody plant is taught '''
+    connection = sqlite3.connect(plants_db)
+    connection.execute("INSERT INTO LabSites VALUES (3, 'Empty Lot', 0, 42.3, -83.7, 2)")
+    connection.commit()
+    connection.close()
+    return plants_db
+
+
+def test_read_sites_groups_the_plants_of_each_site(report_db):
+    sites = read_sites(get_dao().site_report())
+    assert [(site.lab_id, site.name) for site in sites] == [(1, 'Nichols Arboretum'), (2, 'Stinchfield Woods'), (3, 'Empty Lot')]
+    assert [plant[0] for plant in sites[0].plants] == ['Prunus serotina', 'Rosa multiflora', 'Sambucus canadensis', 'Viburnum opulus']
+    assert [plant[0] for plant in sites[1].plants] == ['Abies balsamea', 'Juniperus virginiana', 'Pinus strobus', 'Tsuga canadensis']
+    assert sites[1].plants[2] == ('Pinus strobus', 'white pine', 'Pinaceae', 1, 'tree', 3.0, 'https://www.youtube.com/watch?v=pine')
+    assert sites[0].mean_conservatism() == 2.5 # the adventive species have no coefficient
+    assert sites[1].mean_conservatism() == 11 / 3
+
+def test_a_site_without_plants_is_kept(report_db):
+    empty = read_sites(get_dao().site_report())[2]
+    assert empty.plants == []
+    assert empty.mean_conservatism() is None
+    assert empty.map_url().endswith('42.3,-83.7')
+
+def test_read_sites_of_hand_made_rows():
+    rows = [
+        (5, 'North fen', 42.0, -84.0, 9, None, None, None, None, None, None, None),
+        (7, 'Bog', 43.0, -85.0, 30, 'Larix laricina', 'tamarack', 'Pinaceae', 1, 'tree', 5.0, None),
+        (7, 'Bog', 43.0, -85.0, 30, 'Picea mariana', 'black spruce', 'Pinaceae', 1, 'tree', 6.0, None),
+    ]
+    sites = read_sites(rows)
+    assert [(site.lab_id, len(site.plants)) for site in sites] == [(5, 0), (7, 2)]
+    assert read_sites([]) == []
+
+def test_the_map_and_report_list_every_site(report_db):
+    sites = read_sites(get_dao().site_report())
+    traces = site_map(sites).data
+    assert len(traces[0].lat) == 3 # every site is on the first layer, the empty one too
+    assert [trace.name for trace in traces[1:]] == ['Shrub', 'Tree']
+    assert sum(len(trace.lat) for trace in traces[1:]) == 3 # the empty site has no growth form
+    page = build_report(include_plotlyjs='cdn')
+    assert 'Empty Lot</a> (0 species)' in page
+    assert 'Stinchfield Woods</a> (4 species)' in page
@@ -0,0 +1,45 @@
+import math
+import sqlite3
+
+import pytest
+
+import Snapshot
+from FloristicQuality import assess_lab_sites
+from PlantsDB import get_dao
+
+
+@pytest.fixture
+def snapshot(plants_db, monkeypatch):
+    monkeypatch.setattr(Snapshot, 'SNAPSHOTS', {})
+    Snapshot.export_snapshot(plants_db)
+    return Snapshot.get_snapshot()
+
+def same(a, b):
+    return a == b or (isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b))
+
+
+@pytest.mark.parametrize('scope', ['woody', 'statewide'])
+def test_coefficient_counts_match_the_database(plants_db, snapshot, scope):
+    assert snapshot.coefficient_counts(scope) == [tuple(row) for row in get_dao(plants_db).coefficient_counts(scope)]
+
+@pytest.mark.parametrize('scope', ['woody', 'statewide'])
+@pytest.mark.parametrize('limit', [1, 3, 20])
+def test_rankings_match_the_database(plants_db, snapshot, scope, limit):
+    assert snapshot.ranked_by_conservatism(limit, scope) == [tuple(row) for row in get_dao(plants_db).ranked_by_conservatism(limit, scope)]
+
+def test_lab_site_scores_match_the_database(plants_db, snapshot):
+    expected = assess_lab_sites(plants_db)
+    results = snapshot.assess_lab_sites()
+    assert [result['site'] for result in results] == [result['site'] for result in expected]
+    for result, wanted in zip(results, expected):
+        assert set(result) == set(wanted)
+        for name, value in wanted.items():
+            assert same(result[name], value) or result[name] == pytest.approx(value), name
+
+def test_a_snapshot_knows_when_the_database_changed(plants_db, snapshot):
+    assert snapshot.is_current(plants_db)
+    connection = sqlite3.connect(plants_db)
+    connection.execute("UPDATE Plants SET ConservatismCoef = 6 WHERE GenusSpecies = 'Pinus strobus'")
+    connection.commit()
+    connection.close()
+    assert not snapshot.is_current(plants_db)
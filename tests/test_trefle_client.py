@@ -0,0 +1,119 @@
+import json
+import socket
+
+import pytest
+import requests
+
+import PageCache
+import TrefleClient as trefle_client
+from FixtureServer import serve_trefle
+from TrefleClient import TrefleClient
+
+FAMILIES = [{'id': i, 'name': 'Family' + str(i), 'slug': 'family' + str(i)} for i in range(1, 96)]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = PageCache.PageCache(str(tmp_path / 'trefle_cache.sqlite'))
+    yield cache
+    cache.close()
+
+@pytest.fixture
+def trefle():
+    ''' A mock Trefle API with 10 pages of families, where every 4th request fails with 503 or 429 '''
+    server = serve_trefle({'families': FAMILIES}, token='secret', page_size=10, fail_every=4)
+    server.origin = 'http://127.0.0.1:' + str(server.server_port)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def make_client(cache, origin, **options):
+    options = dict({'token': 'secret', 'max_workers': 3, 'min_interval': 0.0, 'backoff': 0.0}, **options)
+    return TrefleClient(cache, origin=origin, **options)
+
+
+def test_every_page_arrives_in_order_despite_failures(cache, trefle):
+    client = make_client(cache, trefle.origin)
+    assert list(client.iter_pages('/families')) == FAMILIES
+    assert client.retry_count > 0
+    assert client.request_count == 10 + client.retry_count
+    assert trefle.request_count == client.request_count
+
+def test_cached_pages_are_not_requested_again(cache, trefle):
+    list(make_client(cache, trefle.origin).iter_pages('/families'))
+    requests_made = trefle.request_count
+    client = make_client(cache, trefle.origin)
+    assert list(client.iter_pages('/families')) == FAMILIES
+    assert client.request_count == 0 and trefle.request_count == requests_made
+    assert len(list(client.iter_pages('/families', refresh=True))) == len(FAMILIES)
+    assert client.request_count >= 10
+
+def test_the_token_is_sent_but_not_cached(cache, trefle):
+    client = make_client(cache, trefle.origin)
+    client.get('/families', {'page': 2})
+    assert cache.keys() == ['https://trefle.io/api/v1/families?page=2']
+    with pytest.raises(requests.HTTPError):
+        make_client(cache, trefle.origin, token='wrong').get('/families', {'page': 3})
+
+def test_stopping_early_drops_the_pages_not_read(cache, trefle):
+    client = make_client(cache, trefle.origin, max_workers=1)
+    pages = client.iter_pages('/families')
+    assert [next(pages) for i in range(15)] == FAMILIES[:15]
+    pages.close()
+    assert len(cache) < 10
+
+def test_backoff_doubles_between_retries(cache, monkeypatch):
+    with socket.socket() as unused: # nothing listens on this port once the socket is closed
+        unused.bind(('127.0.0.1', 0))
+        origin = 'http://127.0.0.1:' + str(unused.getsockname()[1])
+    waits = []
+    monkeypatch.setattr(trefle_client.time, 'sleep', waits.append)
+    client = make_client(cache, origin, retries=3, backoff=0.5)
+    with pytest.raises(requests.ConnectionError):
+        client.fetch('/families')
+    assert waits == [0.5, 1.0, 2.0]
+    assert client.request_count == 4
+
+def test_retry_after_is_capped(cache, monkeypatch):
+    server = serve_trefle({'families': FAMILIES}, token='secret', fail_every=2, retry_after=3600)
+    waits = []
+    monkeypatch.setattr(trefle_client.time, 'sleep', waits.append)
+    client = make_client(cache, 'http://127.0.0.1:' + str(server.server_port), retries=3, backoff=0.5)
+    client.fetch('/families')                  # the 1st request is answered
+    client.fetch('/families', {'page': 2})     # the 2nd gets 503, the 3rd is answered
+    client.fetch('/families', {'page': 3})     # the 4th gets 429, the 5th is answered
+    server.shutdown()
+    server.server_close()
+    assert waits == [4.0, 4.0] # both ask for Retry-After: 3600, capped at 0.5 * 2 ** 3
+
+def test_the_legacy_cache_is_imported_under_the_clients_keys(tmp_path, monkeypatch, trefle):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(trefle_client, 'CLIENTS', {})
+    monkeypatch.setattr(PageCache, 'OPEN_CACHES', {})
+    pages = {'https://trefle.io/api/v1/families?token=old_key_page_' + str(page): {
+        'data': FAMILIES[(page - 1) * 10:page * 10], 'links': {'last': '/api/v1/families?page=10'}} for page in range(1, 11)}
+    pages['https://michiganflora.net/browse.aspx_page_1'] = 'not a Trefle response' # left out
+    with open(trefle_client.LEGACY_CACHE_FILENAME, 'w') as json_file:
+        json.dump(pages, json_file)
+    client = trefle_client.get_trefle_client(origin=trefle.origin, token='secret', min_interval=0.0, backoff=0.0)
+    assert len(client.cache) == 10
+    assert list(client.iter_pages('/families')) == FAMILIES
+    assert trefle.request_count == 0
+    client.close()
+    client.cache.close()
+
+def test_the_checkpoint_script_sends_the_token_from_the_environment(tmp_path, monkeypatch, trefle):
+    import trefle_checkpoint
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(trefle_client, 'CLIENTS', {})
+    monkeypatch.setattr(PageCache, 'OPEN_CACHES', {})
+    monkeypatch.setenv('TREFLE_TOKEN', 'secret')
+    families = trefle_checkpoint.iter_families(trefle.origin)
+    client = trefle_client.CLIENTS[(str(tmp_path / trefle_checkpoint.CACHE_FILENAME), trefle.origin)]
+    client.min_interval = 0.0
+    client.backoff = 0.0
+    assert list(families) == FAMILIES
+    assert client.token == 'secret'
+    client.close()
+    client.cache.close()
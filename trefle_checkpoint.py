@@ -1,44 +1,43 @@
 from bs4 import BeautifulSoup
+import argparse
 import json
 import requests
 import sqlite3
+from PageCache import open_page_cache
+from PlantRecords import PlantRecord
+from TrefleClient import get_trefle_client, legacy_cache_key
 
-CACHE_FILENAME = "trefle_cache.json"
-CACHE_DICT = {}
+CACHE_FILENAME = "trefle_cache.sqlite"
+LEGACY_CACHE_FILENAME = "trefle_cache.json"
+PAGE_CACHE_FILENAME = "plants_cache.sqlite"
+LEGACY_PAGE_CACHE_FILENAME = "plants_cache.json"
 
 trefle_token = 'hidden'
 
 def open_cache():
-    try:
-        cache_file = open(CACHE_FILENAME, 'r')
-        cache_contents = cache_file.read()
-        cache_dict = json.loads(cache_contents)
-        cache_file.close()
-    except:
-        cache_dict = {}
-    return cache_dict
-
-
-def save_cache(cache_dict):
-    dumped_json_cache = json.dumps(cache_dict, sort_keys=True, indent=4)
-    fw = open(CACHE_FILENAME,"w")
-    fw.write(dumped_json_cache)
-    fw.close() 
+    ''' Opens the Trefle response cache (once per process), importing the old JSON cache
+    under the keys TrefleClient reads (see TrefleClient.legacy_cache_key()).
+    '''
+    return open_page_cache(CACHE_FILENAME, LEGACY_CACHE_FILENAME, legacy_cache_key)
+
+
+def save_cache(cache):
+    cache.conn.commit()
 
 def make_url_request_using_cache(url, params=None):
+    ''' Returns the text of a Michigan Flora page, from the same page cache MichiganFlora.py uses
     '''
-    '''
-    CACHE_DICT = load_cache()
-    if (url in CACHE_DICT.keys()): # the url is our unique key
+    cache = open_page_cache(PAGE_CACHE_FILENAME, LEGACY_PAGE_CACHE_FILENAME)
+    page = cache.get(url) # the url is our unique key
+    if page is not None:
         print("Using cache")
-        return CACHE_DICT[url]
+        return page
     else:
         print("Fetching")
         #time.sleep(0.2)
         response = requests.get(url, params)
-        CACHE_DICT[url] = response.text
-        save_cache(CACHE_DICT)
-        return CACHE_DICT[url]
+        cache[url] = response.text
+        return response.text
 
 def construct_unique_key(baseurl, params):
     ''' 
@@ -60,76 +59,48 @@ def make_request(baseurl, params):
 def load_cache():
     '''
     '''
-    try:
-        cache_file = open(CACHE_FILE_NAME, 'r')
-        cache_file_contents = cache_file.read()
-        cache_dict = json.loads(cache_file_contents)
-        cache_file.close()
-    except:
-        cache_dict = {}
-    return cache_dict
+    return open_cache()
 
 def make_request_with_cache(baseurl, params=None):
+    ''' Returns the decoded JSON response for baseurl and params, from the cache when it was fetched before.
+    The key is made by construct_unique_key() and, when it can be, turned into the key TrefleClient uses
+    (see TrefleClient.legacy_cache_key()), so both share the cached pages.
     '''
-    '''
-    try:
-        with open(CACHE_FILENAME) as my_data:
-            CACHE_DICT = json.load(my_data)
-        my_data.close()
-    except:
-        CACHE_DICT = {}
+    cache = open_cache()
 
     #params = {'id': family}
 
     request_key = construct_unique_key(baseurl, params)
-    if request_key in CACHE_DICT.keys():
+    request_key = legacy_cache_key(request_key) or request_key
+    cached = cache.get(request_key)
+    if cached is not None:
         print("fetching cached data")
-        return CACHE_DICT[request_key]
+        return json.loads(cached)
     else:
         print("making new request")
-        CACHE_DICT[request_key] = make_request(baseurl, params)
-        with open(CACHE_FILENAME, 'w') as outfile:
-            outfile.write(json.dumps(CACHE_DICT, indent=2))
-        outfile.close()
-        #save_cache(CACHE_DICT)
-        return CACHE_DICT[request_key]
+        data = make_request(baseurl, params)
+        cache[request_key] = json.dumps(data)
+        return data
 
 
 #r = requests.get('https://trefle.io/api/v1/plants?filter_not%5Bmaximum_height_cm%5D=null&filter%5Bligneous_type%5D=tree&order%5Bmaximum_height_cm%5D=desc&token=YOUR_TREFLE_TOKEN')
 #r.json()
 
-def make_list_of_families():
+def iter_families(origin=None):
+    ''' Yields every family record of the Trefle API as its page arrives. The page count is read from the first page
+    and the other pages are fetched concurrently, each one cached on its own (see TrefleClient.iter_pages()).
+    '''
+    token = None if trefle_token == 'hidden' else trefle_token # the placeholder: TrefleClient reads $TREFLE_TOKEN instead
+    return get_trefle_client(CACHE_FILENAME, origin, token=token).iter_pages('/families')
+
+def make_list_of_families(origin=None):
     '''
     This function looks through each page of the Trefle API for plant families and returns a list of all the families in alphabetical order.
     '''
-    complete_list = []
-    for i in range(1, 35): # last page is 35, so there are (34*20)+(1*5) or 665 total families!
-        params = {'page': i}
-        families_data = make_request_with_cache(trefle_baseurl, params)
-        families_list = families_data['data']
-        for fam in families_list:
-            complete_list.append(fam['name'])
+    complete_list = [fam['name'] for fam in iter_families(origin)] # 665 families on 34 pages of 20
     print(len(complete_list))
     return complete_list
 
-class Plant:
-    '''
-    '''
-    def __init__(self, family, genus, species, common_name, physiognomy, conservatism, wetness):
-        self.family = family
-        self.genus = genus
-        self.species = species
-        self.common_name = common_name
-        self.physiognomy = physiognomy
-        self.conservatism = conservatism
-        self.wetness = wetness
-
-    def info(self):
-        return self.genus + ' ' + self.species + ' is in the ' + self.family + ' family.'
-
-    def plant_facts(self): #returns a list of everything to be added to database
-        return [self.family, self.genus, self.species, self.common_name, self.physiognomy, self.conservatism, self.wetness]
-
 def build_family_url_dict(family):
     ''' Make a dictionary that maps family name to family page url from "https://www.michiganflora.net"
         e.g. {'Adoxaceae':'https://michiganflora.net/family.aspx?id=Adoxaceae', ...}
@@ -181,24 +152,22 @@ def get_plant_instance(species_url):
     wetness_code = soup.find_all('span', {'id':'ctl00_Content_FloraRepeater_ctl00_WLabel'})
     wetness = wetness_code[0].text
 
-    plant_instance = Plant(family, genus, species, common_name, physiognomy, conservatism, wetness)
+    plant_instance = PlantRecord(family, genus + ' ' + species, common_name, physiognomy, conservatism, wetness)
     return plant_instance
 
 def list_plant_instances(plant_dict):
-    # for every plant in plant_dict, make it an instance of the Plant class and return a list of those instances
+    # for every plant in plant_dict, make it a PlantRecord and return a list of those instances
     urls = list(plant_dict.values())
     every_plant = []
     for url in urls:
         plant = get_plant_instance(url)
         #print(plant)
-        every_plant.append(plant.plant_facts())
+        # the checkpoint table keeps genus and species in two columns
+        every_plant.append([plant.family, plant.genus, plant.species, plant.common_name, plant.physiognomy, plant.conservatism, plant.wetness])
     return every_plant
 
 ################################################################################
 
-conn = sqlite3.connect("michiganplants.sqlite")
-cur = conn.cursor()
-
 drop_plants = '''
     DROP TABLE IF EXISTS "Plants";
 '''
@@ -216,43 +185,50 @@ create_plants = '''
     );
 '''
 
-pinaceae_dict = build_family_url_dict('Pinaceae')
-pinaceae_instances = list_plant_instances(pinaceae_dict)
-#print(pinaceae_instances)
-
 add_tree = '''
     INSERT INTO Plants ("Id", "Family", "Genus", "Species", "CommonName", "Physiognomy", "ConservatismCoef", "WetnessCoef")
         VALUES (?, ?, ?, ?, ?, ?, ?, ?)
 '''
 
-#first_pine = pinaceae_instances[0]
-#first_pine = ['0'] + first_pine
-#print(first_pine)
+def load_pinaceae(db_filename="michiganplants.sqlite"):
+    ''' The first checkpoint: rebuilds the Plants table from the Pinaceae family page only.
+    This drops the Plants table MichiganFlora.py builds, so it is only run when asked for.
+    '''
+    conn = sqlite3.connect(db_filename)
+    cur = conn.cursor()
 
+    pinaceae_dict = build_family_url_dict('Pinaceae')
+    pinaceae_instances = list_plant_instances(pinaceae_dict)
+    #print(pinaceae_instances)
 
-cur.execute(drop_plants)
-cur.execute(create_plants)
+    cur.execute(drop_plants)
+    cur.execute(create_plants)
 
-i = 0
-for pine in pinaceae_instances:
-    i += 1
-    index = str(i)
-    corrected_pine = [index] + pine
-    cur.execute(add_tree, corrected_pine)
+    i = 0
+    for pine in pinaceae_instances:
+        i += 1
+        index = str(i)
+        corrected_pine = [index] + pine
+        cur.execute(add_tree, corrected_pine)
 
-conn.commit()
+    conn.commit()
+    conn.close()
 
 
 ################################################################################
 
 if __name__ == "__main__":
-    CACHE_DICT = open_cache()
+    parser = argparse.ArgumentParser(description='List the plant families of the Trefle API')
+    parser.add_argument('--origin', help='send requests here instead of trefle.io (see FixtureServer.py --trefle)')
+    parser.add_argument('--pinaceae', action='store_true', help='also rebuild the checkpoint Plants table of Pinaceae (drops the real Plants table)')
+    args = parser.parse_args()
 
+    if args.pinaceae:
+        load_pinaceae()
 
     #baseurl = "https://trefle.io/api/v1/plants?token=" + trefle_token
-    trefle_baseurl = "https://trefle.io/api/v1/families?token=" + trefle_token
 
-    print(make_list_of_families()) #this uses Trefle API
+    print(make_list_of_families(args.origin)) #this uses Trefle API
 
     #pinaceae_dict = build_family_url_dict('Pinaceae')
     #adoxaceae_dict = build_family_url_dict('Adoxaceae')